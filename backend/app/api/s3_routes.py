@@ -1,7 +1,9 @@
 import os
+from dataclasses import asdict
+from itertools import chain, islice
 from typing import Optional, List
 from datetime import datetime
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Query, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 import meilisearch
 from botocore.exceptions import ClientError
@@ -9,25 +11,55 @@ import psycopg
 from app.s3.search import (
     iter_s3_objects,
     search_from_meili,
+    search_page_from_meili,
+    iter_search_from_meili,
+    export_search_results,
     search_folders_from_meili,
-    list_folder_children_from_meili
+    search_folders_from_s3,
+    list_folder_children_from_meili,
+    list_folder_children_from_s3
 )
 from app.schemas.s3_models import (
     S3ObjectModel,
+    S3SearchPageResponse,
     S3FolderModel,
-    S3FolderChildrenResponse
+    S3FolderChildrenResponse,
+    S3ArchiveRequest
 )
 from app.s3.utils import (
     parse_s3_uri,
     get_public_client,
-    generate_preview_url
+    generate_preview_url,
+    normalize_s3_path
 )
-from app.s3.refresh_status import get_status
-from app.schemas.meili_models import TagRequest
+from app.s3.archive import stream_zip_archive, ZIP_MAX_KEYS
+from app.s3.previews import (
+    get_preview,
+    PreviewRenderError,
+    PreviewTooLargeError,
+    PREVIEW_DEFAULT_DIMENSION,
+    PREVIEW_MAX_DIMENSION
+)
+from app.s3.refresh_status import ACTIVE_STATUSES, get_status, status_events
+from app.jobs.queue import JOB_KINDS, enqueue_job, get_job, list_jobs
+from app.jobs.shards import list_shards, shard_progress
+from app.s3.tags import (
+    TAG_MODES,
+    BULK_TAG_SYNC_LIMIT,
+    bulk_tag,
+    count_tag_selection,
+    create_tag_job,
+    get_tag_job
+)
+from app.schemas.meili_models import TagRequest, BulkTagRequest
 from app.meilisearch.util import get_doc_id
+from app.metrics.registry import track_call
 
 s3_router = APIRouter(prefix="/api/s3", tags=["s3"])
 
+# derivatives are keyed by ETag server-side, so browsers may keep them for a long time
+PREVIEW_HTTP_MAX_AGE = int(os.getenv("PREVIEW_HTTP_MAX_AGE", str(7 * 24 * 3600)))
+
 
 @s3_router.get("/search", response_model=List[S3ObjectModel])
 def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
@@ -42,6 +74,18 @@ def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
                   None, description="Allowed storage classes"),
               modified_after: Optional[datetime] = Query(None),
               modified_before: Optional[datetime] = Query(None),
+              targets: Optional[List[str]] = Query(
+                  None, description="PDS label TARGET_NAME values"),
+              instruments: Optional[List[str]] = Query(
+                  None, description="PDS label INSTRUMENT_ID values"),
+              product_types: Optional[List[str]] = Query(
+                  None, description="PDS label PRODUCT_TYPE values"),
+              min_width: Optional[int] = Query(
+                  None, ge=0, description="Minimum image width in pixels"),
+              min_height: Optional[int] = Query(
+                  None, ge=0, description="Minimum image height in pixels"),
+              crs: Optional[List[str]] = Query(
+                  None, description="Image coordinate reference systems, e.g. EPSG:4326"),
               limit: int = Query(
                   10, ge=1, le=1000, description="Maximum number of results to return"),
               sort_by: Optional[str] = Query(
@@ -65,7 +109,8 @@ def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
     # Meilisearch
     objects = []
     try:
-        meili_client.get_index(bucket)
+        with track_call("meilisearch", "get_index"):
+            meili_client.get_index(bucket)
         print("Index Exists, retrieving from index")
 
         try:
@@ -78,6 +123,12 @@ def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
                                         storage_classes=storage_classes,
                                         modified_after=modified_after,
                                         modified_before=modified_before,
+                                        targets=targets,
+                                        instruments=instruments,
+                                        product_types=product_types,
+                                        min_width=min_width,
+                                        min_height=min_height,
+                                        crs=crs,
                                         limit=limit,
                                         sort_by=sort_by,
                                         sort_direction=sort_direction
@@ -87,6 +138,11 @@ def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
 
     except Exception as e:
         print("Index Doesn't Exist, running manual search", e)
+        # label and image fields only exist in indexed documents, a listing cannot filter on them
+        if any(value is not None for value in (targets, instruments, product_types, min_width, min_height, crs)):
+            raise HTTPException(
+                status_code=400,
+                detail="Label and image filters need a Meilisearch index for this bucket. Run refresh first.")
         try:
             objects = list(iter_s3_objects(
                 bucket=bucket,
@@ -107,6 +163,161 @@ def search_s3(s3_uri: str = Query(..., description="s3://bucket/prefix"),
     return objects
 
 
+@s3_router.get("/search/page", response_model=S3SearchPageResponse)
+def search_s3_page(s3_uri: str = Query(..., description="s3://bucket/prefix"),
+                   contains: Optional[str] = None,
+                   suffixes: Optional[List[str]] = Query(
+                       None, description="Allowed file suffixes like .txt, .pdf"),
+                   min_size: Optional[int] = Query(
+                       None, description="Minimum file size in bytes"),
+                   max_size: Optional[int] = Query(
+                       None, description="Maximum file size in bytes"),
+                   storage_classes: Optional[List[str]] = Query(
+                       None, description="Allowed storage classes"),
+                   modified_after: Optional[datetime] = Query(None),
+                   modified_before: Optional[datetime] = Query(None),
+                   targets: Optional[List[str]] = Query(
+                       None, description="PDS label TARGET_NAME values"),
+                   instruments: Optional[List[str]] = Query(
+                       None, description="PDS label INSTRUMENT_ID values"),
+                   product_types: Optional[List[str]] = Query(
+                       None, description="PDS label PRODUCT_TYPE values"),
+                   min_width: Optional[int] = Query(
+                       None, ge=0, description="Minimum image width in pixels"),
+                   min_height: Optional[int] = Query(
+                       None, ge=0, description="Minimum image height in pixels"),
+                   crs: Optional[List[str]] = Query(
+                       None, description="Image coordinate reference systems, e.g. EPSG:4326"),
+                   limit: int = Query(
+                       100, ge=1, le=1000, description="Maximum number of results per page"),
+                   sort_by: Optional[str] = Query(
+                       None, description="Key | Size | LastModified"),
+                   sort_direction: str = Query("asc", description="asc | desc"),
+                   cursor: Optional[str] = Query(
+                       None, description="next_cursor from the previous page")):
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    try:
+        bucket, prefix = parse_s3_uri(s3_uri)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with track_call("meilisearch", "get_index"):
+            meili_client.get_index(bucket)
+    except Exception:
+        raise HTTPException(
+            status_code=404, detail="Meilisearch index not found for this bucket. Run refresh first.")
+
+    try:
+        return search_page_from_meili(bucket=bucket,
+                                      prefix=prefix,
+                                      contains=contains,
+                                      suffixes=suffixes,
+                                      min_size=min_size,
+                                      max_size=max_size,
+                                      storage_classes=storage_classes,
+                                      modified_after=modified_after,
+                                      modified_before=modified_before,
+                                      targets=targets,
+                                      instruments=instruments,
+                                      product_types=product_types,
+                                      min_width=min_width,
+                                      min_height=min_height,
+                                      crs=crs,
+                                      limit=limit,
+                                      sort_by=sort_by,
+                                      sort_direction=sort_direction,
+                                      cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+@s3_router.get("/search/export")
+def export_s3_search(s3_uri: str = Query(..., description="s3://bucket/prefix"),
+                     contains: Optional[str] = None,
+                     suffixes: Optional[List[str]] = Query(
+                         None, description="Allowed file suffixes like .txt, .pdf"),
+                     min_size: Optional[int] = Query(
+                         None, description="Minimum file size in bytes"),
+                     max_size: Optional[int] = Query(
+                         None, description="Maximum file size in bytes"),
+                     storage_classes: Optional[List[str]] = Query(
+                         None, description="Allowed storage classes"),
+                     modified_after: Optional[datetime] = Query(None),
+                     modified_before: Optional[datetime] = Query(None),
+                     targets: Optional[List[str]] = Query(
+                         None, description="PDS label TARGET_NAME values"),
+                     instruments: Optional[List[str]] = Query(
+                         None, description="PDS label INSTRUMENT_ID values"),
+                     product_types: Optional[List[str]] = Query(
+                         None, description="PDS label PRODUCT_TYPE values"),
+                     min_width: Optional[int] = Query(
+                         None, ge=0, description="Minimum image width in pixels"),
+                     min_height: Optional[int] = Query(
+                         None, ge=0, description="Minimum image height in pixels"),
+                     crs: Optional[List[str]] = Query(
+                         None, description="Image coordinate reference systems, e.g. EPSG:4326"),
+                     sort_by: Optional[str] = Query(
+                         None, description="Key | Size | LastModified"),
+                     sort_direction: str = Query("asc", description="asc | desc"),
+                     format: str = Query("ndjson", description="ndjson | csv")):
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    try:
+        bucket, prefix = parse_s3_uri(s3_uri)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    try:
+        with track_call("meilisearch", "get_index"):
+            meili_client.get_index(bucket)
+    except Exception:
+        raise HTTPException(
+            status_code=404, detail="Meilisearch index not found for this bucket. Run refresh first.")
+
+    objects = iter_search_from_meili(bucket=bucket,
+                                     prefix=prefix,
+                                     contains=contains,
+                                     suffixes=suffixes,
+                                     min_size=min_size,
+                                     max_size=max_size,
+                                     storage_classes=storage_classes,
+                                     modified_after=modified_after,
+                                     modified_before=modified_before,
+                                     targets=targets,
+                                     instruments=instruments,
+                                     product_types=product_types,
+                                     min_width=min_width,
+                                     min_height=min_height,
+                                     crs=crs,
+                                     sort_by=sort_by,
+                                     sort_direction=sort_direction)
+    # fetch the first page before the 200 is sent, so a failing search is still reported as an error
+    try:
+        first = next(objects, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    if first is not None:
+        objects = chain([first], objects)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"{bucket}-search.{format}"
+    return StreamingResponse(export_search_results(objects, format),
+                             media_type=media_type,
+                             headers={
+                                 "Content-Disposition": f"attachment; filename={filename}"
+                             })
+
+
 @s3_router.get("/folders/search", response_model=List[S3FolderModel])
 def search_s3_folders(s3_uri: str = Query(..., description="s3://bucket/prefix"),
                       contains: Optional[str] = Query(
@@ -121,10 +332,19 @@ def search_s3_folders(s3_uri: str = Query(..., description="s3://bucket/prefix")
         raise HTTPException(status_code=400, detail=str(e))
 
     try:
-        meili_client.get_index(bucket)
+        with track_call("meilisearch", "get_index"):
+            meili_client.get_index(bucket)
     except Exception:
-        raise HTTPException(
-            status_code=404, detail="Meilisearch index not found for this bucket. Run refresh first.")
+        # no index yet, browse the bucket one level at a time instead
+        try:
+            return search_folders_from_s3(
+                bucket=bucket,
+                prefix=prefix,
+                contains=contains,
+                limit=limit
+            )
+        except RuntimeError as e:
+            raise HTTPException(status_code=502, detail=str(e))
 
     try:
         return search_folders_from_meili(
@@ -162,10 +382,24 @@ def list_s3_folder_children(s3_uri: str = Query(..., description="s3://bucket/pr
         sort_by = None
 
     try:
-        meili_client.get_index(bucket)
+        with track_call("meilisearch", "get_index"):
+            meili_client.get_index(bucket)
     except Exception:
-        raise HTTPException(
-            status_code=404, detail="Meilisearch index not found for this bucket. Run refresh first.")
+        # no index yet, browse the bucket one level at a time instead
+        try:
+            return list_folder_children_from_s3(
+                bucket=bucket,
+                prefix=prefix,
+                path=path,
+                contains=contains,
+                limit=limit,
+                sort_by=sort_by,
+                sort_direction=sort_direction
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except RuntimeError as e:
+            raise HTTPException(status_code=502, detail=str(e))
 
     try:
         return list_folder_children_from_meili(
@@ -195,6 +429,94 @@ def refresh_status(s3_uri: str = Query(..., description="s3://bucket/prefix")):
     return get_status(s3_uri)
 
 
+@s3_router.post("/refresh/rebuild", status_code=202)
+def refresh_rebuild(s3_uri: str = Query(..., description="s3://bucket/prefix")):
+    """Queue a rebuild of the bucket's index into a shadow index, poll /refresh/status for progress."""
+    try:
+        # only for validation
+        parse_s3_uri(s3_uri)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if get_status(s3_uri)["status"] in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409, detail="A refresh of this location is already running")
+
+    job, created = _enqueue_refresh_job(s3_uri, "rebuild")
+    if not created:
+        raise HTTPException(status_code=409, detail=f"A {job.kind} of this location is already queued")
+    return {"s3_uri": s3_uri, "status": "queued", "job_id": job.id}
+
+
+def _enqueue_refresh_job(s3_uri: str, kind: str):
+    try:
+        # only for validation
+        parse_s3_uri(s3_uri)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+            return enqueue_job(conn, s3_uri, kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except psycopg.Error as e:
+        raise HTTPException(status_code=502, detail=f"Could not queue the job: {e}")
+
+
+@s3_router.post("/refresh/jobs", status_code=202)
+def refresh_jobs_enqueue(response: Response,
+                         s3_uri: str = Query(..., description="s3://bucket/prefix"),
+                         kind: str = Query("refresh", description=" or ".join(JOB_KINDS))):
+    """Queue a refresh or rebuild for the indexing workers; an already queued or running job is returned with 200."""
+    job, created = _enqueue_refresh_job(s3_uri, kind)
+    if not created:
+        response.status_code = 200
+    return asdict(job)
+
+
+@s3_router.get("/refresh/jobs")
+def refresh_jobs_list(s3_uri: Optional[str] = Query(None, description="s3://bucket/prefix"),
+                      limit: int = Query(50, ge=1, le=500)):
+    try:
+        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+            return [asdict(job) for job in list_jobs(conn, s3_uri=s3_uri, limit=limit)]
+    except psycopg.Error as e:
+        raise HTTPException(status_code=502, detail=f"Could not list the jobs: {e}")
+
+
+@s3_router.get("/refresh/jobs/{job_id}")
+def refresh_job_status(job_id: int):
+    try:
+        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+            job = get_job(conn, job_id)
+            shards = list_shards(conn, job_id) if job is not None else []
+    except psycopg.Error as e:
+        raise HTTPException(status_code=502, detail=f"Could not read the job: {e}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown refresh job")
+    # sharded refreshes also report how far their shards got
+    return {**asdict(job), "shards": shard_progress(shards) if shards else None}
+
+
+@s3_router.get("/refresh/events")
+def refresh_events(s3_uri: str = Query(..., description="s3://bucket/prefix")):
+    try:
+        # only for validation
+        parse_s3_uri(s3_uri)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(status_events(s3_uri),
+                             media_type="text/event-stream",
+                             headers={
+                                 "Cache-Control": "no-cache",
+                                 "X-Accel-Buffering": "no"
+                             })
+
+
 @s3_router.get("/download")
 def download_file(s3_uri: str = Query(..., description="s3://bucket/key")):
     try:
@@ -220,6 +542,76 @@ def download_file(s3_uri: str = Query(..., description="s3://bucket/key")):
                              })
 
 
+@s3_router.post("/download/archive")
+def download_archive(data: S3ArchiveRequest):
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    try:
+        bucket, prefix = parse_s3_uri(data.s3_uri)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    root = normalize_s3_path(data.path) if data.path is not None else normalize_s3_path(prefix)
+    limit = min(data.limit, ZIP_MAX_KEYS)
+
+    if data.keys is not None:
+        if len(data.keys) > ZIP_MAX_KEYS:
+            raise HTTPException(
+                status_code=400, detail=f"Archives are limited to {ZIP_MAX_KEYS} files.")
+        keys = data.keys
+
+    else:
+        try:
+            with track_call("meilisearch", "get_index"):
+                meili_client.get_index(bucket)
+            try:
+                objects = list(islice(iter_search_from_meili(bucket=bucket,
+                                                             prefix=root,
+                                                             contains=data.contains,
+                                                             suffixes=data.suffixes,
+                                                             min_size=data.min_size,
+                                                             max_size=data.max_size,
+                                                             storage_classes=data.storage_classes,
+                                                             modified_after=data.modified_after,
+                                                             modified_before=data.modified_before,
+                                                             sort_by="Key"), limit))
+            except Exception as e:
+                raise HTTPException(status_code=502, detail=str(e))
+
+        except HTTPException:
+            raise
+
+        except Exception:
+            try:
+                objects = list(iter_s3_objects(
+                    bucket=bucket,
+                    prefix=f"{root}/" if root else "",
+                    contains=data.contains,
+                    suffixes=data.suffixes,
+                    min_size=data.min_size,
+                    max_size=data.max_size,
+                    storage_classes=data.storage_classes,
+                    modified_after=data.modified_after,
+                    modified_before=data.modified_before,
+                    limit=limit
+                ))
+            except RuntimeError as e:
+                raise HTTPException(status_code=502, detail=str(e))
+
+        keys = [obj["key"] for obj in objects]
+
+    if not keys:
+        raise HTTPException(status_code=404, detail="No files matched the archive request")
+
+    filename = f"{(root.rsplit('/', 1)[-1] if root else bucket) or 'archive'}.zip"
+    return StreamingResponse(stream_zip_archive(bucket, keys, root=root),
+                             media_type="application/zip",
+                             headers={
+                                 "Content-Disposition": f"attachment; filename={filename}"
+                             })
+
+
 @s3_router.get("/preview")
 def s3_preview(bucket: str, key: str):
     url = generate_preview_url(bucket, key)
@@ -228,6 +620,39 @@ def s3_preview(bucket: str, key: str):
     return {"preview_url": url}
 
 
+@s3_router.get("/preview/thumbnail")
+def s3_preview_thumbnail(request: Request,
+                         bucket: str,
+                         key: str,
+                         size: int = Query(PREVIEW_DEFAULT_DIMENSION, ge=16, le=PREVIEW_MAX_DIMENSION,
+                                           description="Longest edge of the preview in pixels")):
+    try:
+        preview, media_type, digest = get_preview(bucket, key, dimension=size)
+
+    except ClientError:
+        raise HTTPException(status_code=404, detail="Object not found")
+
+    except PreviewTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except PreviewRenderError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to generate preview: {e}")
+
+    headers = {
+        "Cache-Control": f"public, max-age={PREVIEW_HTTP_MAX_AGE}",
+        "ETag": f'"{digest}"'
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=preview, media_type=media_type, headers=headers)
+
+
 @s3_router.post("/tag")
 def edit_tags(data: TagRequest):
     meilisearch_url = os.getenv("MEILISEARCH_URL")
@@ -238,11 +663,12 @@ def edit_tags(data: TagRequest):
 
     # add tags to index
     try:
-        index = meili_client.get_index(data.bucket)
-        index.update_documents([{
-            "ID": doc_id,
-            "Tags": data.tags
-        }]) 
+        with track_call("meilisearch", "update_documents"):
+            index = meili_client.get_index(data.bucket)
+            index.update_documents([{
+                "ID": doc_id,
+                "Tags": data.tags
+            }]) 
         #NOTE skip_creation=True not available in current version, 
         # we should update the meilisearch client when we get the change so that this function is not able to create new documents
 
@@ -252,16 +678,63 @@ def edit_tags(data: TagRequest):
     
     # store tags in db
     try: 
-        with psycopg.connect(postgres_url) as conn:
-            with conn.cursor() as cur:
-                if len(data.tags) > 0:
-                    cur.execute("""INSERT INTO file_tags (hashed_key, bucket, tags) VALUES (%s, %s, %s) 
-                                ON CONFLICT (hashed_key) DO UPDATE SET tags = EXCLUDED.tags""", 
-                                (doc_id, data.bucket, data.tags))
-                else:
-                    cur.execute("""DELETE FROM file_tags WHERE hashed_key=%s""", (doc_id,))
+        with track_call("postgres", "upsert_file_tags"):
+            with psycopg.connect(postgres_url) as conn:
+                with conn.cursor() as cur:
+                    if len(data.tags) > 0:
+                        cur.execute("""INSERT INTO file_tags (hashed_key, bucket, tags) VALUES (%s, %s, %s) 
+                                    ON CONFLICT (hashed_key) DO UPDATE SET tags = EXCLUDED.tags""", 
+                                    (doc_id, data.bucket, data.tags))
+                    else:
+                        cur.execute("""DELETE FROM file_tags WHERE hashed_key=%s""", (doc_id,))
         
     except Exception:
         raise HTTPException(
             status_code=500, detail="Error encountered while storing tags to database."
-        )
\ No newline at end of file
+        )
+
+@s3_router.post("/tags/bulk")
+def bulk_edit_tags(data: BulkTagRequest, background_tasks: BackgroundTasks, response: Response):
+    if data.mode not in TAG_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(TAG_MODES)}")
+    if data.keys is None and data.path is None and data.contains is None:
+        raise HTTPException(status_code=400, detail="Select files with keys, or a path or contains query")
+
+    selection = {
+        "keys": data.keys,
+        "prefix": normalize_s3_path(data.path) if data.path else "",
+        "contains": data.contains,
+        "suffixes": data.suffixes
+    }
+    try:
+        total = count_tag_selection(data.bucket, **selection)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    if total >= BULK_TAG_SYNC_LIMIT:
+        # large selections run after the response, poll /tags/bulk/{job_id} for progress
+        job = create_tag_job(data.bucket, data.mode, total=total if data.keys is not None else None)
+        background_tasks.add_task(_run_tag_job, data.bucket, data.tags, data.mode, selection, job)
+        response.status_code = 202
+        return get_tag_job(job.job_id)
+
+    try:
+        return {"status": "done", **bulk_tag(data.bucket, data.tags, data.mode, **selection)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error encountered while editing tags: {e}")
+
+
+def _run_tag_job(bucket, tags, mode, selection, job) -> None:
+    try:
+        bulk_tag(bucket, tags, mode, job=job, **selection)
+    except Exception as e:
+        # already recorded on the job
+        print(f"Bulk tag job {job.job_id} failed: {e}")
+
+
+@s3_router.get("/tags/bulk/{job_id}")
+def bulk_edit_tags_status(job_id: str):
+    job = get_tag_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown bulk tag job")
+    return job
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import psycopg
+
+from app.metrics.registry import SCHEDULER_LEADER, track_call
+
+
+# Seconds between attempts of a non-leader to take over, the longest failover takes
+LEADER_POLL_SECONDS = float(os.getenv("LEADER_POLL_SECONDS", "15"))
+
+
+def advisory_lock_key(name: str) -> int:
+    """Return the 64-bit Postgres advisory lock key of a lock name."""
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+
+
+class LeaderElection:
+    """
+    Elects one process among all the API workers and replicas sharing a database.
+
+    The leader holds a session-level Postgres advisory lock on a connection
+    of its own. Postgres releases the lock as soon as that connection ends,
+    when the leader exits, crashes or loses the network, so another process
+    takes over on its next `ensure()`, within LEADER_POLL_SECONDS. Leadership
+    is exported as `artemis3_refresh_scheduler_leader`, whose sum over every
+    process should be 1.
+    """
+
+    def __init__(self, name: str, postgres_url: Optional[str] = None):
+        self.name = name
+        self.key = advisory_lock_key(name)
+        self.postgres_url = postgres_url or os.getenv("DATABASE_URL")
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def ensure(self) -> bool:
+        """Return whether this process is the leader, trying to become it if not."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    with track_call("postgres", "check_leader"):
+                        self._conn.execute("SELECT 1")
+                    return True
+                except psycopg.Error as e:
+                    # the connection is gone and the lock with it
+                    print(f"Lost {self.name} leadership: {e}")
+                    self._drop()
+
+            conn = None
+            try:
+                with track_call("postgres", "try_advisory_lock"):
+                    conn = psycopg.connect(self.postgres_url, autocommit=True)
+                    acquired = conn.execute("SELECT pg_try_advisory_lock(%s)", (self.key,)).fetchone()[0]
+            except psycopg.Error as e:
+                if conn is not None:
+                    conn.close()
+                print(f"Could not run the {self.name} leader election: {e}")
+                return False
+            if not acquired:
+                conn.close()
+                return False
+
+            self._conn = conn
+            SCHEDULER_LEADER.labels(self.name).set(1)
+            print(f"Elected {self.name} leader (pid {os.getpid()})")
+            return True
+
+    def release(self) -> None:
+        """Step down, letting another process take over right away."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute("SELECT pg_advisory_unlock(%s)", (self.key,))
+            except psycopg.Error:
+                # closing the connection releases the lock anyway
+                pass
+            self._drop()
+
+    def _drop(self) -> None:
+        try:
+            self._conn.close()
+        except psycopg.Error:
+            pass
+        self._conn = None
+        SCHEDULER_LEADER.labels(self.name).set(0)
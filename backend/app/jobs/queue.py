@@ -0,0 +1,197 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from app.metrics.registry import track_call
+
+
+JOB_KINDS = ("refresh", "rebuild")
+# queued -> running -> done or error; only one queued or running job per location
+JOB_STATUSES = ("queued", "running", "done", "error")
+ACTIVE_JOB_STATUSES = ("queued", "running")
+# Seconds a running job (or shard) stays claimed without a heartbeat from its worker,
+#   after which the worker is assumed to have died and the work is handed to another one
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 4
+# Attempts a job gets before an expired lease marks it failed instead of queueing it again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+_JOB_COLUMNS = """id, s3_uri, kind, status, attempts, worker, message,
+                  enqueued_at, started_at, finished_at"""
+
+
+@dataclass
+class RefreshJob:
+    id: int
+    s3_uri: str
+    kind: str  # refresh or rebuild
+    status: str  # queued, running, done, or error
+    attempts: int = 0
+    worker: Optional[str] = None
+    message: Optional[str] = None
+    enqueued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+def _job(row) -> Optional[RefreshJob]:
+    return RefreshJob(*row) if row else None
+
+
+def enqueue_job(conn, s3_uri: str, kind: str = "refresh") -> Tuple[RefreshJob, bool]:
+    """
+    Queue a refresh or rebuild of a location for the indexing workers.
+
+    A location has at most one queued or running job, so enqueueing while
+    one exists returns that job instead.
+
+    Returns
+    -------
+        tuple
+            The job, and whether it was created by this call.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    with track_call("postgres", "enqueue_job"):
+        with conn.cursor() as cur:
+            cur.execute(f"""INSERT INTO refresh_jobs (s3_uri, kind) VALUES (%s, %s)
+                            ON CONFLICT (s3_uri) WHERE status IN ('queued', 'running') DO NOTHING
+                            RETURNING {_JOB_COLUMNS}""", (s3_uri, kind))
+            created = _job(cur.fetchone())
+            if created is None:
+                cur.execute(f"""SELECT {_JOB_COLUMNS} FROM refresh_jobs
+                                WHERE s3_uri = %s AND status IN ('queued', 'running')""", (s3_uri,))
+                existing = _job(cur.fetchone())
+        conn.commit()
+    if created is not None:
+        return created, True
+    if existing is None:
+        # the active job finished between the two statements
+        return enqueue_job(conn, s3_uri, kind)
+    return existing, False
+
+
+def claim_job(conn, worker: str) -> Optional[RefreshJob]:
+    """
+    Take the oldest queued job and mark it running for `worker`, or return None.
+
+    `FOR UPDATE SKIP LOCKED` lets any number of workers poll the queue at
+    once without blocking on, or double claiming, each other's jobs.
+    """
+    with track_call("postgres", "claim_job"):
+        with conn.cursor() as cur:
+            cur.execute(f"""UPDATE refresh_jobs
+                            SET status = 'running', worker = %s, started_at = now(), heartbeat_at = now(),
+                                attempts = attempts + 1, message = NULL
+                            WHERE id = (SELECT id FROM refresh_jobs WHERE status = 'queued'
+                                        ORDER BY enqueued_at, id
+                                        FOR UPDATE SKIP LOCKED LIMIT 1)
+                            RETURNING {_JOB_COLUMNS}""", (worker,))
+            job = _job(cur.fetchone())
+        conn.commit()
+    return job
+
+
+def finish_job(conn, job_id: int, error: Optional[str] = None, worker: Optional[str] = None) -> bool:
+    """
+    Mark a running job done, or failed with the `error` message.
+
+    With a `worker`, only that worker's run of the job is finished, so a
+    worker that lost its lease cannot end the run of the one that took over.
+    Returns False if the job was not running (for `worker`).
+    """
+    with track_call("postgres", "finish_job"):
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE refresh_jobs SET status = %s, message = %s, finished_at = now()
+                            WHERE id = %s AND status = 'running' AND (%s::text IS NULL OR worker = %s)
+                            RETURNING id""", ("error" if error else "done", error, job_id, worker, worker))
+            finished = cur.fetchone() is not None
+        conn.commit()
+    return finished
+
+
+def heartbeat_job(conn, job_id: int, worker: str) -> bool:
+    """Renew a running job's lease. Returns False if `worker` no longer holds it."""
+    with track_call("postgres", "heartbeat_job"):
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE refresh_jobs SET heartbeat_at = now()
+                            WHERE id = %s AND worker = %s AND status = 'running'
+                            RETURNING id""", (job_id, worker))
+            held = cur.fetchone() is not None
+        conn.commit()
+    return held
+
+
+def requeue_stale_jobs(conn, lease: Optional[int] = None) -> int:
+    """
+    Queue again the running jobs without a heartbeat for `lease` seconds.
+
+    Their worker is assumed to have died; jobs out of attempts are failed
+    instead. Jobs split into shards are left alone, their shards have leases
+    of their own (see `app.jobs.shards`). Returns the number of jobs queued again.
+    """
+    lease = JOB_LEASE_SECONDS if lease is None else lease
+    with track_call("postgres", "requeue_stale_jobs"):
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE refresh_jobs
+                            SET status = CASE WHEN attempts < %s THEN 'queued' ELSE 'error' END,
+                                message = 'worker stopped responding', worker = NULL
+                            WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %s)
+                              AND NOT EXISTS (SELECT 1 FROM refresh_shards WHERE job_id = refresh_jobs.id)
+                            RETURNING status""", (JOB_MAX_ATTEMPTS, lease))
+            requeued = sum(1 for (status,) in cur.fetchall() if status == "queued")
+        conn.commit()
+    return requeued
+
+
+def get_job(conn, job_id: int) -> Optional[RefreshJob]:
+    with track_call("postgres", "get_job"):
+        with conn.cursor() as cur:
+            cur.execute(f"""SELECT {_JOB_COLUMNS} FROM refresh_jobs WHERE id = %s""", (job_id,))
+            return _job(cur.fetchone())
+
+
+def list_jobs(conn, s3_uri: Optional[str] = None, limit: int = 50) -> List[RefreshJob]:
+    """Return the most recent jobs, of one location or of all of them."""
+    with track_call("postgres", "list_jobs"):
+        with conn.cursor() as cur:
+            if s3_uri is None:
+                cur.execute(f"""SELECT {_JOB_COLUMNS} FROM refresh_jobs
+                                ORDER BY id DESC LIMIT %s""", (limit,))
+            else:
+                cur.execute(f"""SELECT {_JOB_COLUMNS} FROM refresh_jobs WHERE s3_uri = %s
+                                ORDER BY id DESC LIMIT %s""", (s3_uri, limit))
+            return [RefreshJob(*row) for row in cur.fetchall()]
+
+
+@contextmanager
+def keep_alive(beat: Callable[[], bool], interval: Optional[float] = None) -> Iterator[threading.Event]:
+    """
+    Call `beat` every `interval` seconds from a background thread while the block runs.
+
+    Yields an event set once `beat` returns False, meaning the lease was lost
+    and another worker may be redoing the work.
+    """
+    interval = JOB_HEARTBEAT_SECONDS if interval is None else interval
+    lost = threading.Event()
+    done = threading.Event()
+
+    def run() -> None:
+        while not done.wait(interval):
+            try:
+                if not beat():
+                    lost.set()
+            except Exception as e:
+                # a missed heartbeat is retried on the next one, the lease outlives several
+                print(f"Heartbeat failed: {e}")
+
+    thread = threading.Thread(target=run, name="job-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield lost
+    finally:
+        done.set()
+        thread.join()
@@ -0,0 +1,175 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.jobs.queue import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, RefreshJob
+from app.metrics.registry import track_call
+
+
+# Shards a refresh is split into, so several workers can index one location at once (1 = no sharding)
+REFRESH_SHARDS = int(os.getenv("REFRESH_SHARDS", "1"))
+
+# subtree: a folder and everything below it; files: only the objects directly in a folder;
+#   sweep: removes the documents of folders gone from S3, once every other shard has finished
+SHARD_SCOPES = ("subtree", "files", "sweep")
+
+_SHARD_COLUMNS = """id, job_id, s3_uri, bucket, folder, scope, status, attempts, worker,
+                    listed, added, removed, failed_tasks, message, lease_expires_at, finished_at"""
+
+
+@dataclass
+class RefreshShard:
+    id: int
+    job_id: int
+    s3_uri: str
+    bucket: str
+    folder: str  # '' for the bucket root
+    scope: str  # subtree, files, or sweep
+    status: str  # queued, running, done, or error
+    attempts: int = 0
+    worker: Optional[str] = None
+    listed: int = 0
+    added: int = 0
+    removed: int = 0
+    failed_tasks: int = 0
+    message: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+def _shard(row) -> Optional[RefreshShard]:
+    return RefreshShard(*row) if row else None
+
+
+def create_shards(conn, job: RefreshJob, bucket: str, folder: str, plan: List[Tuple[str, str]]) -> int:
+    """
+    Record the shards of a refresh job, plus the sweep shard that finishes it.
+
+    `plan` is a list of (folder, scope) pairs covering `folder` without
+    overlap, as returned by `plan_refresh_shards`. Returns the number of
+    shards created, sweep included.
+    """
+    rows = [(job.id, job.s3_uri, bucket, shard_folder, scope) for shard_folder, scope in plan]
+    rows.append((job.id, job.s3_uri, bucket, folder, "sweep"))
+    with track_call("postgres", "create_shards"):
+        with conn.cursor() as cur:
+            cur.executemany("""INSERT INTO refresh_shards (job_id, s3_uri, bucket, folder, scope)
+                                VALUES (%s, %s, %s, %s, %s)""", rows)
+        conn.commit()
+    return len(rows)
+
+
+def expire_shards(conn) -> List[str]:
+    """
+    Fail the running shards whose lease expired on their last attempt.
+
+    A job whose sweep shard fails this way has no one left to finish it, so
+    the job is failed in the same statement. Returns the locations of the
+    jobs failed, whose refresh status the caller reports.
+    """
+    with track_call("postgres", "expire_shards"):
+        with conn.cursor() as cur:
+            cur.execute("""WITH expired AS (
+                                UPDATE refresh_shards
+                                SET status = 'error', message = 'worker stopped responding', finished_at = now()
+                                WHERE status = 'running' AND lease_expires_at < now() AND attempts >= %s
+                                RETURNING job_id, scope)
+                            UPDATE refresh_jobs
+                            SET status = 'error', message = 'sweep shard worker stopped responding',
+                                finished_at = now()
+                            WHERE status = 'running' AND id IN (SELECT job_id FROM expired WHERE scope = 'sweep')
+                            RETURNING s3_uri""", (JOB_MAX_ATTEMPTS,))
+            failed = [s3_uri for (s3_uri,) in cur.fetchall()]
+        conn.commit()
+    return failed
+
+
+def claim_shard(conn, worker: str, lease: Optional[int] = None) -> Optional[RefreshShard]:
+    """
+    Lease the next shard to `worker` for `lease` seconds, or return None.
+
+    Queued shards are taken first-come, as are running shards whose lease
+    expired without a heartbeat, their worker being presumed dead, while
+    they have attempts left (see `expire_shards`). A job's sweep shard only
+    becomes claimable once all its other shards have finished.
+    """
+    lease = JOB_LEASE_SECONDS if lease is None else lease
+    with track_call("postgres", "claim_shard"):
+        with conn.cursor() as cur:
+            cur.execute(f"""UPDATE refresh_shards
+                            SET status = 'running', worker = %s, attempts = attempts + 1, message = NULL,
+                                lease_expires_at = now() + make_interval(secs => %s)
+                            WHERE id = (SELECT s.id FROM refresh_shards s
+                                        WHERE (s.status = 'queued'
+                                               OR (s.status = 'running' AND s.lease_expires_at < now()
+                                                   AND s.attempts < %s))
+                                          AND (s.scope <> 'sweep' OR NOT EXISTS (
+                                                SELECT 1 FROM refresh_shards o
+                                                WHERE o.job_id = s.job_id AND o.id <> s.id
+                                                  AND o.status IN ('queued', 'running')))
+                                        ORDER BY s.job_id, s.id
+                                        FOR UPDATE SKIP LOCKED LIMIT 1)
+                            RETURNING {_SHARD_COLUMNS}""", (worker, lease, JOB_MAX_ATTEMPTS))
+            shard = _shard(cur.fetchone())
+        conn.commit()
+    return shard
+
+
+def heartbeat_shard(conn, shard_id: int, worker: str, lease: Optional[int] = None) -> bool:
+    """Extend a shard's lease by `lease` seconds. Returns False if `worker` no longer holds it."""
+    lease = JOB_LEASE_SECONDS if lease is None else lease
+    with track_call("postgres", "heartbeat_shard"):
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE refresh_shards SET lease_expires_at = now() + make_interval(secs => %s)
+                            WHERE id = %s AND worker = %s AND status = 'running'
+                            RETURNING id""", (lease, shard_id, worker))
+            held = cur.fetchone() is not None
+        conn.commit()
+    return held
+
+
+def finish_shard(conn, shard_id: int, worker: str, result: Optional[Dict[str, Any]] = None,
+                 error: Optional[str] = None) -> bool:
+    """
+    Mark a shard done with the counts in `result`, or failed with the `error` message.
+
+    Only the worker holding the lease can finish a shard, so a worker that
+    stalled past its lease cannot overwrite the outcome of the one that took
+    over. Returns False if `worker` no longer held the shard.
+    """
+    result = result or {}
+    with track_call("postgres", "finish_shard"):
+        with conn.cursor() as cur:
+            cur.execute("""UPDATE refresh_shards
+                            SET status = %s, message = %s, listed = %s, added = %s, removed = %s,
+                                failed_tasks = %s, finished_at = now()
+                            WHERE id = %s AND worker = %s AND status = 'running'
+                            RETURNING id""",
+                        ("error" if error else "done", error or result.get("message"),
+                         result.get("listed", 0), result.get("added", 0), result.get("removed", 0),
+                         result.get("failed_tasks", 0), shard_id, worker))
+            held = cur.fetchone() is not None
+        conn.commit()
+    return held
+
+
+def list_shards(conn, job_id: int) -> List[RefreshShard]:
+    with track_call("postgres", "list_shards"):
+        with conn.cursor() as cur:
+            cur.execute(f"""SELECT {_SHARD_COLUMNS} FROM refresh_shards WHERE job_id = %s ORDER BY id""",
+                        (job_id,))
+            return [RefreshShard(*row) for row in cur.fetchall()]
+
+
+def shard_progress(shards: List[RefreshShard]) -> Dict[str, Any]:
+    """Sum up the shards of a job: how many finished, and what they listed and changed."""
+    work = [shard for shard in shards if shard.scope != "sweep"]
+    return {
+        "shards": len(work),
+        "finished": sum(1 for shard in work if shard.status in ("done", "error")),
+        "failed": sum(1 for shard in work if shard.status == "error"),
+        "listed": sum(shard.listed for shard in shards),
+        "changed": sum(shard.added + shard.removed for shard in shards),
+        "failed_tasks": sum(shard.failed_tasks for shard in shards),
+    }
@@ -1,15 +1,25 @@
 import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import meilisearch
 import psycopg
 from typing import List, Optional
 from app.api.s3_routes import s3_router
-from app.s3.index_refresh import refresh_meili_index
+from app.jobs.leader import LEADER_POLL_SECONDS, LeaderElection
+from app.jobs.queue import enqueue_job
+from app.worker import run_worker
 from app.s3.utils import parse_s3_uri
 from app.schemas.pg_models import MimeRecord
+from app.metrics.registry import (
+    HTTP_REQUESTS,
+    HTTP_REQUEST_SECONDS,
+    render_metrics,
+    track_call,
+)
 
 app = FastAPI(title="ArtemiS3 API")
 app.add_middleware(
@@ -28,6 +38,21 @@ postgres_url = os.getenv("DATABASE_URL")
 # routers for various API endpoint functionalities
 app.include_router(s3_router)
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template so per-key URLs don't explode cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.labels(request.method, route, str(status)).inc()
+        HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - start)
+
 # index refresh async block
 REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", "3600"))
 REFRESH_BUCKETS = os.getenv(
@@ -38,29 +63,62 @@ REFRESH_BUCKETS = os.getenv(
 )
 
 
+# run the indexing worker inside the API process, only for deployments without a separate indexer
+INLINE_INDEX_WORKER = os.getenv("INLINE_INDEX_WORKER", "false").lower() in ("1", "true", "yes")
+_stop_inline_worker = threading.Event()
+# only one process among all API workers and replicas schedules refreshes
+_scheduler_election = LeaderElection("refresh-scheduler", postgres_url)
+
+
 def _parse_refresh_targets():
     return [s.strip() for s in REFRESH_BUCKETS.split(",") if s.strip()]
 
 
+def _enqueue_refresh(s3_uri: str) -> None:
+    parse_s3_uri(s3_uri)  # only for validation
+    with psycopg.connect(postgres_url) as conn:
+        job, created = enqueue_job(conn, s3_uri, "refresh")
+    print(f"Queued refresh job {job.id}: {s3_uri}" if created
+          else f"Refresh of {s3_uri} already queued as job {job.id}")
+
+
 async def _index_refresh_loop():
     await asyncio.sleep(2)  # let app start
     print("Starting index refresh loop...")
     while True:
+        if not await asyncio.to_thread(_scheduler_election.ensure):
+            # another process is the leader, take over if it goes away
+            await asyncio.sleep(LEADER_POLL_SECONDS)
+            continue
         for s3_uri in _parse_refresh_targets():
-            print(f"Trying to reindex: {s3_uri}")
             try:
-                bucket, prefix = parse_s3_uri(s3_uri)
-                await asyncio.to_thread(refresh_meili_index, bucket, prefix, s3_uri=s3_uri)
-
+                await asyncio.to_thread(_enqueue_refresh, s3_uri)
             except Exception as e:
-                print(f"Refresh failed: s3_uri={s3_uri}, error={str(e)}")
+                print(f"Could not queue refresh: s3_uri={s3_uri}, error={str(e)}")
         print(f"Waiting {REFRESH_INTERVAL_SECONDS} seconds...")
         await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
 
 
 @app.on_event("startup")
 async def start_refresh_scheduler():
+    # the refreshes themselves run in an indexing worker (python -m app.worker)
     asyncio.create_task(_index_refresh_loop())
+    if INLINE_INDEX_WORKER:
+        threading.Thread(target=run_worker, args=(_stop_inline_worker, postgres_url),
+                         name="inline-index-worker", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def stop_refresh_scheduler():
+    _stop_inline_worker.set()
+    # hand the scheduling over to another process right away
+    await asyncio.to_thread(_scheduler_election.release)
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/api/health")
@@ -97,11 +155,12 @@ def test() -> dict:
 def add_mime(data: MimeRecord):
     postgres_url = os.getenv("DATABASE_URL")
     try:
-        with psycopg.connect(postgres_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute("""INSERT INTO custom_mime_types (extension, mime_type) VALUES (%s, %s) 
-                                ON CONFLICT (extension) DO UPDATE SET mime_type = EXCLUDED.mime_type""",
-                            (data.extension, data.mime_type,))
+        with track_call("postgres", "upsert_mime_type"):
+            with psycopg.connect(postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""INSERT INTO custom_mime_types (extension, mime_type) VALUES (%s, %s) 
+                                    ON CONFLICT (extension) DO UPDATE SET mime_type = EXCLUDED.mime_type""",
+                                (data.extension, data.mime_type,))
     except Exception:
         raise HTTPException(
             status_code=500, detail="Error encountered while storing mime type to database."
@@ -112,10 +171,11 @@ def add_mime(data: MimeRecord):
 def delete_mime(extension: str):
     postgres_url = os.getenv("DATABASE_URL")
     try:
-        with psycopg.connect(postgres_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """DELETE FROM custom_mime_types WHERE extension=%s""", (extension,))
+        with track_call("postgres", "delete_mime_type"):
+            with psycopg.connect(postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """DELETE FROM custom_mime_types WHERE extension=%s""", (extension,))
     except Exception:
         raise HTTPException(
             status_code=500, detail="Error encountered while deleting mime type from database."
@@ -0,0 +1,126 @@
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import meilisearch
+
+from app.metrics.registry import track_call
+
+
+# Pause enqueueing while Meilisearch has more unfinished tasks than this
+MEILI_MAX_QUEUED_TASKS = int(os.getenv("MEILI_MAX_QUEUED_TASKS", "1000"))
+MEILI_TASK_POLL_SECONDS = float(os.getenv("MEILI_TASK_POLL_SECONDS", "1.0"))
+# Longest a refresh waits for its tasks, or for queue capacity, before giving up
+MEILI_TASK_TIMEOUT_SECONDS = float(os.getenv("MEILI_TASK_TIMEOUT_SECONDS", "3600"))
+
+PENDING_TASK_STATUSES = ["enqueued", "processing"]
+FINISHED_TASK_STATUSES = ("succeeded", "failed", "canceled")
+# Task uids per get_tasks request, keeps the query string reasonably short
+TASK_QUERY_CHUNK = 500
+# Failed tasks whose errors are kept for the refresh status
+MAX_REPORTED_TASK_ERRORS = 5
+
+
+def task_uid(task: Any) -> Optional[int]:
+    """Return the uid of a TaskInfo returned by a write call, or None if there isn't one."""
+    uid = getattr(task, "task_uid", None)
+    if uid is None and isinstance(task, dict):
+        uid = task.get("taskUid")
+    return uid if isinstance(uid, int) else None
+
+
+def queue_depth(meili_client: meilisearch.Client) -> int:
+    """Return how many tasks Meilisearch has enqueued or processing, across all indexes."""
+    with track_call("meilisearch", "get_tasks"):
+        result = meili_client.get_tasks({"statuses": list(PENDING_TASK_STATUSES), "limit": 1})
+    return result.total
+
+
+def wait_for_queue_capacity(meili_client: meilisearch.Client,
+                            max_queued: Optional[int] = None,
+                            timeout: Optional[float] = None) -> float:
+    """
+    Block while the Meilisearch task queue is deeper than `max_queued`.
+
+    Called before enqueueing each batch of writes, so a refresh never runs
+    far ahead of what Meilisearch can index. Returns the seconds spent waiting.
+
+    Raises
+    ------
+        TimeoutError
+            If the queue does not drain within `timeout` seconds.
+    """
+    max_queued = MEILI_MAX_QUEUED_TASKS if max_queued is None else max_queued
+    timeout = MEILI_TASK_TIMEOUT_SECONDS if timeout is None else timeout
+    start = time.monotonic()
+    while True:
+        depth = queue_depth(meili_client)
+        if depth <= max_queued:
+            return time.monotonic() - start
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"Meilisearch still has {depth} queued tasks after {timeout:.0f}s")
+        time.sleep(MEILI_TASK_POLL_SECONDS)
+
+
+def _chunks(items: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def wait_for_tasks(meili_client: meilisearch.Client,
+                   uids: Iterable[int],
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Wait until every task in `uids` has finished and summarize the outcome.
+    Missing uids (None) are ignored.
+
+    Meilisearch processes tasks in uid order, so only the newest task is
+    polled; once it has finished, the failed ones are looked up in chunks.
+
+    Returns
+    -------
+        dict
+            `tasks` waited on, `failed` tasks (failed or canceled), up to
+            MAX_REPORTED_TASK_ERRORS `errors`, and `indexing_seconds` from the
+            oldest task being enqueued to the newest one finishing.
+
+    Raises
+    ------
+        TimeoutError
+            If the tasks have not finished within `timeout` seconds.
+    """
+    uids = sorted({uid for uid in uids if uid is not None})
+    summary: Dict[str, Any] = {"tasks": len(uids), "failed": 0, "errors": [], "indexing_seconds": None}
+    if not uids:
+        return summary
+
+    timeout = MEILI_TASK_TIMEOUT_SECONDS if timeout is None else timeout
+    start = time.monotonic()
+    while True:
+        with track_call("meilisearch", "get_task"):
+            last = meili_client.get_task(uids[-1])
+        if last.status in FINISHED_TASK_STATUSES:
+            break
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"Meilisearch tasks still {last.status} after {timeout:.0f}s")
+        time.sleep(MEILI_TASK_POLL_SECONDS)
+
+    for chunk in _chunks(uids, TASK_QUERY_CHUNK):
+        with track_call("meilisearch", "get_tasks"):
+            result = meili_client.get_tasks({
+                "uids": [str(uid) for uid in chunk],
+                "statuses": ["failed", "canceled"],
+                "limit": len(chunk)
+            })
+        summary["failed"] += result.total
+        for task in result.results:
+            if len(summary["errors"]) >= MAX_REPORTED_TASK_ERRORS:
+                break
+            error = (task.error or {}).get("message") if task.status == "failed" else "canceled"
+            summary["errors"].append(f"task {task.uid} ({task.type}): {error}")
+
+    with track_call("meilisearch", "get_task"):
+        first = last if len(uids) == 1 else meili_client.get_task(uids[0])
+    if first.enqueued_at and last.finished_at:
+        summary["indexing_seconds"] = round((last.finished_at - first.enqueued_at).total_seconds(), 3)
+    return summary
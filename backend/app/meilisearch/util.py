@@ -6,6 +6,7 @@ from typing import Optional
 import meilisearch
 import psycopg
 
+from app.metrics.registry import track_call
 from app.s3.utils import build_subtree_filter, normalize_s3_path
 
 
@@ -23,7 +24,8 @@ def get_all_indexes():
     total: int | None = None
     indexObjs = []
     while total is None or offset < total:
-        temp = meili_client.get_raw_indexes({"limit": limit, "offset": offset})
+        with track_call("meilisearch", "get_indexes"):
+            temp = meili_client.get_raw_indexes({"limit": limit, "offset": offset})
         if total is None:
             total = temp["total"]
         offset += limit
@@ -31,7 +33,7 @@ def get_all_indexes():
 
     return indexObjs
 
-def get_all_documents(index: str, prefix: Optional[str] = None):
+def get_all_documents(index: str, prefix: Optional[str] = None, filter: Optional[str] = None):
     meilisearch_url = os.getenv("MEILISEARCH_URL")
     meili_client = meilisearch.Client(meilisearch_url)
 
@@ -46,11 +48,14 @@ def get_all_documents(index: str, prefix: Optional[str] = None):
             "limit": limit,
             "offset": offset
         }
-        if prefix is not None and prefix != "":
+        if filter is not None:
+            get_query["filter"] = filter
+        elif prefix is not None and prefix != "":
             norm_prefix = normalize_s3_path(prefix)
             get_query["filter"] = build_subtree_filter(norm_prefix)
 
-        temp = meili_client.index(index).get_documents(get_query)
+        with track_call("meilisearch", "get_documents"):
+            temp = meili_client.index(index).get_documents(get_query)
         if total is None:
             total = temp.total
         offset += limit
@@ -59,11 +64,13 @@ def get_all_documents(index: str, prefix: Optional[str] = None):
     return documentObjs
 
 def guess_mime_type(extension: str):
+    extension = extension.lower()
     postgres_url = os.getenv("DATABASE_URL")
-    with psycopg.connect(postgres_url) as conn:
-        with conn.cursor() as cur:
-            cur.execute("""SELECT * FROM custom_mime_types""")
-            custom_types = [type for type in cur.fetchall()]
+    with track_call("postgres", "select_mime_types"):
+        with psycopg.connect(postgres_url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""SELECT * FROM custom_mime_types""")
+                custom_types = [type for type in cur.fetchall()]
 
     if extension in [m[0] for m in custom_types]:
         mime_type = custom_types[[m[0] for m in custom_types].index(extension)][1]
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+# Buckets spanning fast metadata calls (ms) up to slow extraction and bulk writes (tens of s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REFRESH_STAGE_SECONDS = Histogram(
+    "artemis3_refresh_stage_seconds",
+    "Time spent in each stage of an index refresh",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REFRESH_STAGE_ERRORS = Counter(
+    "artemis3_refresh_stage_errors_total",
+    "Errors raised by each stage of an index refresh",
+    ["stage"],
+)
+REFRESH_STAGE_BYTES = Counter(
+    "artemis3_refresh_stage_bytes_total",
+    "Bytes read or written by each stage of an index refresh",
+    ["stage"],
+)
+REFRESH_OBJECTS = Counter(
+    "artemis3_refresh_objects_total",
+    "Objects handled by index refreshes",
+    ["result"],
+)
+EXTRACTION_CACHE = Counter(
+    "artemis3_extraction_cache_total",
+    "Keyword extractions served from the cache (hit) or run on the content (miss)",
+    ["result"],
+)
+REFRESH_CONCURRENCY_LIMIT = Gauge(
+    "artemis3_refresh_concurrency_limit",
+    "Objects an index refresh works on at once, as tuned by its adaptive limiter",
+    ["pool"],
+    multiprocess_mode="livemax",
+)
+REFRESH_CONCURRENCY_ADJUSTMENTS = Counter(
+    "artemis3_refresh_concurrency_adjustments_total",
+    "Changes of the refresh concurrency limit, by the signal that caused them",
+    ["pool", "reason"],
+)
+SCHEDULER_LEADER = Gauge(
+    "artemis3_refresh_scheduler_leader",
+    "1 in the process elected to schedule refreshes, 0 in the others",
+    ["election"],
+    multiprocess_mode="livesum",
+)
+
+HTTP_REQUESTS = Counter(
+    "artemis3_http_requests_total",
+    "API requests served",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "artemis3_http_request_seconds",
+    "API request latency",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OUTBOUND_REQUESTS = Counter(
+    "artemis3_outbound_requests_total",
+    "Calls made to S3, Meilisearch and Postgres",
+    ["service", "operation", "outcome"],
+)
+OUTBOUND_REQUEST_SECONDS = Histogram(
+    "artemis3_outbound_request_seconds",
+    "Latency of calls made to S3, Meilisearch and Postgres",
+    ["service", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+S3_BUDGET_WAIT_SECONDS = Histogram(
+    "artemis3_s3_budget_wait_seconds",
+    "Time S3 requests waited for their bucket's request budget, by priority",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_BYTES = Counter(
+    "artemis3_outbound_response_bytes_total",
+    "Response bytes received from S3, Meilisearch and Postgres",
+    ["service", "operation"],
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time a refresh stage and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        REFRESH_STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        REFRESH_STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def observe_stage_bytes(stage: str, count: int) -> None:
+    if count:
+        REFRESH_STAGE_BYTES.labels(stage).inc(count)
+
+
+@contextmanager
+def track_call(service: str, operation: str) -> Iterator[None]:
+    """Time an outbound call and record whether it succeeded."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        OUTBOUND_REQUESTS.labels(service, operation, outcome).inc()
+        OUTBOUND_REQUEST_SECONDS.labels(service, operation).observe(time.perf_counter() - start)
+
+
+# S3 responses throttled (503 SlowDown) in this process, read by the adaptive refresh limiter
+_s3_throttles = 0
+_s3_throttles_lock = threading.Lock()
+
+
+def s3_throttle_count() -> int:
+    """Return how many throttled S3 responses this process has received."""
+    with _s3_throttles_lock:
+        return _s3_throttles
+
+
+def _note_s3_throttle() -> None:
+    global _s3_throttles
+    with _s3_throttles_lock:
+        _s3_throttles += 1
+
+
+def _before_s3_call(model, context, **kwargs) -> None:
+    context["artemis3_started"] = time.perf_counter()
+
+
+def _after_s3_call(http_response, model, context, **kwargs) -> None:
+    operation = model.name
+    started = context.get("artemis3_started")
+    if started is not None:
+        OUTBOUND_REQUEST_SECONDS.labels("s3", operation).observe(time.perf_counter() - started)
+    status = getattr(http_response, "status_code", 500)
+    if status == 503:
+        outcome = "throttled"
+        _note_s3_throttle()
+    elif status >= 400:
+        outcome = "error"
+    else:
+        outcome = "success"
+    OUTBOUND_REQUESTS.labels("s3", operation, outcome).inc()
+
+    length = getattr(http_response, "headers", {}).get("content-length")
+    if length and str(length).isdigit():
+        OUTBOUND_BYTES.labels("s3", operation).inc(int(length))
+
+
+def _after_s3_call_error(event_name, context, **kwargs) -> None:
+    # connection level failures, no response was received
+    operation = event_name.rsplit(".", 1)[-1]
+    started = context.get("artemis3_started")
+    if started is not None:
+        OUTBOUND_REQUEST_SECONDS.labels("s3", operation).observe(time.perf_counter() - started)
+    OUTBOUND_REQUESTS.labels("s3", operation, "error").inc()
+
+
+def instrument_s3_client(client):
+    """Register botocore event hooks that record latency, outcome and bytes for every S3 call."""
+    events = client.meta.events
+    events.register("before-parameter-build.s3", _before_s3_call,
+                    unique_id="artemis3-metrics-before")
+    events.register("after-call.s3", _after_s3_call, unique_id="artemis3-metrics-after")
+    events.register("after-call-error.s3", _after_s3_call_error,
+                    unique_id="artemis3-metrics-error")
+    return client
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    When `PROMETHEUS_MULTIPROC_DIR` is set (several uvicorn/gunicorn workers),
+    the values of every worker are aggregated from that directory.
+    """
+    registry: Optional[CollectorRegistry] = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from botocore.client import BaseClient
+
+from app.s3.utils import get_public_client, normalize_s3_path
+
+
+# Size of each read from an S3 object body
+ZIP_CHUNK_SIZE = int(os.getenv("ZIP_CHUNK_SIZE", str(1024 * 1024)))
+# Number of objects fetched ahead of the one currently being written
+ZIP_PREFETCH_OBJECTS = int(os.getenv("ZIP_PREFETCH_OBJECTS", "4"))
+# Number of chunks each prefetched object may buffer before its reader blocks
+ZIP_READ_AHEAD_CHUNKS = int(os.getenv("ZIP_READ_AHEAD_CHUNKS", "4"))
+# Upper bound on the number of objects a single archive request may contain
+ZIP_MAX_KEYS = int(os.getenv("ZIP_MAX_KEYS", "10000"))
+
+ERRORS_ENTRY_NAME = "_archive_errors.txt"
+
+_END_OF_OBJECT = object()
+_PUT_TIMEOUT_SECONDS = 0.5
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class _ZipSink:
+    """Write-only, non-seekable file object that buffers archive bytes until drained."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_entry_name(key: str, root: str = "") -> str:
+    """Return a safe, root-relative path for a key inside the archive."""
+    norm_key = normalize_s3_path(key)
+    norm_root = normalize_s3_path(root)
+    if norm_root and norm_key.startswith(f"{norm_root}/"):
+        norm_key = norm_key[len(norm_root) + 1:]
+    parts = [part for part in norm_key.split("/") if part not in ("", ".", "..")]
+    return "/".join(parts)
+
+
+def _put(buffer: queue.Queue, item: Any, cancelled: threading.Event) -> bool:
+    """Block until the item fits in the buffer, giving up once the archive is cancelled."""
+    while not cancelled.is_set():
+        try:
+            buffer.put(item, timeout=_PUT_TIMEOUT_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _prefetch_object(s3: BaseClient,
+                     bucket: str,
+                     key: str,
+                     buffer: queue.Queue,
+                     cancelled: threading.Event,
+                     chunk_size: int) -> None:
+    """Read an object into its bounded buffer: a metadata tuple, body chunks, then an end marker."""
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        if not _put(buffer, (obj.get("ContentLength"), obj.get("LastModified")), cancelled):
+            return
+        body = obj["Body"]
+        try:
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                if not _put(buffer, chunk, cancelled):
+                    return
+        finally:
+            body.close()
+        _put(buffer, _END_OF_OBJECT, cancelled)
+    except Exception as e:
+        _put(buffer, e, cancelled)
+
+
+def _zip_info(name: str, size: Optional[int], last_modified: Any) -> zipfile.ZipInfo:
+    date_time = _ZIP_EPOCH
+    if isinstance(last_modified, datetime) and last_modified.year >= 1980:
+        date_time = last_modified.timetuple()[:6]
+    zinfo = zipfile.ZipInfo(name, date_time=date_time)
+    zinfo.compress_type = zipfile.ZIP_STORED
+    if size is not None:
+        zinfo.file_size = int(size)
+    return zinfo
+
+
+def stream_zip_archive(bucket: str,
+                       keys: Iterable[str],
+                       root: str = "",
+                       s3: Optional[BaseClient] = None,
+                       prefetch: int = ZIP_PREFETCH_OBJECTS,
+                       read_ahead_chunks: int = ZIP_READ_AHEAD_CHUNKS,
+                       chunk_size: int = ZIP_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a ZIP64 archive of the given objects without staging it in memory or on disk.
+
+    Up to `prefetch` objects are downloaded concurrently, each holding at most
+    `read_ahead_chunks` chunks, so memory use is bounded per request regardless
+    of archive size. Objects that fail to download are skipped and listed in an
+    extra `_archive_errors.txt` entry, since the response has already started.
+
+    Parameters
+    ----------
+        bucket : str
+            The S3 bucket to read objects from.
+        keys : Iterable[str]
+            The object keys to include, written in iteration order.
+        root : str
+            Optional prefix stripped from entry names inside the archive.
+        s3 : BaseClient or None
+            The S3 client to use. Default is a public unsigned client.
+    """
+    if s3 is None:
+        s3 = get_public_client()
+
+    prefetch = max(1, prefetch)
+    sink = _ZipSink()
+    cancelled = threading.Event()
+    pending: Deque[Tuple[str, queue.Queue]] = deque()
+    key_iter = iter(keys)
+    seen_names: set[str] = set()
+    errors: List[str] = []
+    executor = ThreadPoolExecutor(max_workers=prefetch)
+
+    def schedule() -> None:
+        while len(pending) < prefetch:
+            key = next(key_iter, None)
+            if key is None:
+                return
+            if key.endswith("/"):
+                continue
+            buffer: queue.Queue = queue.Queue(maxsize=max(1, read_ahead_chunks))
+            executor.submit(_prefetch_object, s3, bucket, key,
+                            buffer, cancelled, chunk_size)
+            pending.append((key, buffer))
+
+    try:
+        with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+            schedule()
+            while pending:
+                key, buffer = pending.popleft()
+                schedule()
+
+                item = buffer.get()
+                if isinstance(item, Exception):
+                    errors.append(f"{key}: {item}")
+                    continue
+
+                name = archive_entry_name(key, root)
+                if not name or name in seen_names:
+                    # the renamed entry may itself be the name of a later key, or of an earlier rename
+                    base, suffix = name or "file", 1
+                    while f"{base}.{suffix}" in seen_names:
+                        suffix += 1
+                    name = f"{base}.{suffix}"
+                seen_names.add(name)
+
+                size, last_modified = item
+                zinfo = _zip_info(name, size, last_modified)
+                with archive.open(zinfo, mode="w", force_zip64=size is None) as entry:
+                    while True:
+                        item = buffer.get()
+                        if item is _END_OF_OBJECT:
+                            break
+                        if isinstance(item, Exception):
+                            errors.append(f"{key}: truncated, {item}")
+                            break
+                        entry.write(item)
+                        data = sink.drain()
+                        if data:
+                            yield data
+
+                data = sink.drain()
+                if data:
+                    yield data
+
+            if errors:
+                archive.writestr(ERRORS_ENTRY_NAME, "\n".join(errors) + "\n")
+
+        data = sink.drain()
+        if data:
+            yield data
+
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
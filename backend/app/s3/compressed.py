@@ -0,0 +1,146 @@
+import bz2
+import struct
+import zlib
+from typing import Iterable, Iterator, List, Optional
+
+from app.s3.imagery import RangeReader
+
+
+# Key suffix -> codec of compressed objects whose content is read
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".bz2": "bz2", ".zip": "zip"}
+# Codecs decompressed as a stream; ZIP archives are listed from their central directory instead
+STREAM_CODECS = ("gzip", "bz2")
+# Entry names listed from a ZIP central directory
+MAX_ZIP_ENTRIES = 1000
+
+ZIP_EOCD = b"PK\x05\x06"
+ZIP64_EOCD_LOCATOR = b"PK\x06\x07"
+ZIP64_EOCD = b"PK\x06\x06"
+ZIP_CENTRAL_HEADER = b"PK\x01\x02"
+# end of central directory record, then how far back it is looked for: past a short
+# archive comment first, then past the longest one
+ZIP_EOCD_SIZE = 22
+ZIP_EOCD_SEARCH_BYTES = (1024, ZIP_EOCD_SIZE + 0xFFFF)
+ZIP_CENTRAL_HEADER_SIZE = 46
+
+
+def compression_codec(key: str) -> Optional[str]:
+    """Return the codec of a compressed object from its key's suffix, or None."""
+    lowered = key.lower()
+    for suffix, codec in COMPRESSION_SUFFIXES.items():
+        if lowered.endswith(suffix):
+            return codec
+    return None
+
+
+def uncompressed_key(key: str) -> str:
+    """Return a key without its compression suffix, e.g. "a/b.csv" for "a/b.csv.gz"."""
+    lowered = key.lower()
+    for suffix in COMPRESSION_SUFFIXES:
+        if lowered.endswith(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+def _decompressor(codec: str):
+    if codec == "gzip":
+        # 16 + MAX_WBITS: gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    raise ValueError(f"unsupported stream codec {codec}")
+
+
+def _decompress(decompressor, data: bytes, max_length: Optional[int]):
+    """Return the output of one decompress call and the input left for the next one."""
+    if isinstance(decompressor, bz2.BZ2Decompressor):
+        # bz2 keeps the input it has not consumed yet, and reports it through needs_input
+        return decompressor.decompress(data, -1 if max_length is None else max_length), b""
+    # zlib hands back the input held back by max_length (0 meaning no limit)
+    return decompressor.decompress(data, max_length or 0), decompressor.unconsumed_tail
+
+
+def _has_output(decompressor) -> bool:
+    return decompressor is not None and getattr(decompressor, "needs_input", True) is False
+
+
+def iter_decompressed(chunks: Iterable[bytes], codec: str, max_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Decompress a gzip or bz2 stream as it is read, yielding at most `max_bytes`.
+
+    `chunks` is only pulled while more output is wanted, so a capped read of
+    a large object stops downloading once the cap is reached. Concatenated
+    streams (multi-member gzip, parallel bzip2) are read one after another.
+    """
+    decompressor = _decompressor(codec)
+    remaining = max_bytes
+    for chunk in chunks:
+        data = chunk
+        while data or _has_output(decompressor):
+            if decompressor is None:
+                if not data.strip(b"\0"):
+                    # padding after the last stream
+                    break
+                decompressor = _decompressor(codec)
+            output, data = _decompress(decompressor, data, remaining)
+            if output:
+                yield output
+                if remaining is not None:
+                    remaining -= len(output)
+                    if remaining <= 0:
+                        return
+            if decompressor.eof:
+                data = decompressor.unused_data + data
+                decompressor = None
+            elif not output:
+                break
+
+
+def zip_entry_names(reader: RangeReader, max_entries: int = MAX_ZIP_ENTRIES) -> List[str]:
+    """
+    Return the entry names of a ZIP (or ZIP64) archive from its central directory.
+
+    Only the end of the archive is read: its end of central directory
+    record, then the directory itself, a few ranged GETs whatever the size.
+
+    Raises
+    ------
+        ValueError
+            If no end of central directory record is found, or the read budget runs out.
+    """
+    for search_bytes in ZIP_EOCD_SEARCH_BYTES:
+        tail_start = max(0, reader.size - search_bytes)
+        tail = reader.read(tail_start, reader.size - tail_start)
+        eocd = tail.rfind(ZIP_EOCD)
+        if eocd >= 0 and eocd + ZIP_EOCD_SIZE <= len(tail):
+            break
+        if tail_start == 0:
+            raise ValueError("no ZIP end of central directory record")
+    else:
+        raise ValueError("no ZIP end of central directory record")
+    entries, directory_size, directory_offset = struct.unpack("<HII", tail[eocd + 10:eocd + 20])
+
+    if 0xFFFFFFFF in (directory_size, directory_offset) or entries == 0xFFFF:
+        locator = eocd - 20
+        if locator < 0 or tail[locator:locator + 4] != ZIP64_EOCD_LOCATOR:
+            raise ValueError("ZIP64 archive without an end of central directory locator")
+        record_offset, = struct.unpack("<Q", tail[locator + 8:locator + 16])
+        record = reader.read(record_offset, 56)
+        if record[:4] != ZIP64_EOCD:
+            raise ValueError("bad ZIP64 end of central directory record")
+        entries, directory_size, directory_offset = struct.unpack("<QQQ", record[32:56])
+
+    directory_size = min(directory_size, reader.max_read_bytes)
+    directory = reader.read(directory_offset, directory_size)
+    names = []
+    offset = 0
+    while len(names) < min(entries, max_entries) and offset + ZIP_CENTRAL_HEADER_SIZE <= len(directory):
+        if directory[offset:offset + 4] != ZIP_CENTRAL_HEADER:
+            break
+        flags, = struct.unpack("<H", directory[offset + 8:offset + 10])
+        name_length, extra_length, comment_length = struct.unpack("<HHH", directory[offset + 28:offset + 34])
+        raw_name = directory[offset + ZIP_CENTRAL_HEADER_SIZE:offset + ZIP_CENTRAL_HEADER_SIZE + name_length]
+        # bit 11: the name is UTF-8, otherwise it is in code page 437
+        names.append(raw_name.decode("utf-8" if flags & 0x800 else "cp437", errors="replace"))
+        offset += ZIP_CENTRAL_HEADER_SIZE + name_length + extra_length + comment_length
+    return names
@@ -0,0 +1,139 @@
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+
+from app.metrics.registry import (
+    REFRESH_CONCURRENCY_ADJUSTMENTS,
+    REFRESH_CONCURRENCY_LIMIT,
+    s3_throttle_count,
+)
+
+
+# Objects a refresh works on at once: where the limit starts and how far it may move
+REFRESH_MIN_CONCURRENCY = int(os.getenv("REFRESH_MIN_CONCURRENCY", "2"))
+REFRESH_INITIAL_CONCURRENCY = int(os.getenv("REFRESH_INITIAL_CONCURRENCY", "8"))
+REFRESH_MAX_CONCURRENCY = int(os.getenv("REFRESH_MAX_CONCURRENCY", "64"))
+# Median latency, as a multiple of the best seen, above which the limit backs off
+CONCURRENCY_LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+# Multiplicative decrease applied on throttling, high latency or Meilisearch backpressure
+CONCURRENCY_BACKOFF = float(os.getenv("CONCURRENCY_BACKOFF", "0.7"))
+# Completed tasks per adjustment (at least the current limit, so each window sees a full round)
+CONCURRENCY_MIN_SAMPLES = 10
+
+# S3 error codes meaning the request rate is too high
+THROTTLE_ERROR_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+                        "TooManyRequests", "TooManyRequestsException", "503"}
+# Weight of a new window's latency when the baseline is above it, so the baseline follows lasting changes
+BASELINE_DRIFT = 0.1
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """Whether an exception is S3 (or another AWS API) asking the client to slow down."""
+    if not isinstance(error, ClientError):
+        return False
+    code = str(error.response.get("Error", {}).get("Code", ""))
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in THROTTLE_ERROR_CODES or status == 503
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD concurrency limit for the per-object work of a refresh.
+
+    Tasks run inside `slot()`, which blocks while `limit` tasks are already
+    running. After each window of completed tasks the limit grows by one,
+    unless S3 throttled a request, the median task latency rose past
+    CONCURRENCY_LATENCY_TOLERANCE times the best median seen, or Meilisearch
+    applied backpressure (`congested()`), in which case it is multiplied by
+    CONCURRENCY_BACKOFF. Every decision is counted in
+    `artemis3_refresh_concurrency_adjustments_total` and the limit is
+    exported as `artemis3_refresh_concurrency_limit`.
+    """
+
+    def __init__(self, pool: str,
+                 initial: Optional[int] = None,
+                 minimum: Optional[int] = None,
+                 maximum: Optional[int] = None):
+        self.pool = pool
+        self.minimum = max(1, REFRESH_MIN_CONCURRENCY if minimum is None else minimum)
+        self.maximum = max(self.minimum, REFRESH_MAX_CONCURRENCY if maximum is None else maximum)
+        initial = REFRESH_INITIAL_CONCURRENCY if initial is None else initial
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._in_flight = 0
+        self._samples: List[float] = []
+        self._baseline: Optional[float] = None
+        self._throttled = False
+        self._congested = False
+        self._throttles_seen = s3_throttle_count()
+        self._condition = threading.Condition()
+        REFRESH_CONCURRENCY_LIMIT.labels(pool).set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Run a task once fewer than `limit` are running, and learn from how it went."""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        start = time.perf_counter()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            raise
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._record(time.perf_counter() - start, throttled)
+                self._condition.notify_all()
+
+    def congested(self) -> None:
+        """Report that Meilisearch made the refresh wait, so the next adjustment backs off."""
+        with self._condition:
+            self._congested = True
+
+    def _record(self, latency: float, throttled: bool) -> None:
+        self._samples.append(latency)
+        self._throttled = self._throttled or throttled
+        if len(self._samples) >= max(CONCURRENCY_MIN_SAMPLES, self.limit):
+            self._adjust()
+
+    def _adjust(self) -> None:
+        median = statistics.median(self._samples)
+        self._samples.clear()
+        throttles = s3_throttle_count()
+        throttled = self._throttled or throttles > self._throttles_seen
+        self._throttles_seen = throttles
+        congested = self._congested
+        self._throttled = self._congested = False
+
+        if self._baseline is None or median < self._baseline:
+            self._baseline = median
+        else:
+            self._baseline += (median - self._baseline) * BASELINE_DRIFT
+
+        if throttled:
+            reason = "throttled"
+        elif congested:
+            reason = "backpressure"
+        elif median > self._baseline * CONCURRENCY_LATENCY_TOLERANCE:
+            reason = "latency"
+        else:
+            reason = "increase"
+
+        if reason == "increase":
+            self._limit = min(self.maximum, self._limit + 1)
+        else:
+            self._limit = max(self.minimum, self._limit * CONCURRENCY_BACKOFF)
+        REFRESH_CONCURRENCY_ADJUSTMENTS.labels(self.pool, reason).inc()
+        REFRESH_CONCURRENCY_LIMIT.labels(self.pool).set(self.limit)
@@ -0,0 +1,99 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.metrics.registry import track_call, track_stage
+
+
+# Bump an extractor's version whenever its output changes, so stale cache entries stop matching
+EXTRACTOR_VERSIONS = {
+    "text": "text:1",
+    "pdf": "pdf:1",
+    "pds_label": "pds_label:1",
+    "csv": "csv:1",
+    "json": "json:1",
+    "xml": "xml:1",
+    "image": "image:1",
+    "zip": "zip:1",
+    "gzip": "gzip:1",
+    "bz2": "bz2:1",
+}
+
+CacheKey = Tuple[str, str]
+
+
+@dataclass
+class Extraction:
+    """What an extractor got out of an object's content."""
+    keywords: List[str]
+    # extra document fields, e.g. the TargetName of a PDS label
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+
+def normalize_etag(etag: Optional[str]) -> Optional[str]:
+    """Return an ETag without its surrounding quotes, or None if there is none."""
+    if not etag:
+        return None
+    return etag.strip('"') or None
+
+
+def extraction_cache_key(etag: Optional[str], extractor: str) -> Optional[CacheKey]:
+    """
+    Return the cache key of an object's content for one extractor, or None if it can't be cached.
+
+    Extractors reading decompressed content, e.g. "gzip:csv", are versioned by both parts.
+    """
+    etag = normalize_etag(etag)
+    if etag is None:
+        return None
+    return etag, "+".join(EXTRACTOR_VERSIONS[part] for part in extractor.split(":"))
+
+
+def lookup_extractions(conn, etags: List[Optional[str]]) -> Dict[CacheKey, Extraction]:
+    """
+    Return the cached extractions of a batch of objects, by (etag, extractor version).
+
+    A cache that can't be read (e.g. a database created before the
+    `extraction_cache` table) is treated as empty.
+    """
+    etags = sorted({etag for etag in map(normalize_etag, etags) if etag})
+    if not etags:
+        return {}
+    try:
+        with track_stage("cache_lookup"), track_call("postgres", "select_extraction_cache"):
+            with conn.cursor() as cur:
+                cur.execute("""SELECT etag, extractor, keywords, fields FROM extraction_cache
+                                WHERE etag = ANY(%s)""", (etags,))
+                rows = cur.fetchall()
+            conn.commit()
+    except Exception as e:
+        print(f"Could not read the extraction cache: {e}")
+        conn.rollback()
+        return {}
+    return {(etag, extractor): Extraction(list(keywords or []), _load_fields(fields))
+            for etag, extractor, keywords, fields in rows}
+
+
+def _load_fields(fields: Any) -> Dict[str, Any]:
+    if not fields:
+        return {}
+    return fields if isinstance(fields, dict) else json.loads(fields)
+
+
+def store_extractions(conn, extracted: Dict[CacheKey, Extraction], cached: Dict[CacheKey, Extraction]) -> None:
+    """Save the extractions of a batch that were not already in the cache."""
+    rows = [(etag, extractor, extraction.keywords, json.dumps(extraction.fields))
+            for (etag, extractor), extraction in extracted.items()
+            if (etag, extractor) not in cached]
+    if not rows:
+        return
+    try:
+        with track_call("postgres", "insert_extraction_cache"):
+            with conn.cursor() as cur:
+                cur.executemany("""INSERT INTO extraction_cache (etag, extractor, keywords, fields)
+                                VALUES (%s, %s, %s, %s::jsonb)
+                                ON CONFLICT (etag, extractor) DO NOTHING""", rows)
+            conn.commit()
+    except Exception as e:
+        print(f"Could not update the extraction cache: {e}")
+        conn.rollback()
@@ -0,0 +1,295 @@
+import re
+import struct
+from typing import Any, Callable, Dict, Optional
+
+from app.s3.extraction_cache import Extraction
+from app.s3.pds_label import label_fields, label_keywords, parse_label
+from app.s3.structured_text import xml_keywords
+
+
+MAX_IMAGE_KEYWORDS = 500
+# Largest TIFF tag value or JP2 XML box that is read
+MAX_VALUE_BYTES = 256 * 1024
+
+JP2_SIGNATURE = b"\x00\x00\x00\x0cjP  \r\n\x87\n"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# uuid box holding a GeoTIFF with the georeferencing of a JP2 (GeoJP2)
+GEOJP2_UUID = bytes.fromhex("b14bf8bd083d4b43a5ae8cd7d5a6ce03")
+# JP2 boxes made of other boxes
+JP2_SUPERBOXES = {b"jp2h", b"asoc", b"res "}
+
+# TIFF tags read from the first IFD
+TIFF_WIDTH, TIFF_HEIGHT, TIFF_BITS, TIFF_SAMPLES = 256, 257, 258, 277
+TIFF_TEXT_TAGS = {270: "ImageDescription", 271: "Make", 272: "Model", 305: "Software", 315: "Artist"}
+TIFF_GEO_KEYS, TIFF_GEO_ASCII, TIFF_GDAL_METADATA = 34735, 34737, 42112
+# TIFF field type -> (struct format, size)
+TIFF_TYPES = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 6: ("b", 1), 7: ("B", 1),
+    8: ("h", 2), 9: ("i", 4), 11: ("f", 4), 12: ("d", 8), 16: ("Q", 8), 17: ("q", 8),
+}
+# GeoKeys naming the coordinate reference system, most specific first
+PROJECTED_CRS_KEY, GEOGRAPHIC_CRS_KEY, CITATION_KEY = 3072, 2048, 1026
+USER_DEFINED = 32767
+
+PNG_BANDS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# JPEG start-of-frame markers (SOF0-SOF15, without DHT, JPG and DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+_EPSG = re.compile(r"EPSG:+(?:[\d.]*:)?(\d+)", re.IGNORECASE)
+
+
+class RangeReader:
+    """
+    Read parts of an object through ranged GETs, on a budget.
+
+    The first `head_bytes` are fetched up front, as most headers fit in them
+    (none for formats read from the end); reads past the head each cost one
+    more request. Reads past the end of
+    the object, larger than `max_read_bytes`, or beyond `max_reads` requests
+    raise ValueError.
+    """
+
+    def __init__(self, fetch: Callable[[int, int], bytes], size: int,
+                 head_bytes: int, max_reads: int, max_read_bytes: int):
+        self._fetch = fetch
+        self.size = size
+        self.max_reads = max_reads
+        self.max_read_bytes = max_read_bytes
+        self.head = fetch(0, min(head_bytes, size)) if size and head_bytes else b""
+        self.reads = 1 if self.head else 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ValueError(f"read of {length} bytes at {offset} is past the end of the object")
+        if offset + length <= len(self.head):
+            return self.head[offset:offset + length]
+        if length > self.max_read_bytes:
+            raise ValueError(f"read of {length} bytes is over the {self.max_read_bytes} byte limit")
+        if self.reads >= self.max_reads:
+            raise ValueError(f"no ranged reads left after {self.reads}")
+        self.reads += 1
+        return self._fetch(offset, length)
+
+
+class BytesReader(RangeReader):
+    """A RangeReader over bytes already in memory, e.g. the GeoTIFF in a GeoJP2 box."""
+
+    def __init__(self, data: bytes):
+        super().__init__(lambda offset, length: data[offset:offset + length], len(data),
+                         len(data), 1, len(data))
+
+
+class _Metadata:
+    def __init__(self, image_format: str):
+        self.keywords: Dict[str, None] = {image_format: None}
+        self.fields: Dict[str, Any] = {}
+
+    def add(self, text: Optional[str]) -> None:
+        text = (text or "").strip().strip("\0").strip()
+        if text and len(self.keywords) < MAX_IMAGE_KEYWORDS:
+            self.keywords.setdefault(text, None)
+
+    def add_crs(self, text: str) -> None:
+        match = _EPSG.search(text)
+        if match and "Crs" not in self.fields:
+            self.fields["Crs"] = f"EPSG:{match.group(1)}"
+            self.add(self.fields["Crs"])
+
+    def extraction(self) -> Extraction:
+        if "Width" in self.fields and "Height" in self.fields:
+            self.add(f"{self.fields['Width']}x{self.fields['Height']}")
+        return Extraction(list(self.keywords), self.fields)
+
+
+def read_image_metadata(reader: RangeReader) -> Extraction:
+    """
+    Return the keywords and fields (Width, Height, Bands, Crs) found in an image's header.
+
+    The format is recognized from the header's magic bytes, not the content type.
+
+    Raises
+    ------
+        ValueError
+            If the header is not a JP2, TIFF, PNG, JPEG or PDS3 labelled image.
+    """
+    head = reader.head
+    if head.startswith(JP2_SIGNATURE):
+        return _jp2_metadata(reader)
+    if head[:4] in (b"II*\0", b"MM\0*", b"II+\0", b"MM\0+"):
+        metadata = _Metadata("TIFF")
+        _read_tiff(reader, metadata)
+        if "Crs" in metadata.fields:
+            metadata.add("GeoTIFF")
+        return metadata.extraction()
+    if head.startswith(PNG_SIGNATURE):
+        return _png_metadata(reader)
+    if head.startswith(b"\xff\xd8"):
+        return _jpeg_metadata(reader)
+    if head.lstrip().startswith(b"PDS_VERSION_ID"):
+        return _pds_image_metadata(reader)
+    raise ValueError("unrecognized image header")
+
+
+def _jp2_metadata(reader: RangeReader) -> Extraction:
+    metadata = _Metadata("JPEG2000")
+    _read_jp2_boxes(reader, metadata, 0, reader.size)
+    return metadata.extraction()
+
+
+def _read_jp2_boxes(reader: RangeReader, metadata: _Metadata, start: int, end: int) -> None:
+    offset = start
+    while offset + 8 <= end:
+        length, box_type = struct.unpack(">I4s", reader.read(offset, 8))
+        header = 8
+        if length == 1:
+            length, = struct.unpack(">Q", reader.read(offset + 8, 8))
+            header = 16
+        elif length == 0:
+            length = end - offset
+        if length < header:
+            raise ValueError(f"bad JP2 box length {length}")
+
+        content_start, content_length = offset + header, length - header
+        if box_type == b"jp2c":
+            # the codestream, the header boxes that matter come before it
+            return
+        if box_type in JP2_SUPERBOXES:
+            _read_jp2_boxes(reader, metadata, content_start, content_start + content_length)
+        elif box_type == b"ihdr":
+            height, width, bands, bits = struct.unpack(">IIHB", reader.read(content_start, 11))
+            metadata.fields.update({"Width": width, "Height": height, "Bands": bands})
+            metadata.add(f"{(bits & 0x7F) + 1}bit")
+        elif box_type in (b"xml ", b"lbl ") and content_length <= MAX_VALUE_BYTES:
+            text = reader.read(content_start, content_length)
+            if box_type == b"lbl ":
+                metadata.add(text.decode("utf-8", errors="replace"))
+            else:
+                # GML boxes name their CRS in srsName attributes
+                metadata.add_crs(text.decode("utf-8", errors="replace"))
+                for keyword in xml_keywords([text]):
+                    metadata.add(keyword)
+        elif box_type == b"uuid" and content_length <= MAX_VALUE_BYTES:
+            content = reader.read(content_start, content_length)
+            if content[:16] == GEOJP2_UUID:
+                metadata.add("GeoJP2")
+                # the embedded GeoTIFF is a 1x1 placeholder, keep the dimensions from ihdr
+                geotiff = _Metadata("TIFF")
+                _read_tiff(BytesReader(content[16:]), geotiff)
+                if "Crs" in geotiff.fields:
+                    metadata.add_crs(geotiff.fields["Crs"])
+                for keyword in list(geotiff.keywords)[1:]:
+                    metadata.add(keyword)
+        offset += length
+
+
+def _read_tiff(reader: RangeReader, metadata: _Metadata) -> None:
+    order = "<" if reader.head[:2] == b"II" else ">"
+    version, = struct.unpack(order + "H", reader.read(2, 2))
+    big = version == 43
+    if big:
+        ifd_offset, = struct.unpack(order + "Q", reader.read(8, 8))
+        count_format, entry_format, entry_size, inline_size = "Q", "HHQ8s", 20, 8
+    else:
+        ifd_offset, = struct.unpack(order + "I", reader.read(4, 4))
+        count_format, entry_format, entry_size, inline_size = "H", "HHI4s", 12, 4
+
+    count_size = struct.calcsize(count_format)
+    entries, = struct.unpack(order + count_format, reader.read(ifd_offset, count_size))
+    table = reader.read(ifd_offset + count_size, entries * entry_size)
+
+    values: Dict[int, Any] = {}
+    for index in range(entries):
+        tag, field_type, count, inline = struct.unpack(
+            order + entry_format, table[index * entry_size:(index + 1) * entry_size])
+        if field_type not in TIFF_TYPES:
+            continue
+        value_format, value_size = TIFF_TYPES[field_type]
+        size = count * value_size
+        if size <= inline_size:
+            data = inline[:size]
+        else:
+            if size > MAX_VALUE_BYTES:
+                continue
+            offset, = struct.unpack(order + ("Q" if big else "I"), inline)
+            try:
+                data = reader.read(offset, size)
+            except ValueError:
+                # out of the read budget, skip this tag
+                continue
+        if value_format == "s":
+            values[tag] = data.split(b"\0")[0].decode("latin-1")
+        else:
+            values[tag] = struct.unpack(f"{order}{count}{value_format}", data)
+
+    if TIFF_WIDTH in values and TIFF_HEIGHT in values:
+        metadata.fields["Width"] = int(values[TIFF_WIDTH][0])
+        metadata.fields["Height"] = int(values[TIFF_HEIGHT][0])
+    if TIFF_SAMPLES in values:
+        metadata.fields["Bands"] = int(values[TIFF_SAMPLES][0])
+    if TIFF_BITS in values:
+        metadata.add(f"{int(values[TIFF_BITS][0])}bit")
+    for tag in TIFF_TEXT_TAGS:
+        if isinstance(values.get(tag), str) and len(values[tag]) <= 256:
+            metadata.add(values[tag])
+    if isinstance(values.get(TIFF_GDAL_METADATA), str):
+        for keyword in xml_keywords([values[TIFF_GDAL_METADATA].encode("utf-8")]):
+            metadata.add(keyword)
+    if isinstance(values.get(TIFF_GEO_KEYS), tuple):
+        _read_geo_keys(values[TIFF_GEO_KEYS], values.get(TIFF_GEO_ASCII), metadata)
+
+
+def _read_geo_keys(directory: tuple, ascii_params: Optional[str], metadata: _Metadata) -> None:
+    keys = {}
+    for index in range(4, min(len(directory), 4 + 4 * directory[3]), 4):
+        key_id, location, count, value = directory[index:index + 4]
+        if location == 0:
+            keys[key_id] = value
+        elif location == TIFF_GEO_ASCII and isinstance(ascii_params, str):
+            keys[key_id] = ascii_params[value:value + count].rstrip("|")
+    for key_id in (PROJECTED_CRS_KEY, GEOGRAPHIC_CRS_KEY):
+        if isinstance(keys.get(key_id), int) and keys[key_id] != USER_DEFINED:
+            metadata.add_crs(f"EPSG:{keys[key_id]}")
+            break
+    if isinstance(keys.get(CITATION_KEY), str):
+        metadata.add(keys[CITATION_KEY])
+
+
+def _png_metadata(reader: RangeReader) -> Extraction:
+    metadata = _Metadata("PNG")
+    length, chunk_type, width, height, bits, color_type = struct.unpack(">I4sIIBB", reader.read(8, 18))
+    if chunk_type != b"IHDR":
+        raise ValueError("PNG without an IHDR chunk")
+    metadata.fields.update({"Width": width, "Height": height, "Bands": PNG_BANDS.get(color_type, 1)})
+    metadata.add(f"{bits}bit")
+    return metadata.extraction()
+
+
+def _jpeg_metadata(reader: RangeReader) -> Extraction:
+    metadata = _Metadata("JPEG")
+    offset = 2
+    while offset + 4 <= reader.size:
+        marker, length = struct.unpack(">BBH", reader.read(offset, 4))[1:]
+        if marker in JPEG_SOF_MARKERS:
+            bits, height, width, bands = struct.unpack(">BHHB", reader.read(offset + 4, 6))
+            metadata.fields.update({"Width": width, "Height": height, "Bands": bands})
+            metadata.add(f"{bits}bit")
+            break
+        if marker == 0xDA:
+            # start of scan without a frame header
+            break
+        offset += 2 + length
+    return metadata.extraction()
+
+
+def _pds_image_metadata(reader: RangeReader) -> Extraction:
+    metadata = _Metadata("PDS3")
+    statements = parse_label(reader.head.decode("latin-1").splitlines())
+    for keyword, field in (("LINE_SAMPLES", "Width"), ("LINES", "Height"), ("BANDS", "Bands")):
+        value = (statements.get(keyword) or [None])[0]
+        if isinstance(value, str) and value.isdigit():
+            metadata.fields[field] = int(value)
+    metadata.fields.update(label_fields(statements))
+    for keyword in label_keywords(statements):
+        metadata.add(keyword)
+    return metadata.extraction()
+
@@ -1,7 +1,8 @@
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from functools import partial
 import os
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import fitz
 import meilisearch
 
@@ -21,14 +22,67 @@ from app.s3.utils import (
     key_filename,
     parent_ancestors,
     path_depth,
+    build_subtree_filter,
+    escape_meili_filter_val,
 )
 from app.schemas.meili_models import MeiliDocumentModel
+from app.metrics.registry import (
+    EXTRACTION_CACHE,
+    REFRESH_OBJECTS,
+    observe_stage_bytes,
+    track_call,
+    track_stage,
+)
 from app.meilisearch.util import get_all_documents, get_all_indexes, get_doc_id, guess_mime_type
+from app.meilisearch.tasks import MEILI_TASK_POLL_SECONDS, task_uid, wait_for_queue_capacity, wait_for_tasks
+from app.s3.concurrency import AdaptiveLimiter
+from app.s3.rate_limit import REFRESH, current_priority, s3_priority, with_s3_priority
+from app.s3.extraction_cache import (
+    CacheKey,
+    Extraction,
+    extraction_cache_key,
+    lookup_extractions,
+    store_extractions,
+)
+from app.s3.pds_label import label_fields, label_keywords, parse_label
+from app.s3.structured_text import csv_keywords, json_keywords, xml_keywords
+from app.s3.imagery import RangeReader, read_image_metadata
+from app.s3.compressed import (
+    STREAM_CODECS,
+    compression_codec,
+    iter_decompressed,
+    uncompressed_key,
+    zip_entry_names,
+)
 
 
 # List of supported text file types for full-text indexing
-TEXT_CONTENT_TYPES = ["text/plain", "text/css", "text/csv", "text/xml", "application/xml"
-                      "text/html", "text/markdown", "application/json", "text/lbl", "text/lab"]
+TEXT_CONTENT_TYPES = ["text/plain", "text/css", "text/html", "text/markdown"]
+# Tables and documents read with a format-aware parser, only as far as STRUCTURED_MAX_BYTES
+STRUCTURED_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "text/xml": "xml",
+    "application/xml": "xml",
+}
+STRUCTURED_MAX_BYTES = int(os.getenv("STRUCTURED_MAX_BYTES", str(256 * 1024)))
+# PDS3 labels, parsed as KEYWORD = VALUE statements instead of as plain text
+PDS_LABEL_CONTENT_TYPES = ["text/lbl", "text/lab"]
+# Labels are read until their END statement, and never past this many bytes
+PDS_LABEL_MAX_BYTES = int(os.getenv("PDS_LABEL_MAX_BYTES", str(256 * 1024)))
+# Rasters whose header metadata is read with ranged GETs, never downloading the pixels
+IMAGE_CONTENT_TYPES = ["image/jp2", "image/jpx", "image/tiff", "image/png", "image/jpeg", "image/x-img"]
+# Bytes of an image fetched up front, enough for most headers
+IMAGE_HEADER_BYTES = int(os.getenv("IMAGE_HEADER_BYTES", str(64 * 1024)))
+# Ranged GETs per image, including the header one, and the most bytes read by any of them
+IMAGE_MAX_RANGE_READS = int(os.getenv("IMAGE_MAX_RANGE_READS", "8"))
+IMAGE_MAX_READ_BYTES = int(os.getenv("IMAGE_MAX_READ_BYTES", str(1024 * 1024)))
+# Decompressed bytes of a gzip or bz2 text object that are read
+DECOMPRESSED_MAX_BYTES = int(os.getenv("DECOMPRESSED_MAX_BYTES", str(1024 * 1024)))
+# Extractors whose content can be read from a decompressed stream
+STREAMABLE_EXTRACTORS = ("text", "csv", "json", "xml", "pds_label")
+# Bytes requested per read when streaming an object
+STREAM_CHUNK_BYTES = 16 * 1024
 # Keyword parsing separation characters
 SEPARATION_CHARACTERS = ["/", ",", "_", "-", " ", ".", "\n",
                          ":", "\\", "(", ")", "[", "]", "=", ";", "—", "*", "\""]
@@ -37,31 +91,79 @@ INDEX_SETTINGS = {
     "searchableAttributes": ["Tags", "FileName", "Key", "Keywords"],
     "filterableAttributes": [
         "ContentType", "Size", "StorageClass", "LastModified",
-        "ParentPath", "Ancestors", "Depth"
+        "ParentPath", "Ancestors", "Depth", "Key", "ID",
+        "TargetName", "InstrumentId", "ProductType",
+        "Width", "Height", "Bands", "Crs"
     ],
-    "sortableAttributes": ["Key", "Size", "LastModified"]
+    # ID breaks ties when paging search results with a cursor
+    "sortableAttributes": ["Key", "Size", "LastModified", "ID"]
 }
-
-
-def config_index_settings(index_obj: meilisearch.Client) -> None:
-    index_obj.update_settings(INDEX_SETTINGS)
+# Settings Meilisearch treats as sets, so the order it returns them in doesn't matter
+UNORDERED_SETTINGS = ("filterableAttributes", "sortableAttributes")
+# Settings whose change makes Meilisearch re-process every document in the index
+REINDEXING_SETTINGS = ("searchableAttributes", "filterableAttributes", "sortableAttributes")
+# New files whose tags are looked up together, in one query, before indexing them
+REFRESH_INDEX_BATCH_SIZE = int(os.getenv("REFRESH_INDEX_BATCH_SIZE", "500"))
+# From this many new files, a bucket's tags are streamed once instead of looked up per batch
+REFRESH_TAG_SCAN_MIN_FILES = int(os.getenv("REFRESH_TAG_SCAN_MIN_FILES", "20000"))
+# Removed files deleted per Meilisearch task and Postgres statement
+REFRESH_DELETE_BATCH_SIZE = int(os.getenv("REFRESH_DELETE_BATCH_SIZE", "1000"))
+# Documents sent per add_documents call when rebuilding an index from scratch
+REBUILD_BATCH_SIZE = int(os.getenv("REBUILD_BATCH_SIZE", "5000"))
+# A bucket's index is rebuilt into `<bucket><suffix>` then swapped with the live one
+REBUILD_INDEX_SUFFIX = "__rebuild"
+
+
+def _same_setting(name: str, current, wanted) -> bool:
+    if name in UNORDERED_SETTINGS and isinstance(current, list):
+        return sorted(current) == sorted(wanted)
+    return current == wanted
+
+
+def config_index_settings(index_obj: meilisearch.Client):
+    """
+    Apply the INDEX_SETTINGS that differ from the index's current settings.
+
+    Returns the settings task, or None when the index is already up to date.
+    """
+    try:
+        with track_call("meilisearch", "get_settings"):
+            current = index_obj.get_settings()
+    except Exception as e:
+        # e.g. an index whose creation is still enqueued, apply everything
+        print(f"Could not read settings of index {getattr(index_obj, 'uid', '')}: {e}")
+        current = {}
+
+    changed = {name: value for name, value in INDEX_SETTINGS.items()
+               if not _same_setting(name, current.get(name), value)}
+    if not changed:
+        return None
+
+    reindexing = [name for name in changed if name in REINDEXING_SETTINGS]
+    if reindexing and current:
+        print(f"Updating {', '.join(reindexing)} of index {getattr(index_obj, 'uid', '')}, "
+              "Meilisearch will re-index every document")
+    with track_call("meilisearch", "update_settings"):
+        return index_obj.update_settings(changed)
 
 def get_current_s3_objects(bucket_name: str, prefix: Optional[str] = None, s3_uri: Optional[str] = None):
     s3 = get_public_client()
     pager = s3.get_paginator("list_objects_v2")
     objects = []
     try:
-        for page in pager.paginate(Bucket=bucket_name, Prefix=prefix or ""):
-            contents = page.get("Contents", [])
-            objects.extend(contents)
-            if s3_uri is not None:
-                increment_listed(s3_uri, len(contents))
+        with track_stage("list"):
+            for page in pager.paginate(Bucket=bucket_name, Prefix=prefix or ""):
+                contents = page.get("Contents", [])
+                objects.extend(contents)
+                if s3_uri is not None:
+                    increment_listed(s3_uri, len(contents))
     except Exception as e:
         print("Error fetching s3 objects:", e)
 
     return objects
 
 
+@with_s3_priority(REFRESH)
 def refresh_meili_index(bucket_name: str, prefix: Optional[str] = None, s3_uri: Optional[str] = None) -> None:
     # start tracking at object listing
     if s3_uri is not None:
@@ -71,53 +173,282 @@ def refresh_meili_index(bucket_name: str, prefix: Optional[str] = None, s3_uri:
     meili_client = meilisearch.Client(meilisearch_url)
     current_files = get_current_s3_objects(bucket_name, prefix, s3_uri=s3_uri)
 
-    index_objs = get_all_indexes()
-    indexes = {f["uid"] for f in index_objs}
+    with track_stage("diff"):
+        index_objs = get_all_indexes()
+        indexes = {f["uid"] for f in index_objs}
 
-    if bucket_name in indexes:
-        prev_documents = get_all_documents(bucket_name, prefix)
+        if bucket_name in indexes:
+            prev_documents = get_all_documents(bucket_name, prefix)
 
-        prev_keys = [getattr(f, "Key") for f in prev_documents]
-        curr_keys = [f["Key"] for f in current_files]
+            prev_keys = [getattr(f, "Key") for f in prev_documents]
+            curr_keys = [f["Key"] for f in current_files]
 
-        # Detect new and removed files
-        new_files = [f for f in current_files if f["Key"] not in prev_keys]
-        removed_files = [f for f in prev_keys if f not in curr_keys]
+            # Detect new and removed files
+            new_files = [f for f in current_files if f["Key"] not in prev_keys]
+            removed_files = [f for f in prev_keys if f not in curr_keys]
 
-        # compute total work up front
-        total = len(new_files) + len(removed_files)
+            # compute total work up front
+            total = len(new_files) + len(removed_files)
 
-    else:
-        new_files = current_files
-        removed_files = []
-        total = len(new_files)
+        else:
+            new_files = current_files
+            removed_files = []
+            total = len(new_files)
 
     # track actual refresh
     if s3_uri is not None:
         set_status(s3_uri, status="running", total=total, reset_processed=True)
 
+    # uids of every Meilisearch task enqueued by this refresh, waited on before reporting it done
+    task_uids = []
     try:
         if bucket_name in indexes:
             idx = meili_client.index(bucket_name)
-            config_index_settings(idx)
+            task_uids.append(task_uid(config_index_settings(idx)))
 
             if new_files:
-                add_files_to_index(bucket_name, new_files, s3_uri=s3_uri)
+                task_uids.extend(add_files_to_index(bucket_name, new_files, s3_uri=s3_uri) or [])
             if removed_files:
-                remove_files_from_index(
-                    bucket_name, removed_files, s3_uri=s3_uri)
+                task_uids.extend(remove_files_from_index(
+                    bucket_name, removed_files, s3_uri=s3_uri) or [])
 
         else:
             # index doesn't exist, create a new index
             # object key includes invalid characters for primary key, create a hash of the key to use as the primary key instead
             # NOTE: this means that in order to access a specific document by key you must hash it first using get_doc_id
-            meili_client.create_index(bucket_name, {"primaryKey": "ID"})
+            with track_call("meilisearch", "create_index"):
+                task_uids.append(task_uid(meili_client.create_index(bucket_name, {"primaryKey": "ID"})))
             idx = meili_client.index(bucket_name)
-            config_index_settings(idx)
-            add_files_to_index(bucket_name, current_files, s3_uri=s3_uri)
+            task_uids.append(task_uid(config_index_settings(idx)))
+            task_uids.extend(add_files_to_index(bucket_name, current_files, s3_uri=s3_uri) or [])
+
+        # documents are only searchable once Meilisearch has processed their tasks
+        if s3_uri is not None:
+            set_status(s3_uri, status="indexing")
+        with track_stage("indexing"):
+            tasks = wait_for_tasks(meili_client, task_uids)
+        message = _failed_tasks_message(tasks)
+        if message:
+            print(f"Refresh of {bucket_name}: {message}")
+
+        if s3_uri is not None:
+            finish_refresh(s3_uri, failed_tasks=tasks["failed"],
+                           indexing_seconds=tasks["indexing_seconds"], message=message)
+
+    except Exception as e:
+        if s3_uri is not None:
+            fail_refresh(s3_uri, str(e))
+        raise
+
+
+def _failed_tasks_message(tasks: Dict[str, Any]) -> Optional[str]:
+    if not tasks["failed"]:
+        return None
+    return f"{tasks['failed']} of {tasks['tasks']} Meilisearch tasks failed: " + "; ".join(tasks["errors"])
+
+
+def list_child_folders(bucket_name: str, folder: str) -> List[str]:
+    """Return the folders directly inside `folder` ('' for the bucket root), from one delimited listing."""
+    s3 = get_public_client()
+    pager = s3.get_paginator("list_objects_v2")
+    children = []
+    with track_stage("list"):
+        for page in pager.paginate(Bucket=bucket_name, Prefix=folder + "/" if folder else "", Delimiter="/"):
+            children.extend(normalize_s3_path(p["Prefix"]) for p in page.get("CommonPrefixes", []))
+    return [child for child in children if child]
+
+
+def plan_refresh_shards(bucket_name: str, prefix: Optional[str], shards: int) -> List[Tuple[str, str]]:
+    """
+    Split the refresh of a folder into about `shards` (folder, scope) pairs.
+
+    Starting from the whole folder as one subtree, subtree shards are split
+    breadth first into a `files` shard for the objects directly in the folder
+    and a subtree shard per child folder, until there are enough. The shards
+    never overlap and together cover every key in the folder, so each one can
+    diff its part of the index against S3 on its own. A flat folder with no
+    child folders stays a single shard.
+    """
+    folder = normalize_s3_path(prefix)
+    plan = [(folder, "subtree")]
+    position = 0
+    while len(plan) < shards and position < len(plan):
+        shard_folder, scope = plan[position]
+        children = list_child_folders(bucket_name, shard_folder) if scope == "subtree" else []
+        if not children:
+            position += 1
+            continue
+        plan[position:position + 1] = [(shard_folder, "files")] + [(child, "subtree") for child in children]
+        position += 1
+    return plan
+
+
+def prepare_index(bucket_name: str) -> None:
+    """Create the bucket's index if needed and apply INDEX_SETTINGS, waiting for both."""
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+    task_uids = []
+    if bucket_name not in {f["uid"] for f in get_all_indexes()}:
+        with track_call("meilisearch", "create_index"):
+            task_uids.append(task_uid(meili_client.create_index(bucket_name, {"primaryKey": "ID"})))
+    task_uids.append(task_uid(config_index_settings(meili_client.index(bucket_name))))
+    tasks = wait_for_tasks(meili_client, task_uids)
+    if tasks["failed"]:
+        raise RuntimeError(f"Preparing index {bucket_name} failed: " + "; ".join(tasks["errors"]))
+
+
+def _shard_filter(folder: str, scope: str) -> Optional[str]:
+    if scope == "files":
+        return f"ParentPath = '{escape_meili_filter_val(folder)}'"
+    return build_subtree_filter(folder) if folder else None
+
+
+@with_s3_priority(REFRESH)
+def refresh_shard(bucket_name: str, folder: str, scope: str) -> Dict[str, Any]:
+    """
+    Refresh the part of a bucket's index covered by one shard of a sharded refresh.
+
+    Lists the shard's objects, diffs them against the documents of the same
+    folder (or subtree), indexes the new files, removes the deleted ones,
+    and waits for Meilisearch to process it all. The index must exist, see
+    `prepare_index`.
+
+    Returns
+    -------
+        dict
+            `listed`, `added` and `removed` objects, `failed_tasks`, and a
+            `message` describing the failed tasks if any.
+    """
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+    s3 = get_public_client()
+    pager = s3.get_paginator("list_objects_v2")
+    listing = {"Bucket": bucket_name, "Prefix": folder + "/" if folder else ""}
+    if scope == "files":
+        listing["Delimiter"] = "/"
+
+    current_files = []
+    with track_stage("list"):
+        for page in pager.paginate(**listing):
+            current_files.extend(page.get("Contents", []))
+
+    with track_stage("diff"):
+        filter = _shard_filter(folder, scope)
+        prev_keys = {getattr(f, "Key") for f in get_all_documents(bucket_name, folder, filter=filter)}
+        curr_keys = {f["Key"] for f in current_files}
+        new_files = [f for f in current_files if f["Key"] not in prev_keys]
+        removed_files = [key for key in prev_keys if key not in curr_keys]
+
+    task_uids = []
+    if new_files:
+        task_uids.extend(add_files_to_index(bucket_name, new_files) or [])
+    if removed_files:
+        task_uids.extend(remove_files_from_index(bucket_name, removed_files) or [])
+    with track_stage("indexing"):
+        tasks = wait_for_tasks(meili_client, task_uids)
+    return {"listed": len(current_files), "added": len(new_files), "removed": len(removed_files),
+            "failed_tasks": tasks["failed"], "message": _failed_tasks_message(tasks)}
+
+
+def sweep_unsharded_documents(bucket_name: str, folder: str, plan: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """
+    Remove the documents of a folder that none of the shards in `plan` covered.
+
+    Shards are planned from the folders in S3, so the documents of a folder
+    deleted from S3 belong to no shard; this last step of a sharded refresh
+    removes them, leaving the index consistent with the bucket.
+    """
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    def listed(folders: List[str]) -> str:
+        return "[" + ", ".join(f"'{escape_meili_filter_val(f)}'" for f in folders) + "]"
+
+    conditions = [build_subtree_filter(folder)] if folder else []
+    files_folders = [shard_folder for shard_folder, scope in plan if scope == "files"]
+    subtree_folders = [shard_folder for shard_folder, scope in plan if scope == "subtree"]
+    if files_folders:
+        conditions.append(f"NOT ParentPath IN {listed(files_folders)}")
+    if subtree_folders:
+        conditions.append(f"NOT Ancestors IN {listed(subtree_folders)}")
+
+    with track_stage("diff"):
+        removed_keys = [getattr(f, "Key") for f in get_all_documents(bucket_name, filter=" AND ".join(conditions))]
+    task_uids = remove_files_from_index(bucket_name, removed_keys) if removed_keys else []
+    with track_stage("indexing"):
+        tasks = wait_for_tasks(meili_client, task_uids)
+    return {"removed": len(removed_keys), "failed_tasks": tasks["failed"],
+            "message": _failed_tasks_message(tasks)}
+
+
+@with_s3_priority(REFRESH)
+def rebuild_meili_index(bucket_name: str, prefix: Optional[str] = None, s3_uri: Optional[str] = None) -> None:
+    """
+    Rebuild a bucket's index from scratch without taking search offline.
+
+    Documents are built into a shadow index, which gets the index settings
+    before any document so Meilisearch indexes each batch once, and are sent
+    REBUILD_BATCH_SIZE at a time. Files outside `prefix` are copied over from
+    the live index as they are. Once every task has succeeded the shadow index
+    is swapped with the live one in a single atomic task, and the previous
+    documents are dropped. If any task fails the live index is left untouched.
+
+    Tag edits made while the rebuild runs are saved, but only reach the
+    rebuilt index on the next refresh.
+    """
+    if s3_uri is not None:
+        start_refresh(s3_uri, total=0, status="listing")
+
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+    shadow_name = bucket_name + REBUILD_INDEX_SUFFIX
+    current_files = get_current_s3_objects(bucket_name, prefix, s3_uri=s3_uri)
+
+    if s3_uri is not None:
+        set_status(s3_uri, status="running", total=len(current_files), reset_processed=True)
+
+    try:
+        indexes = {f["uid"] for f in get_all_indexes()}
+        if shadow_name in indexes:
+            # left behind by a rebuild that did not finish
+            with track_call("meilisearch", "delete_index"):
+                stale = meili_client.delete_index(shadow_name)
+            wait_for_tasks(meili_client, [task_uid(stale)])
+        if bucket_name not in indexes:
+            # the swap needs a live index, an empty one is replaced right away
+            with track_call("meilisearch", "create_index"):
+                meili_client.create_index(bucket_name, {"primaryKey": "ID"})
+
+        with track_call("meilisearch", "create_index"):
+            task_uids = [task_uid(meili_client.create_index(shadow_name, {"primaryKey": "ID"}))]
+        shadow = meili_client.index(shadow_name)
+        task_uids.append(task_uid(config_index_settings(shadow)))
+        task_uids.extend(build_shadow_index(bucket_name, shadow, meili_client, current_files, s3_uri=s3_uri))
+        if prefix and bucket_name in indexes:
+            task_uids.extend(copy_documents(meili_client.index(bucket_name), shadow,
+                                            f"NOT {build_subtree_filter(prefix)}"))
+
+        if s3_uri is not None:
+            set_status(s3_uri, status="indexing")
+        with track_stage("indexing"):
+            tasks = wait_for_tasks(meili_client, task_uids)
+        message = _failed_tasks_message(tasks)
+        if message:
+            raise RuntimeError(f"Rebuild of {bucket_name} abandoned, {message}")
+
+        with track_call("meilisearch", "swap_indexes"):
+            swap_task = meili_client.swap_indexes([{"indexes": [bucket_name, shadow_name]}])
+        swap = wait_for_tasks(meili_client, [task_uid(swap_task)])
+        if swap["failed"]:
+            raise RuntimeError(f"Swapping {shadow_name} into {bucket_name} failed: " + "; ".join(swap["errors"]))
+        print(f"Rebuilt {bucket_name} with {len(current_files)} objects, indexed in {tasks['indexing_seconds']}s")
+
+        # the shadow index now holds the previous documents
+        with track_call("meilisearch", "delete_index"):
+            meili_client.delete_index(shadow_name)
 
         if s3_uri is not None:
-            finish_refresh(s3_uri)
+            finish_refresh(s3_uri, indexing_seconds=tasks["indexing_seconds"])
 
     except Exception as e:
         if s3_uri is not None:
@@ -125,19 +456,94 @@ def refresh_meili_index(bucket_name: str, prefix: Optional[str] = None, s3_uri:
         raise
 
 
-def create_document(index: str, file, meili_client: meilisearch.Client, dbTags: dict[str, tuple], s3_uri: Optional[str] = None) -> None:
+def build_shadow_index(bucket_name: str, shadow, meili_client: meilisearch.Client,
+                       files: List, s3_uri: Optional[str] = None) -> List[Optional[int]]:
+    """
+    Build the documents of `files` and add them to `shadow` in large batches.
+
+    Returns the Meilisearch task uid of every batch.
+    """
+    postgres_url = os.getenv("DATABASE_URL")
+    limiter = AdaptiveLimiter("rebuild")
+    build = limited(limiter, build_document)
+
+    task_uids = []
+    with psycopg.connect(postgres_url) as conn:
+        for batch, dbTags in iter_tagged_batches(conn, bucket_name, files, REBUILD_BATCH_SIZE):
+            cached = lookup_extractions(conn, [f.get("ETag") for f in batch])
+            extracted = dict(cached)
+            with ThreadPoolExecutor(max_workers=limiter.maximum) as executor:
+                futures = [(file, executor.submit(build, bucket_name, file, dbTags, extracted))
+                           for file in batch]
+            documents = []
+            for file, future in futures:
+                try:
+                    document = future.result()
+                except Exception as e:
+                    print(f"Error indexing {file['Key']}: {e}")
+                    continue
+                if document is None:
+                    REFRESH_OBJECTS.labels("skipped").inc()
+                else:
+                    documents.append(document)
+
+            if documents:
+                with track_stage("backpressure"):
+                    if wait_for_queue_capacity(meili_client) >= MEILI_TASK_POLL_SECONDS:
+                        limiter.congested()
+                with track_stage("meili_write"), track_call("meilisearch", "add_documents"):
+                    task_uids.append(task_uid(shadow.add_documents(documents)))
+                REFRESH_OBJECTS.labels("indexed").inc(len(documents))
+            store_extractions(conn, extracted, cached)
+            if s3_uri is not None:
+                increment_processed(s3_uri, len(batch))
+    return task_uids
+
+
+def limited(limiter: AdaptiveLimiter, func: Callable) -> Callable:
+    """
+    Wrap `func` so each call runs in one of the limiter's slots.
+
+    Calls keep the S3 priority of the code that wrapped `func`, even in
+    executor threads, which don't inherit it.
+    """
+    priority = current_priority()
+
+    def run(*args, **kwargs):
+        with limiter.slot(), s3_priority(priority):
+            return func(*args, **kwargs)
+    return run
+
+
+def copy_documents(source, target, filter: str) -> List[Optional[int]]:
+    """Copy the documents of `source` matching `filter` into `target`, REBUILD_BATCH_SIZE at a time."""
+    task_uids = []
+    offset = 0
+    while True:
+        with track_call("meilisearch", "get_documents"):
+            page = source.get_documents({"filter": filter, "limit": REBUILD_BATCH_SIZE, "offset": offset})
+        if not page.results:
+            break
+        with track_call("meilisearch", "add_documents"):
+            task_uids.append(task_uid(target.add_documents([dict(vars(document)) for document in page.results])))
+        offset += len(page.results)
+    return task_uids
+
+
+def build_document(index: str, file, dbTags: dict[str, tuple],
+                   extracted: Optional[Dict[CacheKey, Extraction]] = None) -> Optional[Dict[str, Any]]:
+    """Return the Meilisearch document of an object, or None for folder placeholders."""
     s3 = get_public_client()
 
     # prefixing logic to handle folders
     raw_key = file["Key"]
     if raw_key.endswith("/"):
-        if s3_uri is not None:
-            increment_processed(s3_uri, 1)
-        return
+        return None
 
     norm_key = normalize_s3_path(raw_key)
     hashed_key = get_doc_id(raw_key)
-    head = s3.head_object(Bucket=index, Key=raw_key)
+    with track_stage("head"):
+        head = s3.head_object(Bucket=index, Key=raw_key)
     size = file["Size"]
     storage_class = file.get("StorageClass", "STANDARD")
     ctype = head.get("ContentType", "unknown")
@@ -147,15 +553,13 @@ def create_document(index: str, file, meili_client: meilisearch.Client, dbTags:
     ancestors = parent_ancestors(parent_path)
     depth = path_depth(parent_path)
     tags = dbTags[hashed_key][2] if hashed_key in dbTags else []
-    keywords = []
 
     if ctype == "binary/octet-stream":
         ctype = guess_mime_type(norm_key.split(".")[-1])
 
-    if ctype in TEXT_CONTENT_TYPES:
-        keywords = get_keywords_from_text(index, raw_key)
-    elif ctype == "application/pdf":
-        keywords = get_keywords_from_pdf(index, raw_key)
+    extractor = compressed_extractor(norm_key) if compression_codec(norm_key) else content_extractor(ctype)
+    extraction = extract_content(index, file, extractor, extracted) if extractor else Extraction([])
+    keywords = extraction.keywords
 
     if len(keywords) == 0:
         keywords = get_keywords_from_key(raw_key)
@@ -172,43 +576,159 @@ def create_document(index: str, file, meili_client: meilisearch.Client, dbTags:
         "StorageClass": storage_class,
         "ContentType": ctype,
         "Keywords": keywords,
-        "Tags": tags
+        "Tags": tags,
+        **extraction.fields
     }
-    meili_client.index(index).add_documents([new_document])
-    if s3_uri is not None:
-        increment_processed(s3_uri, 1)
+    return new_document
 
 
-def add_files_to_index(index: str, new_files: List, s3_uri: Optional[str] = None) -> None:
+def create_document(index: str, file, meili_client: meilisearch.Client, dbTags: dict[str, tuple], s3_uri: Optional[str] = None,
+                    extracted: Optional[Dict[CacheKey, Extraction]] = None):
+    new_document = build_document(index, file, dbTags, extracted)
+    if new_document is None:
+        REFRESH_OBJECTS.labels("skipped").inc()
+        if s3_uri is not None:
+            increment_processed(s3_uri, 1)
+        return None
+
+    with track_stage("meili_write"), track_call("meilisearch", "add_documents"):
+        task = meili_client.index(index).add_documents([new_document])
+    REFRESH_OBJECTS.labels("indexed").inc()
+    if s3_uri is not None:
+        increment_processed(s3_uri, 1)
+    return task
+
+
+def lookup_file_tags(cur, hashed_keys: List[str]) -> dict[str, tuple]:
+    """Return the `file_tags` rows of the given files only."""
+    cur.execute("""SELECT hashed_key, bucket, tags FROM file_tags WHERE hashed_key = ANY(%s)""",
+                (hashed_keys,))
+    return {record[0]: record for record in cur.fetchall()}
+
+
+def scan_file_tags(conn, bucket: str, hashed_keys: set[str]) -> dict[str, tuple]:
+    """
+    Stream a bucket's `file_tags` rows through a server-side cursor.
+
+    Used when most of a bucket is being (re)indexed, where one sequential
+    read beats a lookup per batch. Only rows of files being indexed are kept,
+    and rows are fetched REFRESH_INDEX_BATCH_SIZE at a time.
+    """
+    tags = {}
+    with conn.cursor(name="refresh_file_tags_scan") as cur:
+        cur.itersize = REFRESH_INDEX_BATCH_SIZE
+        cur.execute("""SELECT hashed_key, bucket, tags FROM file_tags WHERE bucket=%s""", (bucket,))
+        for record in cur:
+            if record[0] in hashed_keys:
+                tags[record[0]] = record
+    return tags
+
+
+def iter_tagged_batches(conn, bucket: str, files: List, batch_size: int) -> Iterator[Tuple[List, dict[str, tuple]]]:
+    """
+    Yield `files` in batches of `batch_size`, each with the `file_tags` rows it needs.
+
+    Tags are looked up per batch, or streamed once for the whole bucket from
+    REFRESH_TAG_SCAN_MIN_FILES files.
+    """
+    scanned_tags = None
+    if len(files) >= REFRESH_TAG_SCAN_MIN_FILES:
+        with track_stage("tags_lookup"), track_call("postgres", "scan_file_tags"):
+            scanned_tags = scan_file_tags(conn, bucket, {get_doc_id(f["Key"]) for f in files})
+        conn.commit()
+
+    with conn.cursor() as cur:
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            if scanned_tags is not None:
+                dbTags = scanned_tags
+            else:
+                with track_stage("tags_lookup"), track_call("postgres", "select_file_tags"):
+                    dbTags = lookup_file_tags(cur, [get_doc_id(f["Key"]) for f in batch])
+                # end the read transaction so the connection doesn't sit idle in one while indexing
+                conn.commit()
+            yield batch, dbTags
+
+
+def add_files_to_index(index: str, new_files: List, s3_uri: Optional[str] = None) -> List[int]:
+    """
+    Index new files in batches of REFRESH_INDEX_BATCH_SIZE.
+
+    Before each batch is enqueued, waits for the Meilisearch task queue to
+    drain below MEILI_MAX_QUEUED_TASKS so the refresh does not outrun indexing.
+    Files are indexed concurrently, as many at once as an AdaptiveLimiter allows.
+
+    Returns the Meilisearch task uid of every indexed file.
+    """
     meilisearch_url = os.getenv("MEILISEARCH_URL")
     meili_client = meilisearch.Client(meilisearch_url)
     postgres_url = os.getenv("DATABASE_URL")
+    limiter = AdaptiveLimiter("index")
 
+    task_uids = []
     with psycopg.connect(postgres_url) as conn:
-        with conn.cursor() as cur:
-            cur.execute("""SELECT * FROM file_tags WHERE bucket=%s""", (index,))
-            dbTags = {record[0]: record for record in cur.fetchall()}
-
-    create_with_args = partial(
-        create_document, index, meili_client=meili_client, dbTags=dbTags, s3_uri=s3_uri)
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(create_with_args, new_files)
-
-
-def remove_files_from_index(index: str, removed_keys: List[str], s3_uri: Optional[str] = None) -> None:
+        for batch, dbTags in iter_tagged_batches(conn, index, new_files, REFRESH_INDEX_BATCH_SIZE):
+            with track_stage("backpressure"):
+                if wait_for_queue_capacity(meili_client) >= MEILI_TASK_POLL_SECONDS:
+                    limiter.congested()
+
+            cached = lookup_extractions(conn, [f.get("ETag") for f in batch])
+            extracted = dict(cached)
+            create_with_args = limited(limiter, partial(
+                create_document, index, meili_client=meili_client, dbTags=dbTags, s3_uri=s3_uri,
+                extracted=extracted))
+
+            with ThreadPoolExecutor(max_workers=limiter.maximum) as executor:
+                futures = [(file, executor.submit(create_with_args, file)) for file in batch]
+            for file, future in futures:
+                try:
+                    uid = task_uid(future.result())
+                except Exception as e:
+                    print(f"Error indexing {file['Key']}: {e}")
+                    continue
+                if uid is not None:
+                    task_uids.append(uid)
+            store_extractions(conn, extracted, cached)
+    return task_uids
+
+
+def remove_files_from_index(index: str, removed_keys: List[str], s3_uri: Optional[str] = None) -> List[int]:
+    """
+    Remove deleted files from the index and their tags from the database, in chunks.
+
+    Each chunk of REFRESH_DELETE_BATCH_SIZE keys is one `delete_documents`
+    task and one `DELETE ... ANY` statement, committed before the next chunk
+    so progress survives a failure part way through.
+
+    Returns the Meilisearch task uid of every chunk.
+    """
     meilisearch_url = os.getenv("MEILISEARCH_URL")
     meili_client = meilisearch.Client(meilisearch_url)
     postgres_url = os.getenv("DATABASE_URL")
+    meili_index = meili_client.index(index)
 
+    task_uids = []
     with psycopg.connect(postgres_url) as conn:
         with conn.cursor() as cur:
-            for key in removed_keys:
-                hashed_key = get_doc_id(key)
-                meili_client.index(index).delete_document(hashed_key)
-                cur.execute("""DELETE FROM file_tags WHERE hashed_key=%s""", (hashed_key,))
+            for start in range(0, len(removed_keys), REFRESH_DELETE_BATCH_SIZE):
+                chunk = removed_keys[start:start + REFRESH_DELETE_BATCH_SIZE]
+                hashed_keys = [get_doc_id(key) for key in chunk]
+                with track_stage("backpressure"):
+                    wait_for_queue_capacity(meili_client)
+                with track_stage("delete"):
+                    with track_call("meilisearch", "delete_documents"):
+                        task = meili_index.delete_documents(hashed_keys)
+                    with track_call("postgres", "delete_file_tags"):
+                        cur.execute("""DELETE FROM file_tags WHERE hashed_key = ANY(%s)""", (hashed_keys,))
+                    conn.commit()
+                uid = task_uid(task)
+                if uid is not None:
+                    task_uids.append(uid)
+                print(f"Removed {start + len(chunk)}/{len(removed_keys)} files from {index} (task {uid})")
+                REFRESH_OBJECTS.labels("removed").inc(len(chunk))
                 if s3_uri is not None:
-                    increment_processed(s3_uri, 1)
+                    increment_processed(s3_uri, len(chunk))
+    return task_uids
 
 
 def get_keywords_from_key(key: str):
@@ -220,26 +740,29 @@ def get_keywords_from_key(key: str):
     return keywords
 
 
-def get_keywords_from_text(index: str, key: str):
+def extract_text_keywords(index: str, key: str) -> List[str]:
+    """Return the keywords of a text object, raising if it can't be read."""
     s3 = get_public_client()
-    keywords = []
-    try:
+    with track_stage("get"):
         response = s3.get_object(Bucket=index, Key=key)
-        text_content = response["Body"].read().decode("utf-8")
+        raw_content = response["Body"].read()
+    observe_stage_bytes("get", len(raw_content))
+    with track_stage("parse_text"):
+        text_content = raw_content.decode("utf-8")
         keywords = get_keywords_from_key(text_content)
-    except Exception as e:
-        print(f"Error extracting text content from {key}", e)
-        keywords = get_keywords_from_key(key)
     # only read up to 500 words to prevent index bloating on large text files
     return keywords[:500]
 
 
-def get_keywords_from_pdf(index: str, key: str):
+def extract_pdf_keywords(index: str, key: str) -> List[str]:
+    """Return the keywords of a PDF object, raising if it can't be read."""
     s3 = get_public_client()
     keywords = []
-    try:
+    with track_stage("get"):
         response = s3.get_object(Bucket=index, Key=key)
         pdf_stream = response["Body"].read()
+    observe_stage_bytes("get", len(pdf_stream))
+    with track_stage("parse_pdf"):
         pdf_document = fitz.open("application/pdf", pdf_stream)
         for page in pdf_document:
             text = page.get_text("text")
@@ -247,8 +770,209 @@ def get_keywords_from_pdf(index: str, key: str):
                 keywords.extend(get_keywords_from_key(text))
             if len(keywords) > 500:
                 break
+    return keywords[:500]
 
+
+def get_keywords_from_text(index: str, key: str):
+    try:
+        return extract_text_keywords(index, key)
+    except Exception as e:
+        print(f"Error extracting text content from {key}", e)
+        return get_keywords_from_key(key)[:500]
+
+
+def get_keywords_from_pdf(index: str, key: str):
+    try:
+        return extract_pdf_keywords(index, key)
     except Exception as e:
         print(f"Error extracting text content from {key}: {e}")
-        keywords = get_keywords_from_key(key)
-    return keywords[:500]
\ No newline at end of file
+        return get_keywords_from_key(key)[:500]
+
+
+def iter_object_chunks(index: str, key: str, max_bytes: Optional[int] = None,
+                       codec: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Yield the bytes of an object as it downloads, reading at most `max_bytes`.
+
+    With a `codec` ("gzip" or "bz2") the object is decompressed as it streams
+    and `max_bytes` caps the decompressed bytes instead.
+
+    Close the generator once done with it (e.g. with `contextlib.closing`) so
+    an object that was only partly read is released straight away.
+    """
+    if codec is not None:
+        with closing(iter_object_chunks(index, key)) as compressed:
+            yield from iter_decompressed(compressed, codec, max_bytes)
+        return
+
+    s3 = get_public_client()
+    with track_stage("get"):
+        response = s3.get_object(Bucket=index, Key=key)
+    body = response["Body"]
+    read = 0
+    try:
+        while max_bytes is None or read < max_bytes:
+            chunk = body.read(STREAM_CHUNK_BYTES if max_bytes is None else min(STREAM_CHUNK_BYTES, max_bytes - read))
+            if not chunk:
+                break
+            read += len(chunk)
+            yield chunk
+    finally:
+        body.close()
+        observe_stage_bytes("get", read)
+
+
+def iter_object_lines(index: str, key: str, max_bytes: Optional[int] = None,
+                      codec: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield the lines of an object as it downloads, like `iter_object_chunks`.
+
+    A last line cut short by `max_bytes` is dropped.
+    """
+    buffer = b""
+    read = 0
+    with closing(iter_object_chunks(index, key, max_bytes, codec)) as chunks:
+        for chunk in chunks:
+            read += len(chunk)
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                yield line.decode("utf-8", errors="replace")
+    if buffer and (max_bytes is None or read < max_bytes):
+        yield buffer.decode("utf-8", errors="replace")
+
+
+def extract_pds_label(index: str, key: str, codec: Optional[str] = None) -> Extraction:
+    """Return the keywords and fields of a PDS3 label, read only up to its END statement."""
+    with track_stage("parse_label"), closing(iter_object_lines(index, key, PDS_LABEL_MAX_BYTES, codec)) as lines:
+        statements = parse_label(lines)
+    if not statements:
+        raise ValueError("no PDS3 label statements found")
+    return Extraction(label_keywords(statements), label_fields(statements))
+
+
+def extract_structured_keywords(index: str, key: str, extractor: str, codec: Optional[str] = None) -> List[str]:
+    """Return the keywords of a CSV, JSON or XML object, reading at most STRUCTURED_MAX_BYTES of it."""
+    if extractor == "csv":
+        with track_stage("parse_csv"), closing(iter_object_lines(index, key, STRUCTURED_MAX_BYTES, codec)) as lines:
+            return csv_keywords(lines)
+    parse = json_keywords if extractor == "json" else xml_keywords
+    with track_stage(f"parse_{extractor}"), \
+            closing(iter_object_chunks(index, key, STRUCTURED_MAX_BYTES, codec)) as chunks:
+        return parse(chunks)
+
+
+def extract_decompressed_text_keywords(index: str, key: str, codec: str) -> List[str]:
+    """Return the keywords of a gzip or bz2 text object, from its first DECOMPRESSED_MAX_BYTES."""
+    with closing(iter_object_lines(index, key, DECOMPRESSED_MAX_BYTES, codec)) as lines:
+        text = "\n".join(lines)
+    with track_stage("parse_text"):
+        return get_keywords_from_key(text)[:500]
+
+
+def extract_zip_keywords(index: str, file) -> List[str]:
+    """Return the keywords of a ZIP archive's entry names, read from its central directory with ranged GETs."""
+    reader = RangeReader(partial(read_object_range, index, file["Key"]), file["Size"],
+                         0, IMAGE_MAX_RANGE_READS, IMAGE_MAX_READ_BYTES)
+    with track_stage("parse_zip"):
+        names = zip_entry_names(reader)
+    keywords: Dict[str, None] = {}
+    for name in names:
+        keywords.setdefault(key_filename(normalize_s3_path(name)) or name, None)
+    for name in names:
+        for word in get_keywords_from_key(name):
+            keywords.setdefault(word, None)
+    return list(keywords)[:500]
+
+
+def read_object_range(index: str, key: str, start: int, length: int) -> bytes:
+    """Return `length` bytes of an object from `start`, with a single ranged GET."""
+    s3 = get_public_client()
+    with track_stage("get"):
+        response = s3.get_object(Bucket=index, Key=key, Range=f"bytes={start}-{start + length - 1}")
+        with closing(response["Body"]) as body:
+            data = body.read()
+    observe_stage_bytes("get", len(data))
+    return data
+
+
+def extract_image_metadata(index: str, file) -> Extraction:
+    """Return the keywords and fields of an image's header, read with a few ranged GETs."""
+    reader = RangeReader(partial(read_object_range, index, file["Key"]), file["Size"],
+                         IMAGE_HEADER_BYTES, IMAGE_MAX_RANGE_READS, IMAGE_MAX_READ_BYTES)
+    with track_stage("parse_image"):
+        return read_image_metadata(reader)
+
+
+def compressed_extractor(key: str) -> Optional[str]:
+    """
+    Return the extractor of a compressed object from its key, or None if its content isn't read.
+
+    ZIP archives are listed ("zip"); gzip and bz2 objects are read with the
+    extractor of the key without its suffix, e.g. "gzip:csv" for "a.csv.gz".
+    """
+    codec = compression_codec(key)
+    if codec not in STREAM_CODECS:
+        return codec
+    inner_key = uncompressed_key(key)
+    if "." not in key_filename(inner_key):
+        return None
+    inner = content_extractor(guess_mime_type(inner_key.split(".")[-1]))
+    return f"{codec}:{inner}" if inner in STREAMABLE_EXTRACTORS else None
+
+
+def content_extractor(ctype: str) -> Optional[str]:
+    """Return the extractor used for a content type, or None if its content isn't read."""
+    if ctype in PDS_LABEL_CONTENT_TYPES:
+        return "pds_label"
+    if ctype in STRUCTURED_CONTENT_TYPES:
+        return STRUCTURED_CONTENT_TYPES[ctype]
+    if ctype in TEXT_CONTENT_TYPES:
+        return "text"
+    if ctype in IMAGE_CONTENT_TYPES:
+        return "image"
+    if ctype == "application/pdf":
+        return "pdf"
+    return None
+
+
+def extract_content(index: str, file, extractor: str,
+                    extracted: Optional[Dict[CacheKey, Extraction]] = None) -> Extraction:
+    """
+    Return what the given extractor gets out of an object's content.
+
+    `extracted` is the extraction cache of the current batch: content whose
+    ETag is in it is neither fetched nor parsed, and new extractions are added
+    to it. Objects that fail to extract fall back to the keywords of their key,
+    which are never cached.
+    """
+    cache_key = extraction_cache_key(file.get("ETag"), extractor) if extracted is not None else None
+    if cache_key is not None and cache_key in extracted:
+        EXTRACTION_CACHE.labels("hit").inc()
+        cached = extracted[cache_key]
+        return Extraction(list(cached.keywords), dict(cached.fields))
+
+    # e.g. "gzip:csv", a CSV table read through gzip
+    codec, _, content = extractor.rpartition(":")
+    codec = codec or None
+    try:
+        if content == "pds_label":
+            extraction = extract_pds_label(index, file["Key"], codec)
+        elif content == "pdf":
+            extraction = Extraction(extract_pdf_keywords(index, file["Key"]))
+        elif content == "image":
+            extraction = extract_image_metadata(index, file)
+        elif content == "zip":
+            extraction = Extraction(extract_zip_keywords(index, file))
+        elif content in ("csv", "json", "xml"):
+            extraction = Extraction(extract_structured_keywords(index, file["Key"], content, codec))
+        elif codec is not None:
+            extraction = Extraction(extract_decompressed_text_keywords(index, file["Key"], codec))
+        else:
+            extraction = Extraction(extract_text_keywords(index, file["Key"]))
+    except Exception as e:
+        print(f"Error extracting {extractor} content from {file['Key']}: {e}")
+        return Extraction(get_keywords_from_key(file["Key"])[:500])
+    EXTRACTION_CACHE.labels("miss").inc()
+    if cache_key is not None:
+        extracted[cache_key] = extraction
+    return extraction
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire a fixed time after being stored.
+
+    Besides the entry count, the cache can be bounded by total weight, where
+    each entry's weight is supplied by the caller (e.g. number of listed objects).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_weight: Optional[int] = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self._entries: "OrderedDict[Hashable, tuple[float, int, Any]]" = OrderedDict()
+        self._weight = 0
+        self._lock = Lock()
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._weight -= entry[1]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, weight: int = 1) -> None:
+        """Store a value, evicting least recently used entries beyond the count and weight limits."""
+        with self._lock:
+            self._pop(key)
+            if self.max_weight is not None and weight > self.max_weight:
+                # too large to ever fit, leave it uncached
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, weight, value)
+            self._weight += weight
+            while len(self._entries) > self.max_entries or (
+                    self.max_weight is not None and self._weight > self.max_weight):
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._weight = 0
+
+    @property
+    def weight(self) -> int:
+        with self._lock:
+            return self._weight
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,146 @@
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+
+# Label keywords copied to filterable document fields
+LABEL_FIELDS = {
+    "TARGET_NAME": "TargetName",
+    "INSTRUMENT_ID": "InstrumentId",
+    "PRODUCT_TYPE": "ProductType",
+}
+# Label keywords whose values describe the product, listed first in the document keywords
+HIGH_VALUE_KEYWORDS = (
+    "TARGET_NAME", "INSTRUMENT_ID", "INSTRUMENT_NAME", "PRODUCT_TYPE", "PRODUCT_ID",
+    "MISSION_NAME", "SPACECRAFT_NAME", "INSTRUMENT_HOST_NAME", "INSTRUMENT_HOST_ID",
+    "DATA_SET_ID", "DATA_SET_NAME", "PRODUCER_ID", "OBSERVATION_TYPE", "MISSION_PHASE_NAME",
+)
+# Statements that only describe the label's structure or layout
+STRUCTURAL_KEYWORDS = {
+    "PDS_VERSION_ID", "OBJECT", "END_OBJECT", "GROUP", "END_GROUP", "RECORD_TYPE",
+    "RECORD_BYTES", "FILE_RECORDS", "LABEL_RECORDS", "INTERCHANGE_FORMAT",
+}
+MAX_LABEL_KEYWORDS = 500
+
+_COMMENT = re.compile(r"/\*.*?\*/")
+_UNITS = re.compile(r"<[^>]*>")
+_NUMBER = re.compile(r"^[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$")
+_WORD = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.:-]*")
+
+LabelValue = Union[str, List[str]]
+
+
+def _strip_comments(line: str) -> str:
+    line = _COMMENT.sub("", line)
+    # a comment running past the end of the line is dropped with the rest of it
+    return line.split("/*", 1)[0]
+
+
+def _is_complete(value: str) -> bool:
+    """Whether a value has no open quoted string, list or set."""
+    if value.count('"') % 2:
+        return False
+    unquoted = re.sub(r'"[^"]*"', "", value)
+    return unquoted.count("(") <= unquoted.count(")") and unquoted.count("{") <= unquoted.count("}")
+
+
+def iter_label_statements(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the `KEYWORD = VALUE` statements of a PDS3 label, up to its `END` line.
+
+    Values spanning several lines (quoted text, lists and sets) are joined.
+    Stops reading `lines` at `END`, so a label can be parsed while it streams.
+    """
+    pending_key = None
+    pending_value = ""
+    for raw_line in lines:
+        line = _strip_comments(raw_line).strip()
+        if pending_key is not None:
+            pending_value = f"{pending_value} {line}"
+            if _is_complete(pending_value):
+                yield pending_key, pending_value
+                pending_key = None
+            continue
+        if line == "END":
+            return
+        if "=" not in line:
+            continue
+        key, value = (part.strip() for part in line.split("=", 1))
+        if _is_complete(value):
+            yield key, value
+        else:
+            pending_key, pending_value = key, value
+    if pending_key is not None:
+        yield pending_key, pending_value
+
+
+def _clean(value: str) -> str:
+    value = _UNITS.sub("", value).strip().strip('"').strip("'")
+    return " ".join(value.split())
+
+
+def parse_label_value(value: str) -> LabelValue:
+    """Return a label value without quotes and units; lists and sets become lists."""
+    value = value.strip()
+    if value[:1] in "({" and value[-1:] in ")}":
+        items = re.findall(r'"[^"]*"|[^,(){}]+', value[1:-1])
+        return [item for item in (_clean(item) for item in items) if item]
+    return _clean(value)
+
+
+def parse_label(lines: Iterable[str]) -> Dict[str, List[LabelValue]]:
+    """Return every value of each keyword of a PDS3 label, in label order."""
+    statements: Dict[str, List[LabelValue]] = {}
+    for key, value in iter_label_statements(lines):
+        statements.setdefault(key.upper(), []).append(parse_label_value(value))
+    return statements
+
+
+def _as_list(value: LabelValue) -> List[str]:
+    return value if isinstance(value, list) else [value]
+
+
+def label_fields(statements: Dict[str, List[LabelValue]]) -> Dict[str, Any]:
+    """Return the filterable document fields of a parsed label, from the first value of each keyword."""
+    fields = {}
+    for keyword, field in LABEL_FIELDS.items():
+        values = statements.get(keyword)
+        if values and values[0] not in ("", [], "N/A", "UNK", "NULL"):
+            fields[field] = values[0]
+    return fields
+
+
+def label_keywords(statements: Dict[str, List[LabelValue]]) -> List[str]:
+    """
+    Return the search keywords of a parsed label.
+
+    Values of HIGH_VALUE_KEYWORDS come first, whole and split into words, then
+    the files named by `^` pointers and the words of every other value.
+    Structural statements and numbers are left out.
+    """
+    keywords: Dict[str, None] = {}
+
+    def add(text: str) -> None:
+        if text and not _NUMBER.match(text):
+            keywords.setdefault(text, None)
+
+    for keyword in HIGH_VALUE_KEYWORDS:
+        for value in statements.get(keyword, []):
+            for item in _as_list(value):
+                add(item)
+                for word in _WORD.findall(item):
+                    add(word)
+
+    for keyword, values in statements.items():
+        if keyword.startswith("^"):
+            # e.g. ^IMAGE = ("FILE.IMG", 12), the data file described by the label
+            for value in values:
+                add(_as_list(value)[0] if value else "")
+            continue
+        if keyword in STRUCTURAL_KEYWORDS:
+            continue
+        for value in values:
+            for item in _as_list(value):
+                for word in _WORD.findall(item):
+                    add(word)
+    return list(keywords)[:MAX_LABEL_KEYWORDS]
+
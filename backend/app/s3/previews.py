@@ -0,0 +1,260 @@
+import hashlib
+import os
+import tempfile
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import fitz
+from botocore.client import BaseClient
+
+from app.s3.utils import get_public_client
+
+
+PREVIEW_CACHE_DIR = os.getenv(
+    "PREVIEW_CACHE_DIR", os.path.join(tempfile.gettempdir(), "artemis3-previews"))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv("PREVIEW_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Sources larger than this are never downloaded to build a preview
+PREVIEW_MAX_SOURCE_BYTES = int(os.getenv("PREVIEW_MAX_SOURCE_BYTES", str(64 * 1024 * 1024)))
+PREVIEW_DEFAULT_DIMENSION = 512
+PREVIEW_MAX_DIMENSION = 1024
+
+# File types PyMuPDF can open as a document, keyed by extension
+PREVIEW_FILETYPES = {
+    "pdf": "pdf",
+    "png": "png",
+    "jpg": "jpg",
+    "jpeg": "jpg",
+    "gif": "gif",
+    "bmp": "bmp",
+    "tif": "tiff",
+    "tiff": "tiff",
+    "jp2": "jpx",
+    "jpx": "jpx",
+    "pnm": "pnm",
+    "pgm": "pgm",
+    "ppm": "ppm",
+}
+PREVIEW_CONTENT_TYPES = {
+    "application/pdf": "pdf",
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/bmp": "bmp",
+    "image/tiff": "tiff",
+    "image/jp2": "jpx",
+    "image/jpx": "jpx",
+}
+
+class PreviewTooLargeError(ValueError):
+    """The source object is larger than PREVIEW_MAX_SOURCE_BYTES."""
+
+
+class PreviewRenderError(ValueError):
+    """PyMuPDF could not open or render the source object."""
+
+
+_cache_lock = Lock()
+# Running size of each cache directory, computed lazily on first write
+_cache_bytes: Dict[str, int] = {}
+
+
+def preview_filetype(key: str, content_type: Optional[str]) -> Optional[str]:
+    """Return the PyMuPDF file type used to render a preview, or None if unsupported."""
+    if content_type in PREVIEW_CONTENT_TYPES:
+        return PREVIEW_CONTENT_TYPES[content_type]
+    extension = key.rsplit(".", 1)[-1].lower() if "." in key else ""
+    return PREVIEW_FILETYPES.get(extension)
+
+
+def preview_cache_key(bucket: str, key: str, etag: str, dimension: int) -> str:
+    """Hash the identity of a derivative into a cache file name."""
+    raw = "\0".join([bucket, key, etag, str(dimension)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _cache_path(cache_dir: str, digest: str, filetype: str) -> Tuple[str, str]:
+    """Return the cache file path and media type for a derivative."""
+    if filetype == "pdf":
+        return os.path.join(cache_dir, digest[:2], f"{digest}.png"), "image/png"
+    return os.path.join(cache_dir, digest[:2], f"{digest}.jpg"), "image/jpeg"
+
+
+def _failure_path(cache_dir: str, bucket: str, key: str, etag: str) -> str:
+    """Return the path recording that an object version could not be rendered, at any size."""
+    digest = preview_cache_key(bucket, key, etag, 0)
+    return os.path.join(cache_dir, digest[:2], f"{digest}.failed")
+
+
+def render_preview(data: bytes, filetype: str, dimension: int) -> bytes:
+    """
+    Render the first page of a PDF or image, scaled to fit within dimension pixels.
+
+    Raises PreviewRenderError if the data is corrupt, empty or not of `filetype`.
+    """
+    try:
+        with fitz.open(stream=data, filetype=filetype) as document:
+            if document.page_count == 0:
+                raise PreviewRenderError("Document has no pages to preview")
+            page = document[0]
+            longest = max(page.rect.width, page.rect.height) or 1
+            scale = min(1.0, dimension / longest) if filetype != "pdf" else dimension / longest
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            if filetype == "pdf":
+                return pixmap.tobytes("png")
+            return pixmap.tobytes("jpeg")
+    except PreviewRenderError:
+        raise
+    except Exception as e:
+        raise PreviewRenderError(f"Could not render a preview of this file: {e}") from e
+
+
+def _scan_cache_bytes(cache_dir: str) -> int:
+    total = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def _evict_least_recently_used(cache_dir: str, max_bytes: int) -> int:
+    """Delete least recently used derivatives until the cache fits its budget."""
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+    return total
+
+
+def _store_derivative(path: str, data: bytes, cache_dir: str, max_bytes: int) -> None:
+    """Atomically write a derivative and enforce the cache size budget."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    with _cache_lock:
+        # another request may have stored the same derivative first, only count what changed
+        try:
+            replaced_bytes = os.path.getsize(path)
+        except OSError:
+            replaced_bytes = 0
+        try:
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if cache_dir not in _cache_bytes:
+            _cache_bytes[cache_dir] = _scan_cache_bytes(cache_dir)
+        else:
+            _cache_bytes[cache_dir] += len(data) - replaced_bytes
+        if _cache_bytes[cache_dir] > max_bytes:
+            _cache_bytes[cache_dir] = _evict_least_recently_used(cache_dir, max_bytes)
+
+
+def get_preview(bucket: str,
+                key: str,
+                dimension: int = PREVIEW_DEFAULT_DIMENSION,
+                s3: Optional[BaseClient] = None,
+                cache_dir: Optional[str] = None,
+                max_bytes: Optional[int] = None) -> Tuple[bytes, str, str]:
+    """
+    Return a cached preview derivative for an object, generating it on a miss.
+
+    Derivatives are keyed by bucket, key, ETag and size, so a changed object
+    produces a new cache entry and stale ones age out of the LRU budget.
+    Their bytes are returned rather than their path, since another request
+    may evict the file before it is sent.
+
+    Parameters
+    ----------
+        bucket : str
+            The S3 bucket containing the object.
+        key : str
+            The object key.
+        dimension : int
+            The longest edge of the derivative in pixels.
+
+    Returns
+    -------
+        tuple[bytes, str, str]
+            The derivative, its media type and its cache digest.
+
+    Raises
+    ------
+        PreviewTooLargeError
+            If the object is larger than PREVIEW_MAX_SOURCE_BYTES.
+        PreviewRenderError
+            If the object cannot be rendered, now or on an earlier request.
+        ValueError
+            If the object type cannot be previewed.
+    """
+    if s3 is None:
+        s3 = get_public_client()
+    cache_dir = cache_dir or PREVIEW_CACHE_DIR
+    max_bytes = PREVIEW_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    dimension = max(16, min(dimension, PREVIEW_MAX_DIMENSION))
+
+    head = s3.head_object(Bucket=bucket, Key=key)
+    filetype = preview_filetype(key, head.get("ContentType"))
+    if filetype is None:
+        raise ValueError("Previews are not supported for this file type")
+
+    etag = str(head.get("ETag") or f"{head.get('LastModified')}-{head.get('ContentLength')}")
+    digest = preview_cache_key(bucket, key, etag, dimension)
+    path, media_type = _cache_path(cache_dir, digest, filetype)
+
+    try:
+        with open(path, "rb") as cached:
+            derivative = cached.read()
+        # mark as recently used for LRU eviction
+        os.utime(path)
+        return derivative, media_type, digest
+    except OSError:
+        # not cached yet, or evicted meanwhile
+        pass
+
+    # a version that failed to render is not downloaded again
+    failure_path = _failure_path(cache_dir, bucket, key, etag)
+    try:
+        with open(failure_path, encoding="utf-8") as failure:
+            raise PreviewRenderError(failure.read())
+    except OSError:
+        pass
+
+    size = head.get("ContentLength") or 0
+    if size > PREVIEW_MAX_SOURCE_BYTES:
+        raise PreviewTooLargeError("File is too large to preview")
+
+    response = s3.get_object(Bucket=bucket, Key=key)
+    data = response["Body"].read()
+    try:
+        derivative = render_preview(data, filetype, dimension)
+    except PreviewRenderError as e:
+        _store_derivative(failure_path, str(e).encode(), cache_dir, max_bytes)
+        raise
+    _store_derivative(path, derivative, cache_dir, max_bytes)
+    return derivative, media_type, digest
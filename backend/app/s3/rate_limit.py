@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, Optional
+
+from app.metrics.registry import S3_BUDGET_WAIT_SECONDS
+
+
+INTERACTIVE = "interactive"
+REFRESH = "refresh"
+
+# S3 requests per second each bucket may receive from this process (0 = no limit),
+#   and per-bucket overrides as "bucket=rate,other-bucket=rate". Budgets are not shared
+#   between processes: split the bucket's rate between the API and the indexers
+S3_REQUEST_RATE = float(os.getenv("S3_REQUEST_RATE", "500"))
+S3_BUCKET_REQUEST_RATES = os.getenv("S3_BUCKET_REQUEST_RATES", "")
+# Share of each bucket's burst that refresh requests leave for interactive ones
+S3_INTERACTIVE_RESERVE = float(os.getenv("S3_INTERACTIVE_RESERVE", "0.2"))
+
+# Priority of the S3 requests made in the current context; API requests are interactive
+_priority: ContextVar[str] = ContextVar("s3_priority", default=INTERACTIVE)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def s3_priority(priority: str) -> Iterator[None]:
+    """Make the S3 requests of the current context (thread or task) use `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def with_s3_priority(priority: str) -> Callable[[Callable], Callable]:
+    """Decorate a function so the S3 requests it makes use `priority`."""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def run(*args, **kwargs):
+            with s3_priority(priority):
+                return func(*args, **kwargs)
+        return run
+    return decorator
+
+
+class RequestBudget:
+    """
+    A token bucket of S3 requests for one bucket, shared by every thread of the process.
+
+    Interactive requests take any available token and go first: while one
+    is waiting, refresh requests wait too. Refresh requests only take tokens
+    above a reserve of S3_INTERACTIVE_RESERVE of the burst, so an interactive
+    request arriving mid-refresh rarely has to wait.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, reserve: float = S3_INTERACTIVE_RESERVE):
+        self.rate = rate
+        self.burst = max(1.0, rate if burst is None else burst)
+        self.reserve = self.burst * reserve
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._interactive_waiting = 0
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: str = INTERACTIVE) -> float:
+        """Take one request's token, waiting as long as needed. Returns the seconds waited."""
+        interactive = priority == INTERACTIVE
+        # capped at the burst, or a refresh request could never be served at low rates
+        floor = 1.0 if interactive else min(1.0 + self.reserve, self.burst)
+        start = time.monotonic()
+        with self._condition:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._tokens >= floor and (interactive or not self._interactive_waiting):
+                        self._tokens -= 1
+                        return time.monotonic() - start
+                    # until the tokens needed have accumulated, or an interactive request is done
+                    self._condition.wait(max((floor - self._tokens) / self.rate, 0.001))
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._condition.notify_all()
+
+
+def parse_bucket_rates(spec: str) -> Dict[str, float]:
+    """Parse S3_BUCKET_REQUEST_RATES, e.g. "bucket-a=200,bucket-b=50"."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        bucket, rate = item.split("=", 1)
+        rates[bucket.strip()] = float(rate)
+    return rates
+
+
+_budgets: Dict[str, Optional[RequestBudget]] = {}
+_budgets_lock = threading.Lock()
+
+
+def bucket_budget(bucket: str) -> Optional[RequestBudget]:
+    """Return the request budget of a bucket, or None if its requests are not limited."""
+    with _budgets_lock:
+        if bucket not in _budgets:
+            rate = parse_bucket_rates(S3_BUCKET_REQUEST_RATES).get(bucket, S3_REQUEST_RATE)
+            _budgets[bucket] = RequestBudget(rate, reserve=S3_INTERACTIVE_RESERVE) if rate > 0 else None
+        return _budgets[bucket]
+
+
+def _before_s3_call(params, **kwargs) -> None:
+    bucket = params.get("Bucket")
+    budget = bucket_budget(bucket) if bucket else None
+    if budget is None:
+        return
+    priority = current_priority()
+    S3_BUDGET_WAIT_SECONDS.labels(priority).observe(budget.acquire(priority))
+
+
+def limit_s3_client(client):
+    """Register a botocore hook that charges every request of the client to its bucket's budget."""
+    client.meta.events.register("before-parameter-build.s3", _before_s3_call,
+                                unique_id="artemis3-request-budget")
+    return client
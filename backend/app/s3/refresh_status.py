@@ -1,11 +1,21 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
 from dataclasses import dataclass, asdict
 from datetime import datetime, timezone
 from threading import Lock
-from typing import Dict, Optional, Any
+from typing import AsyncIterator, Dict, Optional, Any
+
+import psycopg
+
+from app.metrics.registry import track_call
 
 @dataclass
 class RefreshStatus:
-    status: str # idle, listing, running, done, or error
+    status: str # idle, listing, running, indexing, done, or error
     processed: int = 0
     total: int = 0
     percent: int = 0
@@ -13,9 +23,141 @@ class RefreshStatus:
     started_at: Optional[str] = None
     finished_at: Optional[str] = None
     message: Optional[str] = None
+    # Meilisearch tasks of the refresh that failed, and how long Meilisearch took to index them
+    failed_tasks: int = 0
+    indexing_seconds: Optional[float] = None
 
+# Local view of the refreshes run by this process, mirrored to the shared store
 _status_by_uri: Dict[str, RefreshStatus] = {}
 _lock = Lock()
+# Monotonic time of the last shared store write per URI, used to batch counter updates
+_last_flush: Dict[str, float] = {}
+# Number of the latest snapshot taken and of the latest one saved per URI, so an older
+#   snapshot saved late never overwrites a newer one
+_flush_seq: Dict[str, int] = {}
+_saved_seq: Dict[str, int] = {}
+# Serialises the shared store writes of each URI
+_save_locks: Dict[str, Lock] = {}
+
+ACTIVE_STATUSES = ("listing", "running", "indexing")
+
+
+class MemoryStatusStore:
+    """Process-local store, only consistent when a single API worker is running."""
+
+    shared = False
+
+    def save(self, s3_uri: str, status: Dict[str, Any]) -> None:
+        pass
+
+    def load(self, s3_uri: str) -> Optional[Dict[str, Any]]:
+        return None
+
+
+class FileStatusStore:
+    """Stores each status as a JSON file, shared by every worker on the same host."""
+
+    shared = True
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _path(self, s3_uri: str) -> str:
+        name = hashlib.sha256(s3_uri.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def save(self, s3_uri: str, status: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump({"s3_uri": s3_uri, **status}, tmp_file)
+        os.replace(tmp_path, self._path(s3_uri))
+
+    def load(self, s3_uri: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(s3_uri)) as status_file:
+                data = json.load(status_file)
+        except (OSError, ValueError):
+            return None
+        data.pop("s3_uri", None)
+        return data
+
+
+class PostgresStatusStore:
+    """Stores statuses in the `refresh_status` table, shared by every worker and node."""
+
+    shared = True
+
+    def __init__(self, postgres_url: Optional[str]) -> None:
+        self.postgres_url = postgres_url
+
+    def save(self, s3_uri: str, status: Dict[str, Any]) -> None:
+        with track_call("postgres", "save_refresh_status"):
+            with psycopg.connect(self.postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""INSERT INTO refresh_status (s3_uri, status, data, updated_at)
+                                    VALUES (%s, %s, %s::jsonb, now())
+                                    ON CONFLICT (s3_uri) DO UPDATE SET status = EXCLUDED.status,
+                                    data = EXCLUDED.data, updated_at = EXCLUDED.updated_at""",
+                                (s3_uri, status["status"], json.dumps(status)))
+
+    def load(self, s3_uri: str) -> Optional[Dict[str, Any]]:
+        with track_call("postgres", "load_refresh_status"):
+            with psycopg.connect(self.postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""SELECT data FROM refresh_status WHERE s3_uri=%s""", (s3_uri,))
+                    row = cur.fetchone()
+        if not row:
+            return None
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+
+def _get_store():
+    """Return the status store selected by `REFRESH_STATUS_STORE` (memory, file or postgres)."""
+    backend = os.getenv("REFRESH_STATUS_STORE", "memory")
+    if backend == "postgres":
+        return PostgresStatusStore(os.getenv("DATABASE_URL"))
+    if backend == "file":
+        return FileStatusStore(os.getenv(
+            "REFRESH_STATUS_DIR", os.path.join(tempfile.gettempdir(), "artemis3-refresh-status")))
+    return MemoryStatusStore()
+
+
+def _flush_interval() -> float:
+    return float(os.getenv("REFRESH_STATUS_FLUSH_SECONDS", "1.0"))
+
+
+def _flush(s3_uri: str, force: bool = False) -> None:
+    """
+    Write the local status of a refresh to the shared store.
+
+    Counter updates call this on every increment, but only the first call in
+    each `REFRESH_STATUS_FLUSH_SECONDS` window writes, so the store sees one
+    batched update per window instead of one per object. State changes pass
+    `force=True` so they are visible immediately. Writes of a URI are made
+    one at a time and a snapshot older than the last one saved is dropped.
+    """
+    now = time.monotonic()
+    with _lock:
+        status = _status_by_uri.get(s3_uri)
+        if status is None:
+            return
+        if not force and now - _last_flush.get(s3_uri, 0.0) < _flush_interval():
+            return
+        _last_flush[s3_uri] = now
+        snapshot = asdict(status)
+        seq = _flush_seq[s3_uri] = _flush_seq.get(s3_uri, 0) + 1
+        save_lock = _save_locks.setdefault(s3_uri, Lock())
+
+    with save_lock:
+        if _saved_seq.get(s3_uri, 0) > seq:
+            return
+        try:
+            _get_store().save(s3_uri, snapshot)
+            _saved_seq[s3_uri] = seq
+        except Exception as e:
+            print(f"Failed to persist refresh status for {s3_uri}: {e}")
+
 
 def _now_iso_format() -> str:
     """Return the current UTC time in ISO format."""
@@ -44,6 +186,7 @@ def start_refresh(s3_uri: str, total: int, status: str = "running") -> None:
             listed=0,
             started_at=_now_iso_format()
         )
+    _flush(s3_uri, force=True)
 
 def set_status(
     s3_uri: str, 
@@ -66,7 +209,7 @@ def set_status(
             When `True`, the current refresh status object is reset, processed and percent are set to 0. Default is `False`.
     """
     with _lock:
-        current = _status_by_uri.get("s3_uri") or RefreshStatus(status=status)
+        current = _status_by_uri.get(s3_uri) or RefreshStatus(status=status)
         current.status = status
         if total is not None:
             current.total = total
@@ -74,6 +217,7 @@ def set_status(
             current.processed = 0
             current.percent = 0
         _status_by_uri[s3_uri] = current
+    _flush(s3_uri, force=True)
 
 def increment_listed(s3_uri: str, count: int = 1) -> None:
     """
@@ -91,6 +235,7 @@ def increment_listed(s3_uri: str, count: int = 1) -> None:
         if not status:
             return
         status.listed += count
+    _flush(s3_uri)
 
 
 def increment_processed(s3_uri: str, count: int = 1) -> None:
@@ -111,8 +256,14 @@ def increment_processed(s3_uri: str, count: int = 1) -> None:
         status.processed += count
         if status.total > 0:
             status.percent = int((status.processed / status.total) * 100)
+    _flush(s3_uri)
 
-def finish_refresh(s3_uri: str) -> None:
+def finish_refresh(
+    s3_uri: str,
+    failed_tasks: int = 0,
+    indexing_seconds: Optional[float] = None,
+    message: Optional[str] = None
+) -> None:
     """
     Marks thread-locked Meilisearch refresh process as "done".
 
@@ -120,6 +271,12 @@ def finish_refresh(s3_uri: str) -> None:
     ----------
         s3_uri : str
             The S3 bucket full URI. Formatted as: `"s3://bucket/prefix"`.
+        failed_tasks : int
+            The number of Meilisearch tasks of the refresh that failed. Default is 0.
+        indexing_seconds : float or None
+            Time from the first task being enqueued to the last one finishing. Default is `None`.
+        message : str or None
+            An optional message, such as the errors of failed tasks. Default is `None`.
     """
     with _lock:
         status = _status_by_uri.get(s3_uri)
@@ -128,6 +285,10 @@ def finish_refresh(s3_uri: str) -> None:
         status.status = "done"
         status.finished_at = _now_iso_format()
         status.percent = 100 if status.total > 0 else 0
+        status.failed_tasks = failed_tasks
+        status.indexing_seconds = indexing_seconds
+        status.message = message
+    _flush(s3_uri, force=True)
 
 def fail_refresh(s3_uri: str, message: str) -> None:
     """
@@ -147,11 +308,66 @@ def fail_refresh(s3_uri: str, message: str) -> None:
         status.finished_at = _now_iso_format()
         # incase new RefreshStatus object created
         _status_by_uri[s3_uri] = status
+    _flush(s3_uri, force=True)
+
+def update_shared_status(s3_uri: str, start: bool = False, **fields: Any) -> None:
+    """
+    Update the status of a refresh that several processes work on, such as a sharded refresh.
+
+    The status is read from the shared store instead of this process's local
+    view, updated with `fields` and written back. It is not kept locally, so
+    every process, this one included, reads the latest status from the store.
+
+    Parameters
+    ----------
+        s3_uri : str
+            The S3 bucket full URI. Formatted as: `"s3://bucket/prefix"`.
+        start : bool
+            When `True`, the status starts over as with `start_refresh`. Default is `False`.
+        **fields
+            `RefreshStatus` fields to set, percent is derived from processed and total.
+    """
+    store = _get_store()
+    current = None
+    if not start and store.shared:
+        try:
+            stored = store.load(s3_uri)
+        except Exception as e:
+            print(f"Failed to read refresh status for {s3_uri}: {e}")
+            stored = None
+        if stored:
+            current = RefreshStatus(**{name: value for name, value in stored.items()
+                                       if name in RefreshStatus.__dataclass_fields__})
+
+    with _lock:
+        if current is None:
+            current = (None if start else _status_by_uri.get(s3_uri)) or RefreshStatus(
+                status="running", started_at=_now_iso_format())
+        for name, value in fields.items():
+            setattr(current, name, value)
+        if current.total > 0:
+            current.percent = int((current.processed / current.total) * 100)
+        if current.status in ("done", "error"):
+            current.finished_at = _now_iso_format()
+        if store.shared:
+            _status_by_uri.pop(s3_uri, None)
+        else:
+            _status_by_uri[s3_uri] = current
+        snapshot = asdict(current)
+
+    try:
+        store.save(s3_uri, snapshot)
+    except Exception as e:
+        print(f"Failed to persist refresh status for {s3_uri}: {e}")
 
 def get_status(s3_uri: str) -> Dict[str, Any]:
     """
     Returns the current Meilisearch refresh status as a dictionary.
 
+    A refresh running in this process is reported from its local state, which
+    is never behind the shared store. Anything else is read from the shared
+    store so every worker reports the same progress.
+
     Parameters
     ----------
         s3_uri : str
@@ -159,11 +375,63 @@ def get_status(s3_uri: str) -> Dict[str, Any]:
     """
     with _lock:
         status = _status_by_uri.get(s3_uri)
-        if not status:
-            return {
-                "status": "idle", 
-                "processed": 0, 
-                "total": 0, 
-                "percent": 0
-            }
-        return asdict(status)
+        local = asdict(status) if status else None
+
+    if local is not None and local["status"] in ACTIVE_STATUSES:
+        return local
+
+    store = _get_store()
+    if store.shared:
+        try:
+            stored = store.load(s3_uri)
+            if stored is not None:
+                return stored
+        except Exception as e:
+            print(f"Failed to read refresh status for {s3_uri}: {e}")
+
+    if local is not None:
+        return local
+    return {
+        "status": "idle",
+        "processed": 0,
+        "total": 0,
+        "percent": 0
+    }
+
+def _format_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def status_events(
+    s3_uri: str,
+    poll_seconds: float = 1.0,
+    heartbeat_seconds: float = 15.0
+) -> AsyncIterator[str]:
+    """
+    Yield server-sent events describing changes to a refresh status.
+
+    The first event carries the full status; later events carry only the
+    fields that changed. A comment line is sent when nothing changes for
+    `heartbeat_seconds`, to keep proxies from closing the stream.
+
+    Parameters
+    ----------
+        s3_uri : str
+            The S3 bucket full URI. Formatted as: `"s3://bucket/prefix"`.
+        poll_seconds : float
+            How often the status is read. Default is 1 second.
+        heartbeat_seconds : float
+            Maximum silence before a keep-alive comment. Default is 15 seconds.
+    """
+    previous: Dict[str, Any] = {}
+    last_sent = time.monotonic()
+    while True:
+        current = await asyncio.to_thread(get_status, s3_uri)
+        delta = {k: v for k, v in current.items() if k not in previous or previous[k] != v}
+        if delta:
+            yield _format_event("progress" if previous else "status", delta)
+            previous = current
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= heartbeat_seconds:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(poll_seconds)
@@ -1,6 +1,10 @@
+import base64
+import csv
+import io
+import json
 import os
 import mimetypes
-from typing import Iterator, Optional, Dict, Any, List
+from typing import Iterable, Iterator, Optional, Dict, Any, List
 from datetime import datetime
 from botocore.client import BaseClient
 from botocore.exceptions import BotoCoreError, ClientError
@@ -12,9 +16,32 @@ from app.s3.utils import (
     path_depth,
     build_subtree_filter
 )
+from app.s3.listing_cache import TTLCache
+from app.metrics.registry import track_call
 from app.meilisearch.util import guess_mime_type
 
 
+SEARCH_SORT_FIELDS = ("Key", "Size", "LastModified")
+# Page size used when walking a full result set for exports
+EXPORT_PAGE_SIZE = 1000
+EXPORT_CSV_COLUMNS = ["key", "size", "last_modified", "storage_class", "tags"]
+# Shallow (delimited) listings used to browse buckets that have no index yet
+S3_BROWSE_CACHE_TTL_SECONDS = float(os.getenv("S3_BROWSE_CACHE_TTL_SECONDS", "30"))
+S3_BROWSE_CACHE_MAX_ENTRIES = int(os.getenv("S3_BROWSE_CACHE_MAX_ENTRIES", "1024"))
+S3_BROWSE_MAX_ENTRIES = int(os.getenv("S3_BROWSE_MAX_ENTRIES", "10000"))
+
+# Recursive listing pages read by the live fallback search, bounded by total listed objects
+S3_LISTING_CACHE_TTL_SECONDS = float(os.getenv("S3_LISTING_CACHE_TTL_SECONDS", "300"))
+S3_LISTING_CACHE_MAX_ENTRIES = int(os.getenv("S3_LISTING_CACHE_MAX_ENTRIES", "256"))
+S3_LISTING_CACHE_MAX_OBJECTS = int(os.getenv("S3_LISTING_CACHE_MAX_OBJECTS", "200000"))
+
+_shallow_listings = TTLCache(ttl_seconds=S3_BROWSE_CACHE_TTL_SECONDS,
+                             max_entries=S3_BROWSE_CACHE_MAX_ENTRIES)
+_listing_pages = TTLCache(ttl_seconds=S3_LISTING_CACHE_TTL_SECONDS,
+                          max_entries=S3_LISTING_CACHE_MAX_ENTRIES,
+                          max_weight=S3_LISTING_CACHE_MAX_OBJECTS)
+
+
 def _normalize_suffixes(suffixes: Optional[list[str]]) -> list[str]:
     """Normalize suffix list to lowercase extension tokens without leading dots."""
     if not suffixes:
@@ -99,6 +126,51 @@ def _to_last_modified(raw: Any) -> datetime | None:
             return None
 
 
+def _iter_listing_pages(s3: BaseClient, bucket: str, prefix: str) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield recursive listing pages for a prefix, reading through the listing cache.
+
+    Cached pages are replayed first; if the cached listing was cut short, S3
+    pagination resumes from its continuation token. Whatever was read is
+    stored back, so later searches with different filters hit memory.
+    """
+    cache_key = (bucket, prefix)
+    cached = _listing_pages.get(cache_key)
+    pages: List[List[Dict[str, Any]]] = list(cached["pages"]) if cached else []
+    next_token = cached["next_token"] if cached else None
+    complete = cached["complete"] if cached else False
+    cached_count = len(pages)
+
+    try:
+        for page in pages[:cached_count]:
+            yield page
+        if complete:
+            return
+
+        pager = s3.get_paginator("list_objects_v2")
+        paginate_args = {"Bucket": bucket, "Prefix": prefix}
+        if next_token:
+            paginate_args["ContinuationToken"] = next_token
+
+        for page in pager.paginate(**paginate_args):
+            contents = [{
+                "Key": obj["Key"],
+                "Size": obj["Size"],
+                "LastModified": obj.get("LastModified"),
+                "StorageClass": obj.get("StorageClass")
+            } for obj in page.get("Contents", [])]
+            pages.append(contents)
+            next_token = page.get("NextContinuationToken")
+            complete = next_token is None
+            yield contents
+
+    finally:
+        if len(pages) > cached_count:
+            _listing_pages.set(cache_key,
+                               {"pages": pages, "next_token": next_token, "complete": complete},
+                               weight=sum(len(page) for page in pages))
+
+
 def iter_s3_objects(bucket: str,
                     prefix: str,
                     contains: Optional[str] = None,
@@ -113,12 +185,11 @@ def iter_s3_objects(bucket: str,
     if s3 is None:
         s3 = get_public_client()
 
-    pager = s3.get_paginator("list_objects_v2")
     yielded = 0
 
     try:
-        for page in pager.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get("Contents", []):
+        for page in _iter_listing_pages(s3, bucket, prefix):
+            for obj in page:
                 key = obj["Key"]
                 size = obj["Size"]
                 last_modified = obj.get("LastModified")
@@ -190,22 +261,20 @@ def filter_s3_objects(key: str,
     return True
 
 
-def search_from_meili(bucket: str,
-                      prefix: str,
-                      contains: Optional[str] = None,
-                      limit: int = 10,
-                      min_size: Optional[int] = None,
-                      max_size: Optional[int] = None,
-                      storage_classes: Optional[list[str]] = None,
-                      modified_after: Optional[datetime] = None,
-                      modified_before: Optional[datetime] = None,
-                      suffixes: Optional[list[str]] = None,
-                      sort_by: Optional[str] = None,
-                      sort_direction: str = "asc") -> list[Dict[str, Any]]:
-    """Search indexed file documents in Meilisearch with optional filters/sort."""
-    meilisearch_url = os.getenv("MEILISEARCH_URL")
-    meili_client = meilisearch.Client(meilisearch_url)
-
+def _build_search_filters(prefix: str,
+                          min_size: Optional[int] = None,
+                          max_size: Optional[int] = None,
+                          storage_classes: Optional[list[str]] = None,
+                          modified_after: Optional[datetime] = None,
+                          modified_before: Optional[datetime] = None,
+                          suffixes: Optional[list[str]] = None,
+                          targets: Optional[list[str]] = None,
+                          instruments: Optional[list[str]] = None,
+                          product_types: Optional[list[str]] = None,
+                          min_width: Optional[int] = None,
+                          min_height: Optional[int] = None,
+                          crs: Optional[list[str]] = None) -> list[str]:
+    """Build the Meilisearch filter expressions shared by file searches."""
     filter_arr = []
     if prefix is not None and prefix != "":
         prefix = normalize_s3_path(prefix)
@@ -246,36 +315,265 @@ def search_from_meili(bucket: str,
                 f"'{ctype}'" for ctype in sorted(content_types))
             filter_arr.append(f"ContentType IN [{types_list}]")
 
+    # fields read from PDS3 labels
+    for field, values in (("TargetName", targets), ("InstrumentId", instruments), ("ProductType", product_types)):
+        if values:
+            values_list = ", ".join(f"'{escape_meili_filter_val(value)}'" for value in values)
+            filter_arr.append(f"{field} IN [{values_list}]")
+
+    # fields read from image headers
+    if min_width is not None:
+        filter_arr.append(f"Width>={min_width}")
+
+    if min_height is not None:
+        filter_arr.append(f"Height>={min_height}")
+
+    if crs:
+        crs_list = ", ".join(f"'{escape_meili_filter_val(value)}'" for value in crs)
+        filter_arr.append(f"Crs IN [{crs_list}]")
+
+    return filter_arr
+
+
+def _document_to_object(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an indexed file document to the API object shape."""
+    return {
+        "key": document["Key"],
+        "size": document["Size"],
+        "last_modified": datetime.fromtimestamp(int(document["LastModified"])),
+        "storage_class": document["StorageClass"],
+        "tags": document["Tags"]
+    }
+
+
+def search_from_meili(bucket: str,
+                      prefix: str,
+                      contains: Optional[str] = None,
+                      limit: int = 10,
+                      min_size: Optional[int] = None,
+                      max_size: Optional[int] = None,
+                      storage_classes: Optional[list[str]] = None,
+                      modified_after: Optional[datetime] = None,
+                      modified_before: Optional[datetime] = None,
+                      suffixes: Optional[list[str]] = None,
+                      sort_by: Optional[str] = None,
+                      sort_direction: str = "asc",
+                      targets: Optional[list[str]] = None,
+                      instruments: Optional[list[str]] = None,
+                      product_types: Optional[list[str]] = None,
+                      min_width: Optional[int] = None,
+                      min_height: Optional[int] = None,
+                      crs: Optional[list[str]] = None) -> list[Dict[str, Any]]:
+    """Search indexed file documents in Meilisearch with optional filters/sort."""
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    filter_arr = _build_search_filters(prefix,
+                                       min_size=min_size,
+                                       max_size=max_size,
+                                       storage_classes=storage_classes,
+                                       modified_after=modified_after,
+                                       modified_before=modified_before,
+                                       suffixes=suffixes,
+                                       targets=targets,
+                                       instruments=instruments,
+                                       product_types=product_types,
+                                       min_width=min_width,
+                                       min_height=min_height,
+                                       crs=crs)
+
     search_opts = {
         "filter": filter_arr,
         "limit": limit,
     }
 
     if sort_by:
-        if sort_by in {"Key", "Size", "LastModified"}:
+        if sort_by in SEARCH_SORT_FIELDS:
             search_opts["sort"] = [
                 f"{sort_by}:{sort_direction}"
             ]
 
-    documents = meili_client.index(bucket).search(
-        contains if contains is not None else "",
-        search_opts)
+    with track_call("meilisearch", "search"):
+        documents = meili_client.index(bucket).search(
+            contains if contains is not None else "",
+            search_opts)
 
-    objects = []
+    return [_document_to_object(document) for document in documents["hits"]]
 
-    for document in documents["hits"]:
-        last_modified_out = datetime.fromtimestamp(
-            int(document["LastModified"]))
 
-        objects.append({
-            "key": document["Key"],
-            "size": document["Size"],
-            "last_modified": last_modified_out,
-            "storage_class": document["StorageClass"],
-            "tags": document["Tags"]
-        })
+def encode_search_cursor(sort_by: str, sort_direction: str, value: Any, doc_id: str) -> str:
+    """Encode the position after a document as an opaque, URL-safe cursor."""
+    payload = json.dumps({"s": sort_by, "d": sort_direction, "v": value, "i": doc_id},
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor produced by encode_search_cursor, raising ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid search cursor") from e
+
+    if (not isinstance(state, dict)
+            or state.get("s") not in SEARCH_SORT_FIELDS
+            or state.get("d") not in ("asc", "desc")
+            or not isinstance(state.get("i"), str)):
+        raise ValueError("Invalid search cursor")
+    value_types = str if state["s"] == "Key" else (int, float)
+    if not isinstance(state.get("v"), value_types):
+        raise ValueError("Invalid search cursor")
+    return state
+
+
+def _cursor_filter(state: Dict[str, Any]) -> str:
+    """
+    Build a filter selecting documents strictly after the cursor position.
+
+    Meilisearch compares strings case-insensitively, so keys differing only
+    in case are equal to it; ties are broken on the document ID, a hash that
+    is unique and never has case variants.
+    """
+    op = ">" if state["d"] == "asc" else "<"
+    field, value = state["s"], state["v"]
+    if field == "Key":
+        value = f"'{escape_meili_filter_val(value)}'"
+    doc_id = escape_meili_filter_val(state["i"])
+    return f"({field} {op} {value} OR ({field} = {value} AND ID {op} '{doc_id}'))"
+
+
+def search_page_from_meili(bucket: str,
+                           prefix: str,
+                           contains: Optional[str] = None,
+                           limit: int = 100,
+                           min_size: Optional[int] = None,
+                           max_size: Optional[int] = None,
+                           storage_classes: Optional[list[str]] = None,
+                           modified_after: Optional[datetime] = None,
+                           modified_before: Optional[datetime] = None,
+                           suffixes: Optional[list[str]] = None,
+                           sort_by: Optional[str] = None,
+                           sort_direction: str = "asc",
+                           cursor: Optional[str] = None,
+                           targets: Optional[list[str]] = None,
+                           instruments: Optional[list[str]] = None,
+                           product_types: Optional[list[str]] = None,
+                           min_width: Optional[int] = None,
+                           min_height: Optional[int] = None,
+                           crs: Optional[list[str]] = None) -> Dict[str, Any]:
+    """
+    Return one page of search results plus a cursor for the next page.
+
+    Pages are ordered by the sort field with the unique document ID as a
+    tie-breaker, and each page filters on the position after the previous
+    one, so any depth costs the same as the first page and is not capped by
+    Meilisearch's maxTotalHits.
+    """
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    sort_field = sort_by if sort_by in SEARCH_SORT_FIELDS else "Key"
+    sort_order = "desc" if sort_direction == "desc" else "asc"
+
+    filter_arr = _build_search_filters(prefix,
+                                       min_size=min_size,
+                                       max_size=max_size,
+                                       storage_classes=storage_classes,
+                                       modified_after=modified_after,
+                                       modified_before=modified_before,
+                                       suffixes=suffixes,
+                                       targets=targets,
+                                       instruments=instruments,
+                                       product_types=product_types,
+                                       min_width=min_width,
+                                       min_height=min_height,
+                                       crs=crs)
+    if cursor:
+        state = decode_search_cursor(cursor)
+        if state["s"] != sort_field or state["d"] != sort_order:
+            raise ValueError("Search cursor does not match the requested sort")
+        filter_arr.append(_cursor_filter(state))
+
+    sort = [f"{sort_field}:{sort_order}", f"ID:{sort_order}"]
+
+    # fetch one extra hit to know whether another page exists
+    search_opts = {
+        "filter": filter_arr,
+        "limit": limit + 1,
+        "sort": sort,
+        "attributesToRetrieve": ["ID", "Key", "Size", "LastModified", "StorageClass", "Tags"]
+    }
+    with track_call("meilisearch", "search"):
+        result = meili_client.index(bucket).search(contains or "", search_opts)
+    hits = result["hits"][:limit]
+
+    next_cursor = None
+    if len(result["hits"]) > limit and hits:
+        last = hits[-1]
+        next_cursor = encode_search_cursor(sort_field, sort_order, last[sort_field], last["ID"])
+
+    return {
+        "items": [_document_to_object(document) for document in hits],
+        "next_cursor": next_cursor
+    }
+
 
-    return objects
+def iter_search_from_meili(bucket: str,
+                           prefix: str,
+                           page_size: int = EXPORT_PAGE_SIZE,
+                           **search_kwargs) -> Iterator[Dict[str, Any]]:
+    """Yield every matching object by walking cursor pages, holding one page at a time."""
+    cursor = None
+    while True:
+        page = search_page_from_meili(bucket, prefix, limit=page_size,
+                                      cursor=cursor, **search_kwargs)
+        yield from page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
+def count_search_from_meili(bucket: str,
+                            prefix: str,
+                            contains: Optional[str] = None,
+                            suffixes: Optional[list[str]] = None) -> int:
+    """Return Meilisearch's estimate of the number of matching files."""
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+
+    search_opts = {
+        "filter": _build_search_filters(prefix, suffixes=suffixes),
+        "limit": 0
+    }
+    with track_call("meilisearch", "search"):
+        result = meili_client.index(bucket).search(contains or "", search_opts)
+    return result.get("estimatedTotalHits", 0)
+
+
+def export_search_results(objects: Iterable[Dict[str, Any]], fmt: str = "ndjson") -> Iterator[str]:
+    """Serialize search results one line at a time as NDJSON or CSV."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        yield buffer.getvalue()
+        for obj in objects:
+            buffer.seek(0)
+            buffer.truncate()
+            last_modified = obj.get("last_modified")
+            writer.writerow([
+                obj.get("key"),
+                obj.get("size"),
+                last_modified.isoformat() if isinstance(last_modified, datetime) else last_modified,
+                obj.get("storage_class"),
+                ";".join(obj.get("tags") or [])
+            ])
+            yield buffer.getvalue()
+        return
+
+    for obj in objects:
+        yield json.dumps(obj, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)) + "\n"
 
 
 def search_folders_from_meili(
@@ -296,7 +594,8 @@ def search_folders_from_meili(
     if root:
         search_opts["filter"] = [build_subtree_filter(root)]
 
-    result = meili_client.index(bucket).search(contains or "", search_opts)
+    with track_call("meilisearch", "search_facets"):
+        result = meili_client.index(bucket).search(contains or "", search_opts)
     counts = _facet_map(result, "Ancestors")
 
     folders: List[Dict[str, Any]] = []
@@ -344,7 +643,8 @@ def list_folder_children_from_meili(
     if subtree:
         search_opts["filter"] = [build_subtree_filter(subtree)]
 
-    result = meili_client.index(bucket).search(contains or "", search_opts)
+    with track_call("meilisearch", "search_facets"):
+        result = meili_client.index(bucket).search(contains or "", search_opts)
     counts = _facet_map(result, "Ancestors")
 
     # get children of current selected folder
@@ -376,7 +676,8 @@ def list_folder_children_from_meili(
         "sort": [f"{sort_field}:{sort_order}"],
         "attributesToRetrieve": ["Key", "Size", "LastModified", "StorageClass"]
     }
-    file_result = meili_client.index(bucket).search(contains or "", file_opts)
+    with track_call("meilisearch", "search"):
+        file_result = meili_client.index(bucket).search(contains or "", file_opts)
 
     # find all files within current folder
     files: List[Dict[str, Any]] = []
@@ -397,3 +698,112 @@ def list_folder_children_from_meili(
         "children": children[:limit],
         "files": files
     }
+
+
+def list_s3_level(bucket: str,
+                  path: str = "",
+                  s3: Optional[BaseClient] = None) -> Dict[str, Any]:
+    """List the direct sub-folders and files of a path with a delimited LIST, cached briefly."""
+    norm_path = normalize_s3_path(path)
+    cached = _shallow_listings.get((bucket, norm_path))
+    if cached is not None:
+        return cached
+
+    if s3 is None:
+        s3 = get_public_client()
+
+    pager = s3.get_paginator("list_objects_v2")
+    folders: List[str] = []
+    files: List[Dict[str, Any]] = []
+    list_prefix = f"{norm_path}/" if norm_path else ""
+
+    try:
+        for page in pager.paginate(Bucket=bucket, Prefix=list_prefix, Delimiter="/"):
+            for common_prefix in page.get("CommonPrefixes", []):
+                folder_path = normalize_s3_path(common_prefix.get("Prefix"))
+                if folder_path and folder_path != norm_path:
+                    folders.append(folder_path)
+
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                # skip folder placeholder objects
+                if key.endswith("/"):
+                    continue
+                files.append({
+                    "key": key,
+                    "size": obj["Size"],
+                    "last_modified": obj.get("LastModified"),
+                    "storage_class": obj.get("StorageClass")
+                })
+
+            if len(folders) + len(files) >= S3_BROWSE_MAX_ENTRIES:
+                break
+
+    except (BotoCoreError, ClientError) as e:
+        raise RuntimeError(f"S3 listing failed: {e}") from e
+
+    level = {"folders": folders, "files": files}
+    _shallow_listings.set((bucket, norm_path), level)
+    return level
+
+
+def _name_matches(name: str, contains: Optional[str]) -> bool:
+    return not contains or contains.lower() in name.lower()
+
+
+def search_folders_from_s3(bucket: str,
+                           prefix: str = "",
+                           contains: Optional[str] = None,
+                           limit: int = 25,
+                           s3: Optional[BaseClient] = None) -> List[Dict[str, Any]]:
+    """Return the direct sub-folders of prefix matching contains, for unindexed buckets."""
+    level = list_s3_level(bucket, prefix, s3=s3)
+    folders = [{
+        "path": folder_path,
+        "name": _folder_name(folder_path),
+        "depth": path_depth(folder_path),
+        "matched_count": 0
+    } for folder_path in level["folders"] if _name_matches(_folder_name(folder_path), contains)]
+
+    folders.sort(key=lambda x: x["path"])
+    return folders[:limit]
+
+
+def list_folder_children_from_s3(
+    bucket: str,
+    prefix: str = "",
+    path: Optional[str] = None,
+    contains: Optional[str] = None,
+    limit: int = 100,
+    sort_by: Optional[str] = None,
+    sort_direction: str = "asc",
+    s3: Optional[BaseClient] = None
+) -> Dict[str, Any]:
+    """Return direct child folders/files of a path straight from S3, for unindexed buckets."""
+    base = normalize_s3_path(prefix)
+    active = normalize_s3_path(path) if path is not None else base
+
+    if base and active and not _is_same_or_descendant(active, base):
+        raise ValueError("Requested path must stay within s3_uri prefix")
+
+    level = list_s3_level(bucket, active, s3=s3)
+
+    children = [{
+        "path": folder_path,
+        "name": _folder_name(folder_path),
+        "depth": path_depth(folder_path),
+        "matched_count": 0
+    } for folder_path in level["folders"] if _name_matches(_folder_name(folder_path), contains)]
+    children.sort(key=lambda x: x["name"])
+
+    files = [f for f in level["files"]
+             if _name_matches(f["key"].rsplit("/", 1)[-1], contains)]
+    sort_field = {"Size": "size", "LastModified": "last_modified"}.get(sort_by, "key")
+    files.sort(key=lambda f: f[sort_field], reverse=sort_direction == "desc")
+
+    return {
+        "path": active,
+        "breadcrumbs": _breadcrumbs(active),
+        "children": children[:limit],
+        "files": files[:limit]
+    }
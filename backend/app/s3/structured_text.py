@@ -0,0 +1,167 @@
+import codecs
+import csv
+import re
+from typing import Dict, Iterable, Iterator, List
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+
+# Data rows of a CSV read after its header
+CSV_SAMPLE_ROWS = 50
+MAX_STRUCTURED_KEYWORDS = 500
+# Longest string value whose words are kept; longer ones are usually free text or encoded data
+MAX_VALUE_CHARS = 256
+
+_NUMBER = re.compile(r"^[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$")
+_WORD = re.compile(r"[^\W_][\w.:-]*")
+
+
+class _Keywords:
+    """Ordered, de-duplicated keywords, capped at MAX_STRUCTURED_KEYWORDS."""
+
+    def __init__(self):
+        self._keywords: Dict[str, None] = {}
+
+    @property
+    def full(self) -> bool:
+        return len(self._keywords) >= MAX_STRUCTURED_KEYWORDS
+
+    def add(self, text: str) -> None:
+        text = text.strip()
+        if text and not self.full and not _NUMBER.match(text):
+            self._keywords.setdefault(text, None)
+
+    def add_words(self, text: str) -> None:
+        if len(text) <= MAX_VALUE_CHARS:
+            for word in _WORD.findall(text):
+                self.add(word)
+
+    def as_list(self) -> List[str]:
+        return list(self._keywords)
+
+
+def _decode(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+
+def csv_keywords(lines: Iterable[str]) -> List[str]:
+    """
+    Return the keywords of a CSV table from its header row and first CSV_SAMPLE_ROWS rows.
+
+    Column names come first, whole and split into words, then the words of the
+    sampled values. `lines` is read no further than the sample.
+    """
+    lines = iter(lines)
+    header = next(lines, "")
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+
+    keywords = _Keywords()
+    for name in next(csv.reader([header], dialect), []):
+        keywords.add(name)
+        keywords.add_words(name)
+    for row_number, row in enumerate(csv.reader(lines, dialect)):
+        if row_number >= CSV_SAMPLE_ROWS or keywords.full:
+            break
+        for value in row:
+            keywords.add_words(value)
+    return keywords.as_list()
+
+
+def json_keywords(chunks: Iterable[bytes]) -> List[str]:
+    """
+    Return the keywords of a JSON (or JSON Lines) document as it streams.
+
+    Object keys come first, then the words of short string values. The
+    document is scanned token by token, so it needs no end: `chunks` may stop
+    anywhere, e.g. at a byte cap.
+    """
+    keys = _Keywords()
+    values: List[str] = []
+    in_string = escaped = False
+    current: List[str] = []
+    # a string that just closed, a key if the next token is ":"
+    pending = None
+    for text in _decode(chunks):
+        for char in text:
+            if in_string:
+                if escaped:
+                    escaped = False
+                    current.append(char)
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+                    pending = "".join(current)
+                else:
+                    current.append(char)
+                    if len(current) > MAX_VALUE_CHARS:
+                        # keep scanning the string without buffering all of it
+                        del current[MAX_VALUE_CHARS:]
+                continue
+            if char.isspace():
+                continue
+            if pending is not None:
+                if char == ":":
+                    keys.add(pending)
+                elif len(values) < MAX_STRUCTURED_KEYWORDS:
+                    values.append(pending)
+                pending = None
+            if char == '"':
+                in_string = True
+                current = []
+        if keys.full:
+            break
+    if pending is not None and len(values) < MAX_STRUCTURED_KEYWORDS:
+        values.append(pending)
+
+    for value in values:
+        keys.add_words(value)
+    return keys.as_list()
+
+
+def _local_name(name: str) -> str:
+    # "{http://namespace}tag" -> "tag"
+    return name.rsplit("}", 1)[-1]
+
+
+def xml_keywords(chunks: Iterable[bytes]) -> List[str]:
+    """
+    Return the keywords of an XML document as it streams.
+
+    Element and attribute names come first, without namespaces, then the
+    words of attribute values and element text. Parsing stops at the first
+    malformed byte, so a document cut short by a byte cap keeps everything
+    read before it.
+    """
+    names = _Keywords()
+    values: List[str] = []
+    parser = XMLPullParser(events=("start", "end"))
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    names.add(_local_name(element.tag))
+                    for attribute, value in element.attrib.items():
+                        names.add(_local_name(attribute))
+                        if len(values) < MAX_STRUCTURED_KEYWORDS:
+                            values.append(value)
+                    continue
+                if element.text and element.text.strip() and len(values) < MAX_STRUCTURED_KEYWORDS:
+                    values.append(element.text)
+                # drop finished elements, so a large document is never held in memory
+                element.clear()
+            if names.full:
+                break
+    except ParseError:
+        pass
+
+    for value in values:
+        names.add_words(value)
+    return names.as_list()
@@ -0,0 +1,283 @@
+import json
+import os
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from itertools import islice
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import meilisearch
+import psycopg
+
+from app.meilisearch.util import get_doc_id
+from app.metrics.registry import track_call
+from app.s3.search import iter_search_from_meili, count_search_from_meili
+from app.s3.utils import escape_meili_filter_val
+
+
+TAG_MODES = ("add", "remove", "replace")
+# Documents written per update_documents call and Postgres statement
+BULK_TAG_BATCH_SIZE = int(os.getenv("BULK_TAG_BATCH_SIZE", "1000"))
+# Selections of at least this many files run as a background job that reports progress.
+#   query estimates are capped by the index's maxTotalHits (1000 by default), so keep it at or below that
+BULK_TAG_SYNC_LIMIT = int(os.getenv("BULK_TAG_SYNC_LIMIT", "1000"))
+
+
+@dataclass
+class TagJob:
+    job_id: str
+    bucket: str
+    mode: str
+    status: str  # queued, running, done, or error
+    total: Optional[int] = None
+    processed: int = 0
+    matched: int = 0
+    updated: int = 0
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    message: Optional[str] = None
+
+
+_jobs: Dict[str, TagJob] = {}
+_lock = Lock()
+
+
+def _now_iso_format() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _save_job(job: TagJob) -> None:
+    """Keep a job locally and in the `tag_jobs` table so every worker can report it."""
+    with _lock:
+        _jobs[job.job_id] = job
+        snapshot = asdict(job)
+    postgres_url = os.getenv("DATABASE_URL")
+    try:
+        with track_call("postgres", "save_tag_job"):
+            with psycopg.connect(postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""INSERT INTO tag_jobs (job_id, bucket, status, data, updated_at)
+                                    VALUES (%s, %s, %s, %s::jsonb, now())
+                                    ON CONFLICT (job_id) DO UPDATE SET status = EXCLUDED.status,
+                                    data = EXCLUDED.data, updated_at = EXCLUDED.updated_at""",
+                                (job.job_id, job.bucket, job.status, json.dumps(snapshot)))
+    except Exception as e:
+        print(f"Failed to persist tag job {job.job_id}: {e}")
+
+
+def create_tag_job(bucket: str, mode: str, total: Optional[int] = None) -> TagJob:
+    job = TagJob(job_id=uuid.uuid4().hex, bucket=bucket, mode=mode, status="queued", total=total)
+    _save_job(job)
+    return job
+
+
+def get_tag_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return the state of a bulk tag job, or None if it is unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        local = asdict(job) if job else None
+    if local is not None:
+        return local
+
+    postgres_url = os.getenv("DATABASE_URL")
+    try:
+        with track_call("postgres", "load_tag_job"):
+            with psycopg.connect(postgres_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""SELECT data FROM tag_jobs WHERE job_id = %s""", (job_id,))
+                    row = cur.fetchone()
+    except Exception as e:
+        print(f"Failed to read tag job {job_id}: {e}")
+        return None
+    if not row:
+        return None
+    return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+
+def apply_tag_mode(current: List[str], tags: List[str], mode: str) -> List[str]:
+    """Return the tags of a file after adding, removing or replacing with `tags`."""
+    if mode == "add":
+        merged = list(current)
+        merged.extend(tag for tag in dict.fromkeys(tags) if tag not in current)
+        return merged
+    if mode == "remove":
+        return [tag for tag in current if tag not in tags]
+    if mode == "replace":
+        return list(dict.fromkeys(tags))
+    raise ValueError(f"Invalid tag mode '{mode}', expected one of {', '.join(TAG_MODES)}")
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _documents_for_keys(index, keys: List[str]) -> List[Dict[str, Any]]:
+    """
+    Fetch the indexed files among `keys` with their current tags; unknown keys are dropped.
+
+    Meilisearch compares filter strings case-insensitively, so `Key IN` also
+    returns files whose key only differs in case. They are paged through and
+    dropped here, leaving exact matches only.
+    """
+    wanted = set(keys)
+    values = ", ".join(f"'{escape_meili_filter_val(key)}'" for key in keys)
+    documents = []
+    offset = 0
+    while True:
+        with track_call("meilisearch", "get_documents"):
+            result = index.get_documents({
+                "filter": f"Key IN [{values}]",
+                "fields": ["Key", "Tags"],
+                "offset": offset,
+                "limit": len(keys)
+            })
+        documents.extend({"key": document.Key, "tags": list(getattr(document, "Tags", None) or [])}
+                         for document in result.results if document.Key in wanted)
+        offset += len(result.results)
+        if not result.results or offset >= result.total:
+            return documents
+
+
+def iter_tag_selection(bucket: str,
+                       index,
+                       keys: Optional[List[str]] = None,
+                       prefix: str = "",
+                       contains: Optional[str] = None,
+                       suffixes: Optional[List[str]] = None,
+                       batch_size: Optional[int] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield the selected files in batches of `{"key", "tags"}`, either by key or by search query.
+
+    Each batch comes with the number of selected keys it covers, which is
+    larger than the batch when some keys are not in the index.
+    """
+    batch_size = batch_size or BULK_TAG_BATCH_SIZE
+    if keys is not None:
+        for chunk in _batched(dict.fromkeys(keys), batch_size):
+            yield len(chunk), _documents_for_keys(index, chunk)
+        return
+
+    objects = iter_search_from_meili(bucket, prefix, page_size=batch_size,
+                                     contains=contains, suffixes=suffixes, sort_by="Key")
+    for batch in _batched(objects, batch_size):
+        yield len(batch), [{"key": obj["key"], "tags": list(obj.get("tags") or [])} for obj in batch]
+
+
+def apply_tag_batch(bucket: str, index, cur, batch: List[Dict[str, Any]],
+                    tags: List[str], mode: str) -> int:
+    """
+    Write the new tags of one batch with a single Meilisearch task and two statements.
+
+    Files whose tags do not change are skipped. Returns the number updated.
+    """
+    changes = []
+    for obj in batch:
+        new_tags = apply_tag_mode(obj["tags"], tags, mode)
+        if new_tags != obj["tags"]:
+            changes.append((get_doc_id(obj["key"]), new_tags))
+    if not changes:
+        return 0
+
+    with track_call("meilisearch", "update_documents"):
+        index.update_documents([{"ID": doc_id, "Tags": new_tags} for doc_id, new_tags in changes])
+
+    upserts = [(doc_id, bucket, new_tags) for doc_id, new_tags in changes if new_tags]
+    deletes = [doc_id for doc_id, new_tags in changes if not new_tags]
+    if upserts:
+        with track_call("postgres", "upsert_file_tags"):
+            cur.executemany("""INSERT INTO file_tags (hashed_key, bucket, tags) VALUES (%s, %s, %s)
+                            ON CONFLICT (hashed_key) DO UPDATE SET tags = EXCLUDED.tags""", upserts)
+    if deletes:
+        with track_call("postgres", "delete_file_tags"):
+            cur.execute("""DELETE FROM file_tags WHERE hashed_key = ANY(%s)""", (deletes,))
+    return len(changes)
+
+
+def bulk_tag(bucket: str,
+             tags: List[str],
+             mode: str = "add",
+             keys: Optional[List[str]] = None,
+             prefix: str = "",
+             contains: Optional[str] = None,
+             suffixes: Optional[List[str]] = None,
+             job: Optional[TagJob] = None) -> Dict[str, int]:
+    """
+    Add, remove or replace tags on many files at once.
+
+    Files are selected by explicit keys, or by a folder prefix and search
+    query. Each batch is committed before the next one is read, so a job
+    that fails part way keeps the batches already written and its progress
+    reflects them.
+
+    Returns
+    -------
+        dict
+            `processed` selected keys or objects, `matched` files found in the index
+            and `updated` files whose tags changed.
+
+    Raises
+    ------
+        ValueError
+            If the mode is not one of `TAG_MODES`.
+    """
+    if mode not in TAG_MODES:
+        raise ValueError(f"Invalid tag mode '{mode}', expected one of {', '.join(TAG_MODES)}")
+
+    meilisearch_url = os.getenv("MEILISEARCH_URL")
+    meili_client = meilisearch.Client(meilisearch_url)
+    postgres_url = os.getenv("DATABASE_URL")
+
+    if job is not None:
+        job.status = "running"
+        job.started_at = _now_iso_format()
+        _save_job(job)
+
+    processed = 0
+    matched = 0
+    updated = 0
+    try:
+        with track_call("meilisearch", "get_index"):
+            index = meili_client.get_index(bucket)
+        with psycopg.connect(postgres_url) as conn:
+            with conn.cursor() as cur:
+                for selected, batch in iter_tag_selection(bucket, index, keys=keys, prefix=prefix,
+                                                          contains=contains, suffixes=suffixes):
+                    updated += apply_tag_batch(bucket, index, cur, batch, tags, mode)
+                    conn.commit()
+                    processed += selected
+                    matched += len(batch)
+                    if job is not None:
+                        job.processed = processed
+                        job.matched = matched
+                        job.updated = updated
+                        _save_job(job)
+    except Exception as e:
+        if job is not None:
+            job.status = "error"
+            job.message = str(e)
+            job.finished_at = _now_iso_format()
+            _save_job(job)
+        raise
+
+    if job is not None:
+        job.status = "done"
+        job.finished_at = _now_iso_format()
+        _save_job(job)
+    return {"processed": processed, "matched": matched, "updated": updated}
+
+
+def count_tag_selection(bucket: str,
+                        keys: Optional[List[str]] = None,
+                        prefix: str = "",
+                        contains: Optional[str] = None,
+                        suffixes: Optional[List[str]] = None) -> int:
+    """Estimate the selection size, used to decide whether to run in the background."""
+    if keys is not None:
+        return len(set(keys))
+    return count_search_from_meili(bucket, prefix, contains=contains, suffixes=suffixes)
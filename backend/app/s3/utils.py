@@ -4,6 +4,8 @@ from botocore import UNSIGNED
 from botocore.client import Config
 from mypy_boto3_s3 import S3Client
 from typing import Optional, List
+from app.metrics.registry import instrument_s3_client
+from app.s3.rate_limit import limit_s3_client
 
 
 def parse_s3_uri(uri: str) -> tuple[str, str]:
@@ -14,8 +16,9 @@ def parse_s3_uri(uri: str) -> tuple[str, str]:
 
 
 def get_public_client(region: Optional[str] = None) -> S3Client:
-    return boto3.client("s3", region_name=region,
-                        config=Config(signature_version=UNSIGNED))
+    client = boto3.client("s3", region_name=region,
+                          config=Config(signature_version=UNSIGNED))
+    return limit_s3_client(instrument_s3_client(client))
 
 
 def generate_preview_url(bucket: str, key: str, expires_in=300):
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union
 
-# NOTE: if you change the model, you must delete all of the indexes and reindex everything for the changes to be present
+# NOTE: if you change the model, every index must be rebuilt for the changes to be present (POST /api/s3/refresh/rebuild)
 
 
 class MeiliDocumentModel(BaseModel):
@@ -17,9 +17,28 @@ class MeiliDocumentModel(BaseModel):
     StorageClass: str
     Keywords: List[str]
     Tags: List[str]
+    # from PDS3 labels, absent on other files
+    TargetName: Optional[Union[str, List[str]]] = None
+    InstrumentId: Optional[Union[str, List[str]]] = None
+    ProductType: Optional[Union[str, List[str]]] = None
+    # from image headers, absent on other files
+    Width: Optional[int] = None
+    Height: Optional[int] = None
+    Bands: Optional[int] = None
+    Crs: Optional[str] = None
     # Prefix: Optional[str] = None
 
 class TagRequest(BaseModel):
     bucket: str
     key: str
-    tags: List[str]
\ No newline at end of file
+    tags: List[str]
+
+class BulkTagRequest(BaseModel):
+    bucket: str
+    tags: List[str]
+    mode: str = "add"  # add, remove, or replace
+    # select files either by key, or by folder path and search query
+    keys: Optional[List[str]] = None
+    path: Optional[str] = None
+    contains: Optional[str] = None
+    suffixes: Optional[List[str]] = None
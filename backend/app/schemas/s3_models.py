@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 
@@ -11,6 +11,11 @@ class S3ObjectModel(BaseModel):
     tags: Optional[List[str]] = None
 
 
+class S3SearchPageResponse(BaseModel):
+    items: List[S3ObjectModel]
+    next_cursor: Optional[str] = None
+
+
 class S3FolderModel(BaseModel):
     path: str
     name: str
@@ -28,3 +33,17 @@ class S3FolderChildrenResponse(BaseModel):
     breadcrumbs: List[S3BreadcrumbModel]
     children: List[S3FolderModel]
     files: List[S3ObjectModel]
+
+
+class S3ArchiveRequest(BaseModel):
+    s3_uri: str
+    keys: Optional[List[str]] = None
+    path: Optional[str] = None
+    contains: Optional[str] = None
+    suffixes: Optional[List[str]] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    storage_classes: Optional[List[str]] = None
+    modified_after: Optional[datetime] = None
+    modified_before: Optional[datetime] = None
+    limit: int = Field(1000, ge=1)
@@ -0,0 +1,201 @@
+"""
+Indexing worker: runs the refresh and rebuild jobs queued in Postgres.
+
+Run it with `python -m app.worker`, as many replicas as wanted. The API only
+queues jobs (see `app.jobs.queue`), so extraction load never competes with
+serving requests. With REFRESH_SHARDS above 1 a refresh is split into folder
+shards (see `app.jobs.shards`) that every worker takes part in.
+"""
+import os
+import signal
+import socket
+import threading
+from typing import Any, Dict, List, Optional
+
+import psycopg
+
+from app.jobs.queue import (
+    RefreshJob,
+    claim_job,
+    finish_job,
+    heartbeat_job,
+    keep_alive,
+    requeue_stale_jobs,
+)
+from app.jobs.shards import (
+    REFRESH_SHARDS,
+    RefreshShard,
+    claim_shard,
+    create_shards,
+    expire_shards,
+    finish_shard,
+    heartbeat_shard,
+    list_shards,
+    shard_progress,
+)
+from app.s3.index_refresh import (
+    plan_refresh_shards,
+    prepare_index,
+    rebuild_meili_index,
+    refresh_meili_index,
+    refresh_shard,
+    sweep_unsharded_documents,
+)
+from app.s3.refresh_status import update_shared_status
+from app.s3.utils import normalize_s3_path, parse_s3_uri
+
+
+# Seconds between polls of an empty queue
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "5"))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_job(job: RefreshJob, postgres_url: Optional[str] = None) -> bool:
+    """
+    Run a refresh or rebuild job; its progress is reported through the refresh status.
+
+    Returns False if the refresh was split into shards instead, the job is
+    then finished by whichever worker runs its sweep shard.
+    """
+    bucket, prefix = parse_s3_uri(job.s3_uri)
+    if job.kind == "rebuild":
+        rebuild_meili_index(bucket, prefix, s3_uri=job.s3_uri)
+        return True
+
+    if REFRESH_SHARDS > 1:
+        plan = plan_refresh_shards(bucket, prefix, REFRESH_SHARDS)
+        if len(plan) > 1:
+            # shards only index documents, the index and its settings must be ready first
+            prepare_index(bucket)
+            with psycopg.connect(postgres_url or os.getenv("DATABASE_URL")) as conn:
+                create_shards(conn, job, bucket, normalize_s3_path(prefix), plan)
+            update_shared_status(job.s3_uri, start=True, status="running", total=len(plan))
+            print(f"Split refresh job {job.id} of {job.s3_uri} into {len(plan)} shards")
+            return False
+
+    refresh_meili_index(bucket, prefix, s3_uri=job.s3_uri)
+    return True
+
+
+def run_shard(shard: RefreshShard, postgres_url: Optional[str] = None) -> Dict[str, Any]:
+    """Run one shard of a sharded refresh, returning its counts."""
+    if shard.scope != "sweep":
+        return refresh_shard(shard.bucket, shard.folder, shard.scope)
+    with psycopg.connect(postgres_url or os.getenv("DATABASE_URL")) as conn:
+        plan = [(other.folder, other.scope) for other in list_shards(conn, shard.job_id) if other.scope != "sweep"]
+    return sweep_unsharded_documents(shard.bucket, shard.folder, plan)
+
+
+def _sharded_job_error(shards: List[RefreshShard]) -> Optional[str]:
+    failed = [shard for shard in shards if shard.status == "error"]
+    if not failed:
+        return None
+    return f"{len(failed)} of {len(shards)} shards failed: " + "; ".join(
+        f"{shard.scope} {shard.folder or '/'}: {shard.message}" for shard in failed[:5])
+
+
+def _report_shards(shard: RefreshShard, shards: List[RefreshShard]) -> None:
+    progress = shard_progress(shards)
+    message = f"{progress['finished']} of {progress['shards']} shards finished, {progress['changed']} objects changed"
+    status = "running"
+    if shard.scope == "sweep":
+        error = _sharded_job_error(shards)
+        status = "error" if error else "done"
+        message = error or message
+    update_shared_status(shard.s3_uri, status=status, listed=progress["listed"],
+                         processed=progress["finished"], total=progress["shards"],
+                         failed_tasks=progress["failed_tasks"], message=message)
+
+
+def _heartbeat(postgres_url: Optional[str], beat, item_id: int, worker: str) -> bool:
+    with psycopg.connect(postgres_url) as conn:
+        return beat(conn, item_id, worker)
+
+
+def work_on_shard(postgres_url: Optional[str], worker: str, shard: RefreshShard) -> None:
+    """Run a claimed shard under a heartbeated lease, then record its outcome."""
+    print(f"Worker {worker} running {shard.scope} shard {shard.id} of job {shard.job_id}: "
+          f"s3://{shard.bucket}/{shard.folder}")
+    result, error = None, None
+    with keep_alive(lambda: _heartbeat(postgres_url, heartbeat_shard, shard.id, worker)):
+        try:
+            result = run_shard(shard, postgres_url)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"Shard {shard.id} failed: error={error}")
+
+    with psycopg.connect(postgres_url) as conn:
+        if not finish_shard(conn, shard.id, worker, result, error):
+            print(f"Shard {shard.id} lease was lost, its outcome is left to the worker that took over")
+            return
+        shards = list_shards(conn, shard.job_id)
+        if shard.scope == "sweep":
+            finish_job(conn, shard.job_id, _sharded_job_error(shards))
+    _report_shards(shard, shards)
+
+
+def work_once(postgres_url: Optional[str], worker: str) -> bool:
+    """
+    Claim and run one shard, or else one job. Returns False if there was nothing to do.
+
+    Shards of running jobs go first so a sharded refresh finishes before new jobs start.
+    """
+    with psycopg.connect(postgres_url) as conn:
+        requeue_stale_jobs(conn)
+        abandoned = expire_shards(conn)
+        shard = claim_shard(conn, worker)
+        job = claim_job(conn, worker) if shard is None else None
+    for s3_uri in abandoned:
+        update_shared_status(s3_uri, status="error", message="The sweep shard's worker stopped responding")
+    if shard is not None:
+        work_on_shard(postgres_url, worker, shard)
+        return True
+    if job is None:
+        return False
+
+    print(f"Worker {worker} running {job.kind} job {job.id} for {job.s3_uri}")
+    error = None
+    finished = True
+    with keep_alive(lambda: _heartbeat(postgres_url, heartbeat_job, job.id, worker)) as lost:
+        try:
+            finished = run_job(job, postgres_url)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"Job {job.id} failed: s3_uri={job.s3_uri}, error={error}")
+    if lost.is_set():
+        print(f"Job {job.id} lease was lost, its outcome is left to the worker that took over")
+        return True
+    if finished:
+        with psycopg.connect(postgres_url) as conn:
+            if not finish_job(conn, job.id, error, worker=worker):
+                print(f"Job {job.id} was taken over by another worker, its outcome was not recorded")
+    return True
+
+
+def run_worker(stop: threading.Event, postgres_url: Optional[str] = None, worker: Optional[str] = None) -> None:
+    """Run jobs until `stop` is set, finishing the current job first."""
+    postgres_url = postgres_url or os.getenv("DATABASE_URL")
+    worker = worker or worker_id()
+    print(f"Indexing worker {worker} started")
+    while not stop.is_set():
+        try:
+            if work_once(postgres_url, worker):
+                continue
+        except Exception as e:
+            print(f"Worker {worker} could not reach the job queue: {e}")
+        stop.wait(WORKER_POLL_SECONDS)
+    print(f"Indexing worker {worker} stopped")
+
+
+def main() -> None:
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    run_worker(stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_revision() -> Dict[str, Any]:
+    """Return the current commit and whether app code differs from it."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--", "app"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def result_header(benchmark: str) -> Dict[str, Any]:
+    """Fields identifying where and when a result was produced."""
+    return {
+        **git_revision(),
+        "benchmark": benchmark,
+        "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def write_result(result: Dict[str, Any], name: str, output: Optional[str] = None) -> str:
+    """
+    Write a result as JSON and return its path.
+
+    `output` may be a .json file, or a directory in which the file is named
+    `<name>-<commit>-<time>.json`. Defaults to benchmarks/results.
+    """
+    if output and output.endswith(".json"):
+        path = output
+    else:
+        stamp = result["timestamp"].replace(":", "").replace("-", "").split(".")[0]
+        path = os.path.join(output or RESULTS_DIR, f"{name}-{result['commit']}-{stamp}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as result_file:
+        json.dump(result, result_file, indent=2)
+    return path
+
+
+def load_result(path: str) -> Dict[str, Any]:
+    with open(path) as result_file:
+        return json.load(result_file)
+
+
+def percent_change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
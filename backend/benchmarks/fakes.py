@@ -0,0 +1,241 @@
+from datetime import datetime, timezone
+from itertools import count
+from threading import Lock
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+# Rows of custom_mime_types as created by initdb/init.sql
+CUSTOM_MIME_TYPES = [
+    ("lbl", "text/lbl"),
+    ("lab", "text/lab"),
+    ("geojson", "application/geo+json"),
+    ("kmz", "application/vnd.google-earth.kmz"),
+    ("kml", "application/vnd.google-earth.kml+xml"),
+]
+
+
+class FakeMeiliIndex:
+    """In-memory stand-in for a Meilisearch index, holding documents by primary key."""
+
+    def __init__(self, server: "FakeMeiliServer", uid: str) -> None:
+        self.server = server
+        self.uid = uid
+
+    @property
+    def _documents(self) -> Dict[str, Dict[str, Any]]:
+        return self.server.documents.setdefault(self.uid, {})
+
+    def add_documents(self, documents: List[Dict[str, Any]], primary_key: Optional[str] = None):
+        with self.server.lock:
+            for document in documents:
+                self._documents[document["ID"]] = dict(document)
+        return self.server.task()
+
+    def update_documents(self, documents: List[Dict[str, Any]], primary_key: Optional[str] = None):
+        with self.server.lock:
+            for document in documents:
+                self._documents.setdefault(document["ID"], {}).update(document)
+        return self.server.task()
+
+    def delete_document(self, document_id: str):
+        with self.server.lock:
+            self._documents.pop(document_id, None)
+        return self.server.task()
+
+    def delete_documents(self, ids: Optional[List[str]] = None, **kwargs):
+        with self.server.lock:
+            for document_id in ids or []:
+                self._documents.pop(document_id, None)
+        return self.server.task()
+
+    def update_settings(self, settings: Dict[str, Any]):
+        with self.server.lock:
+            self.server.settings.setdefault(self.uid, {}).update(settings)
+        return self.server.task()
+
+    def get_settings(self) -> Dict[str, Any]:
+        return dict(self.server.settings.get(self.uid, {}))
+
+    def get_documents(self, parameters: Optional[Dict[str, Any]] = None):
+        # filters are ignored, the benchmark always refreshes whole buckets
+        parameters = parameters or {}
+        offset = parameters.get("offset", 0)
+        limit = parameters.get("limit", 20)
+        fields = parameters.get("fields")
+        with self.server.lock:
+            documents = list(self._documents.values())
+        results = []
+        for document in documents[offset:offset + limit]:
+            if fields:
+                document = {name: document.get(name) for name in fields}
+            results.append(SimpleNamespace(**document))
+        return SimpleNamespace(results=results, total=len(documents),
+                               offset=offset, limit=limit)
+
+
+class FakeMeiliServer:
+    """Shared state of every fake client, standing in for one Meilisearch instance."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.documents: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.settings: Dict[str, Dict[str, Any]] = {}
+        self._task_ids = count()
+        self.enqueued_at: Dict[int, datetime] = {}
+
+    def task(self):
+        uid = next(self._task_ids)
+        self.enqueued_at[uid] = datetime.now(timezone.utc)
+        return SimpleNamespace(task_uid=uid, status="enqueued")
+
+    def client(self, url: Optional[str] = None, api_key: Optional[str] = None) -> "FakeMeiliClient":
+        return FakeMeiliClient(self)
+
+
+class FakeMeiliClient:
+    def __init__(self, server: FakeMeiliServer) -> None:
+        self.server = server
+
+    def index(self, uid: str) -> FakeMeiliIndex:
+        return FakeMeiliIndex(self.server, uid)
+
+    def get_index(self, uid: str) -> FakeMeiliIndex:
+        if uid not in self.server.documents:
+            raise KeyError(uid)
+        return self.index(uid)
+
+    def create_index(self, uid: str, options: Optional[Dict[str, Any]] = None):
+        with self.server.lock:
+            self.server.documents.setdefault(uid, {})
+        return self.server.task()
+
+    def delete_index(self, uid: str):
+        with self.server.lock:
+            self.server.documents.pop(uid, None)
+            self.server.settings.pop(uid, None)
+        return self.server.task()
+
+    def swap_indexes(self, parameters: List[Dict[str, List[str]]]):
+        with self.server.lock:
+            for swap in parameters:
+                first, second = swap["indexes"]
+                for store in (self.server.documents, self.server.settings):
+                    store[first], store[second] = store.get(second, {}), store.get(first, {})
+        return self.server.task()
+
+    def get_task(self, uid: int):
+        # writes are applied as they are made, so every task has already succeeded
+        enqueued_at = self.server.enqueued_at.get(uid)
+        return SimpleNamespace(uid=uid, status="succeeded", type="documentAdditionOrUpdate", error=None,
+                               enqueued_at=enqueued_at, finished_at=enqueued_at)
+
+    def get_tasks(self, parameters: Optional[Dict[str, Any]] = None):
+        # nothing is ever queued or failed
+        return SimpleNamespace(results=[], total=0)
+
+    def get_raw_indexes(self, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        parameters = parameters or {}
+        offset = parameters.get("offset", 0)
+        limit = parameters.get("limit", 20)
+        uids = sorted(self.server.documents)
+        return {
+            "results": [{"uid": uid, "primaryKey": "ID"} for uid in uids[offset:offset + limit]],
+            "offset": offset,
+            "limit": limit,
+            "total": len(uids),
+        }
+
+
+class FakeCursor:
+    """Cursor answering the queries a refresh makes, with no tags stored."""
+
+    def __init__(self, database: "FakeDatabase") -> None:
+        self.database = database
+        self._rows: List[tuple] = []
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def execute(self, query: str, params: Any = None) -> "FakeCursor":
+        self.database.record(query)
+        self._rows = CUSTOM_MIME_TYPES if "custom_mime_types" in query else []
+        return self
+
+    def executemany(self, query: str, params_seq: Any) -> None:
+        self.database.record(query)
+        self._rows = []
+
+    def fetchall(self) -> List[tuple]:
+        return list(self._rows)
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._rows[0] if self._rows else None
+
+    def fetchmany(self, size: int = 1) -> List[tuple]:
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class FakeConnection:
+    def __init__(self, database: "FakeDatabase") -> None:
+        self.database = database
+
+    def __enter__(self) -> "FakeConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def cursor(self, *args, **kwargs) -> FakeCursor:
+        return FakeCursor(self.database)
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDatabase:
+    """Stand-in for the `psycopg` module that counts connections and statements."""
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.connections = 0
+        self.statements = 0
+
+    def record(self, query: str) -> None:
+        with self.lock:
+            self.statements += 1
+
+    def connect(self, *args, **kwargs) -> FakeConnection:
+        with self.lock:
+            self.connections += 1
+        return FakeConnection(self)
+
+
+def install_fakes(meili: Optional[FakeMeiliServer] = None,
+                  database: Optional[FakeDatabase] = None) -> None:
+    """
+    Replace the Meilisearch and Postgres clients used by the refresh code.
+
+    Only modules that reference the `meilisearch` and `psycopg` modules
+    directly need patching; everything else reaches them through these.
+    """
+    import app.meilisearch.util as meili_util
+    import app.s3.index_refresh as index_refresh
+
+    if meili is not None:
+        fake_module = SimpleNamespace(Client=meili.client)
+        for module in (index_refresh, meili_util):
+            module.meilisearch = fake_module
+    if database is not None:
+        for module in (index_refresh, meili_util):
+            module.psycopg = database
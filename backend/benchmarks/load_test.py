@@ -0,0 +1,572 @@
+"""
+Load test for the search and folder browsing endpoints.
+
+Seeds a Meilisearch index with synthetic documents shaped like the ones an
+index refresh writes, then drives `/api/s3/search`, `/api/s3/folders/search`
+and `/api/s3/folders/children` with a weighted query mix from concurrent
+keep-alive clients, and writes per-scenario latency histograms and
+throughput to a JSON file.
+
+    cd backend
+    docker compose up meilisearch -d
+    python -m benchmarks.load_test seed --meili-url http://localhost:7700 --objects 50000
+    python -m benchmarks.load_test run --start-api --meili-url http://localhost:7700
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import load_result, percent_change, result_header, write_result
+from benchmarks.synthetic import WORDS, BucketSpec, CONTENT_KINDS, parse_mix
+
+
+INDEX = "artemis3-load"
+
+# Upper bounds of the latency histogram buckets in milliseconds, ~19% apart
+HISTOGRAM_BOUNDS_MS = [round(0.5 * 1.19 ** i, 3) for i in range(60)]
+
+DEFAULT_SCENARIOS = (
+    "search_contains=20,search_prefix_suffix=15,search_sorted=10,search_deep_prefix=10,"
+    "folders_search=15,folders_search_prefix=5,folders_children_root=10,folders_children_deep=15"
+)
+
+
+def build_document(key: str, size: int, last_modified: int, content_type: str,
+                   keywords: List[str]) -> Dict[str, Any]:
+    """Build an index document the same way `create_document` does for an S3 object."""
+    from app.meilisearch.util import get_doc_id
+    from app.s3.utils import key_filename, key_parent_path, normalize_s3_path, parent_ancestors, path_depth
+
+    norm_key = normalize_s3_path(key)
+    parent_path = key_parent_path(norm_key)
+    return {
+        "ID": get_doc_id(key),
+        "Key": key,
+        "FileName": key_filename(norm_key),
+        "ParentPath": parent_path,
+        "Ancestors": parent_ancestors(parent_path),
+        "Depth": path_depth(parent_path),
+        "LastModified": last_modified,
+        "Size": size,
+        "StorageClass": "STANDARD",
+        "ContentType": content_type,
+        "Keywords": keywords,
+        "Tags": [],
+    }
+
+
+def generate_documents(spec: BucketSpec) -> Iterator[Dict[str, Any]]:
+    """Yield synthetic documents; no object bodies are generated, only their metadata."""
+    from app.s3.index_refresh import get_keywords_from_key
+
+    rng = random.Random(spec.seed)
+    kinds = list(spec.mix)
+    weights = [spec.mix[kind] for kind in kinds]
+    now = int(time.time())
+    for index in range(spec.objects):
+        kind = rng.choices(kinds, weights)[0]
+        extension, content_type = CONTENT_KINDS[kind]
+        levels = rng.randint(0, spec.depth)
+        parts = [f"level{level}-{rng.randrange(spec.fanout)}" for level in range(levels)]
+        parts.append(f"object-{index:07d}.{extension}")
+        key = "/".join(parts)
+        keywords = get_keywords_from_key(key) + rng.sample(WORDS, 12)
+        size = max(64, int(rng.expovariate(1 / (spec.mean_size_kb * 1024 or 1))))
+        last_modified = now - rng.randrange(5 * 365 * 86400)
+        yield build_document(key, size, last_modified, content_type, keywords)
+
+
+def seed_index(meili_url: str, index: str, spec: BucketSpec, batch_size: int) -> Dict[str, Any]:
+    """Recreate an index with the app's settings and fill it with synthetic documents."""
+    import meilisearch
+    from app.s3.index_refresh import INDEX_SETTINGS
+
+    client = meilisearch.Client(meili_url)
+    client.wait_for_task(client.delete_index(index).task_uid, timeout_in_ms=600_000)
+    client.wait_for_task(client.create_index(index, {"primaryKey": "ID"}).task_uid)
+    idx = client.index(index)
+    idx.update_settings(INDEX_SETTINGS)
+
+    start = time.perf_counter()
+    documents = 0
+    last_task = None
+    batch: List[Dict[str, Any]] = []
+    for document in generate_documents(spec):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            last_task = idx.add_documents(batch)
+            documents += len(batch)
+            batch = []
+    if batch:
+        last_task = idx.add_documents(batch)
+        documents += len(batch)
+    if last_task is not None:
+        client.wait_for_task(last_task.task_uid, timeout_in_ms=3_600_000, interval_in_ms=500)
+    return {"documents": documents, "seconds": round(time.perf_counter() - start, 2)}
+
+
+@dataclass
+class Corpus:
+    """Folder paths, words and suffixes sampled from an index, used to build queries."""
+    bucket: str
+    folders: List[str]
+    deep_folders: List[str]
+    words: List[str]
+    suffixes: List[str]
+
+
+def sample_corpus(client: "ApiClient", bucket: str, sample: int) -> Corpus:
+    """Sample object keys through the search API to learn the shape of the index."""
+    status, body = client.get("/api/s3/search", {"s3_uri": f"s3://{bucket}", "limit": min(sample, 1000)})
+    if status != 200:
+        raise RuntimeError(f"Sampling s3://{bucket} failed with HTTP {status}: {body[:200]!r}")
+    keys = [item["key"] for item in json.loads(body)]
+    if not keys:
+        raise RuntimeError(f"s3://{bucket} has no objects, run the seed command first")
+
+    folders = set()
+    words = set()
+    suffixes = set()
+    for key in keys:
+        parts = key.strip("/").split("/")
+        for depth in range(1, len(parts)):
+            folders.add("/".join(parts[:depth]))
+        name = parts[-1]
+        if "." in name:
+            suffixes.add("." + name.rsplit(".", 1)[-1])
+        words.update(word for word in name.replace(".", "-").split("-") if len(word) > 2)
+        words.update(word for part in parts[:-1] for word in part.split("-") if len(word) > 2)
+
+    folders_sorted = sorted(folders)
+    deepest = max((folder.count("/") for folder in folders_sorted), default=0)
+    deep = [folder for folder in folders_sorted if folder.count("/") >= max(0, deepest - 1)]
+    return Corpus(bucket=bucket,
+                  folders=folders_sorted or [""],
+                  deep_folders=deep or folders_sorted or [""],
+                  words=sorted(words) or ["object"],
+                  suffixes=sorted(suffixes) or [".txt"])
+
+
+Query = Tuple[str, List[Tuple[str, Any]]]
+
+
+def _uri(corpus: Corpus, folder: str = "") -> str:
+    return f"s3://{corpus.bucket}/{folder}" if folder else f"s3://{corpus.bucket}"
+
+
+def _search_contains(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/search", [("s3_uri", _uri(corpus)), ("contains", rng.choice(corpus.words)),
+                              ("limit", 50)]
+
+
+def _search_prefix_suffix(rng: random.Random, corpus: Corpus) -> Query:
+    params = [("s3_uri", _uri(corpus, rng.choice(corpus.folders))), ("limit", 100)]
+    params += [("suffixes", suffix) for suffix in rng.sample(corpus.suffixes, min(2, len(corpus.suffixes)))]
+    return "/api/s3/search", params
+
+
+def _search_sorted(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/search", [("s3_uri", _uri(corpus)), ("contains", rng.choice(corpus.words)),
+                              ("sort_by", rng.choice(["Size", "LastModified", "Key"])),
+                              ("sort_direction", rng.choice(["asc", "desc"])), ("limit", 100)]
+
+
+def _search_deep_prefix(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/search", [("s3_uri", _uri(corpus, rng.choice(corpus.deep_folders))),
+                              ("sort_by", "Key"), ("limit", 100)]
+
+
+def _folders_search(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/folders/search", [("s3_uri", _uri(corpus)), ("contains", rng.choice(corpus.words)),
+                                      ("limit", 25)]
+
+
+def _folders_search_prefix(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/folders/search", [("s3_uri", _uri(corpus, rng.choice(corpus.folders))),
+                                      ("contains", rng.choice(corpus.words)), ("limit", 25)]
+
+
+def _folders_children_root(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/folders/children", [("s3_uri", _uri(corpus)), ("limit", 100)]
+
+
+def _folders_children_deep(rng: random.Random, corpus: Corpus) -> Query:
+    return "/api/s3/folders/children", [("s3_uri", _uri(corpus)), ("path", rng.choice(corpus.deep_folders)),
+                                        ("sort_by", rng.choice(["Key", "Size", "LastModified"])),
+                                        ("limit", 100)]
+
+
+SCENARIOS: Dict[str, Callable[[random.Random, Corpus], Query]] = {
+    "search_contains": _search_contains,
+    "search_prefix_suffix": _search_prefix_suffix,
+    "search_sorted": _search_sorted,
+    "search_deep_prefix": _search_deep_prefix,
+    "folders_search": _folders_search,
+    "folders_search_prefix": _folders_search_prefix,
+    "folders_children_root": _folders_children_root,
+    "folders_children_deep": _folders_children_deep,
+}
+
+
+def parse_scenarios(value: str) -> Dict[str, int]:
+    weights = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {sorted(SCENARIOS)}")
+        weights[name] = int(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("Scenario mix must have at least one positive weight")
+    return weights
+
+
+class Histogram:
+    """Fixed log-bucket latency histogram, cheap enough to update on every request."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        if latency_ms <= HISTOGRAM_BOUNDS_MS[0]:
+            bucket = 0
+        else:
+            bucket = min(len(HISTOGRAM_BOUNDS_MS),
+                         math.ceil(math.log(latency_ms / 0.5, 1.19) - 1e-9))
+        self.counts[bucket] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.sum_ms += other.sum_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Upper bound of the bucket holding the percentile, accurate to one bucket width."""
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * percent / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if bucket == len(HISTOGRAM_BOUNDS_MS):
+                    return round(self.max_ms, 3)
+                return min(HISTOGRAM_BOUNDS_MS[bucket], round(self.max_ms, 3))
+        return round(self.max_ms, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 3) if self.total else None,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": [{"le_ms": HISTOGRAM_BOUNDS_MS[i] if i < len(HISTOGRAM_BOUNDS_MS) else None,
+                         "count": count}
+                        for i, count in enumerate(self.counts) if count],
+        }
+
+
+class ApiClient:
+    """One keep-alive HTTP connection, reopened after errors."""
+
+    def __init__(self, base_url: str, timeout: float) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.connection is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.connection = cls(self.host, self.port, timeout=self.timeout)
+        return self.connection
+
+    def get(self, path: str, params: Any) -> Tuple[int, bytes]:
+        connection = self._connect()
+        try:
+            connection.request("GET", f"{path}?{urlencode(params, doseq=True)}")
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+@dataclass
+class WorkerStats:
+    histograms: Dict[str, Histogram]
+    statuses: Dict[str, Counter]
+    errors: Counter
+
+
+def _worker(worker_id: int, args: argparse.Namespace, corpus: Corpus, weights: Dict[str, int],
+            start_at: float, warmup_until: float, stop_at: float, stats: WorkerStats) -> None:
+    rng = random.Random(args.seed * 1000 + worker_id)
+    names = list(weights)
+    name_weights = [weights[name] for name in names]
+    client = ApiClient(args.base_url, args.timeout)
+    # with --rate each worker sends on a fixed schedule and latency is measured
+    # from the scheduled send time, so a slow server cannot hide queueing delay
+    interval = args.concurrency / args.rate if args.rate else 0.0
+    scheduled = start_at + rng.random() * interval
+    try:
+        while True:
+            if interval:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = scheduled if interval else time.perf_counter()
+            if sent >= stop_at:
+                break
+            name = rng.choices(names, name_weights)[0]
+            path, params = SCENARIOS[name](rng, corpus)
+            try:
+                status, _ = client.get(path, params)
+                outcome = str(status)
+            except (OSError, http.client.HTTPException) as e:
+                outcome = type(e).__name__
+            latency_ms = (time.perf_counter() - sent) * 1000
+            scheduled += interval
+            if sent < warmup_until:
+                continue
+            stats.statuses[name][outcome] += 1
+            if outcome.isdigit() and int(outcome) < 400:
+                stats.histograms[name].record(latency_ms)
+            else:
+                stats.errors[name] += 1
+    finally:
+        client.close()
+
+
+def run_load(args: argparse.Namespace, corpus: Corpus, weights: Dict[str, int]) -> Dict[str, Any]:
+    start_at = time.perf_counter() + 0.1
+    warmup_until = start_at + args.warmup
+    stop_at = warmup_until + args.duration
+    all_stats = [WorkerStats({name: Histogram() for name in weights},
+                             {name: Counter() for name in weights}, Counter())
+                 for _ in range(args.concurrency)]
+    threads = [threading.Thread(target=_worker, daemon=True,
+                                args=(i, args, corpus, weights, start_at, warmup_until, stop_at, all_stats[i]))
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    scenarios: Dict[str, Any] = {}
+    overall = Histogram()
+    total_errors = 0
+    for name in weights:
+        histogram = Histogram()
+        statuses: Counter = Counter()
+        errors = 0
+        for stats in all_stats:
+            histogram.merge(stats.histograms[name])
+            statuses.update(stats.statuses[name])
+            errors += stats.errors[name]
+        overall.merge(histogram)
+        total_errors += errors
+        scenarios[name] = {
+            **histogram.summary(),
+            "errors": errors,
+            "statuses": dict(statuses),
+            "throughput_rps": round((histogram.total + errors) / args.duration, 2),
+        }
+    return {
+        "overall": {
+            **overall.summary(),
+            "errors": total_errors,
+            "throughput_rps": round((overall.total + total_errors) / args.duration, 2),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def api_server(meili_url: str, workers: int, timeout: float = 30.0) -> Iterator[str]:
+    """Run the API under uvicorn with the scheduled refresh disabled and yield its URL."""
+    port = _free_port()
+    env = {**os.environ, "MEILISEARCH_URL": meili_url, "REFRESH_BUCKETS": ""}
+    env.setdefault("DATABASE_URL", "postgresql://localhost/artemis3")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+         "--no-access-log"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        client = ApiClient(base_url, 1.0)
+        while True:
+            try:
+                if client.get("/api/health", {})[0] == 200:
+                    break
+            except (OSError, http.client.HTTPException):
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("API server did not start")
+            time.sleep(0.2)
+        client.close()
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"{'scenario':<24}{'count':>8}{'rps':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, summary in [*result["scenarios"].items(), ("overall", result["overall"])]:
+        print(f"{name:<24}{summary['count']:>8}{summary['throughput_rps']:>9}"
+              f"{str(summary['p50_ms']):>10}{str(summary['p90_ms']):>10}{str(summary['p99_ms']):>10}"
+              f"{summary['errors']:>8}")
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> bool:
+    """Print latency and throughput changes; return False if any p99 regressed past the threshold."""
+    print(f"base {base.get('commit')}  head {head.get('commit')}")
+    if base.get("params") != head.get("params"):
+        print("warning: results were produced with different parameters")
+    print(f"{'scenario':<24}{'p50':>10}{'p99':>10}{'rps':>10}")
+    regressed = False
+    names = [*base.get("scenarios", {}), "overall"]
+    for name in names:
+        old = base["overall"] if name == "overall" else base["scenarios"].get(name, {})
+        new = head["overall"] if name == "overall" else head.get("scenarios", {}).get(name)
+        if not new:
+            continue
+        cells = []
+        for field in ("p50_ms", "p99_ms", "throughput_rps"):
+            change = percent_change(old.get(field), new.get(field))
+            cell = "" if change is None else f"{change:+.1f}%"
+            if field == "p99_ms" and change is not None and change > threshold:
+                regressed = True
+                cell += " !"
+            cells.append(cell)
+        print(f"{name:<24}{cells[0]:>10}{cells[1]:>10}{cells[2]:>10}")
+    return not regressed
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search and folder browsing load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="fill a Meilisearch index with synthetic documents")
+    seed_parser.add_argument("--meili-url", default=os.getenv("MEILISEARCH_URL", "http://localhost:7700"))
+    seed_parser.add_argument("--index", default=INDEX)
+    seed_parser.add_argument("--objects", type=int, default=50000)
+    seed_parser.add_argument("--depth", type=int, default=6, help="maximum folder depth of keys")
+    seed_parser.add_argument("--fanout", type=int, default=8, help="folders per level")
+    seed_parser.add_argument("--mix", default="text=40,pdf=10,label=20,binary=30")
+    seed_parser.add_argument("--seed", type=int, default=0)
+    seed_parser.add_argument("--batch-size", type=int, default=5000)
+
+    run_parser = commands.add_parser("run", help="drive the API with the scenario mix")
+    run_parser.add_argument("--base-url", default="http://localhost:8000",
+                            help="running API, ignored with --start-api")
+    run_parser.add_argument("--start-api", action="store_true",
+                            help="start the API under uvicorn for the duration of the run")
+    run_parser.add_argument("--api-workers", type=int, default=1)
+    run_parser.add_argument("--meili-url", default=os.getenv("MEILISEARCH_URL", "http://localhost:7700"),
+                            help="Meilisearch used by the API started with --start-api")
+    run_parser.add_argument("--index", default=INDEX, help="bucket name of the seeded index")
+    run_parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help="scenario weights")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--rate", type=float, help="target total requests/sec, default is closed loop")
+    run_parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--sample", type=int, default=1000, help="keys sampled to build queries")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="results directory or .json file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="p99 increase, in percent, treated as a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return 0 if compare(load_result(args.base), load_result(args.head), args.threshold) else 1
+
+    if args.command == "seed":
+        spec = BucketSpec(objects=args.objects, depth=args.depth, fanout=args.fanout,
+                          mix=parse_mix(args.mix), seed=args.seed)
+        seeded = seed_index(args.meili_url, args.index, spec, args.batch_size)
+        print(f"Indexed {seeded['documents']} documents into {args.index} in {seeded['seconds']}s")
+        return 0
+
+    weights = parse_scenarios(args.scenarios)
+    server = api_server(args.meili_url, args.api_workers) if args.start_api else nullcontext(args.base_url)
+    with server as base_url:
+        args.base_url = base_url
+        sampler = ApiClient(base_url, args.timeout)
+        corpus = sample_corpus(sampler, args.index, args.sample)
+        sampler.close()
+        print(f"Sampled {len(corpus.folders)} folders, running {args.duration}s "
+              f"at concurrency {args.concurrency}")
+        measured = run_load(args, corpus, weights)
+
+    result = {
+        **result_header("load"),
+        "params": {
+            "index": args.index,
+            "scenarios": weights,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "api_workers": args.api_workers if args.start_api else None,
+            "seed": args.seed,
+        },
+        **measured,
+    }
+    print_report(result)
+    print(f"Results written to {write_result(result, 'load', args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
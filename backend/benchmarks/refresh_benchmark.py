@@ -0,0 +1,344 @@
+"""
+Index refresh throughput benchmark.
+
+Seeds a synthetic public bucket in a local S3 stand-in (moto server, or any
+endpoint given with --s3-endpoint), runs `refresh_meili_index` (or
+`rebuild_meili_index`) against it and
+writes objects/sec, peak RSS and per-stage request counts to a JSON file.
+
+    cd backend
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.refresh_benchmark run --objects 2000
+    python -m benchmarks.refresh_benchmark compare benchmarks/results/base.json benchmarks/results/head.json
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Optional
+
+from benchmarks.common import load_result, percent_change, result_header, write_result
+from benchmarks.synthetic import (
+    DEFAULT_MIX,
+    BucketSpec,
+    delete_objects,
+    list_keys,
+    moto_server,
+    parse_mix,
+    seed_bucket,
+    use_endpoint,
+)
+
+
+BUCKET = "artemis3-benchmark"
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark for this process (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _metric_samples() -> Dict[str, Dict[tuple, float]]:
+    """Snapshot the refresh and outbound call metrics as {sample name: {labels: value}}."""
+    from app.metrics.registry import (
+        OUTBOUND_BYTES,
+        OUTBOUND_REQUESTS,
+        REFRESH_OBJECTS,
+        REFRESH_STAGE_BYTES,
+        REFRESH_STAGE_ERRORS,
+        REFRESH_STAGE_SECONDS,
+    )
+
+    samples: Dict[str, Dict[tuple, float]] = {}
+    for metric in (REFRESH_STAGE_SECONDS, REFRESH_STAGE_ERRORS, REFRESH_STAGE_BYTES,
+                   REFRESH_OBJECTS, OUTBOUND_REQUESTS, OUTBOUND_BYTES):
+        for family in metric.collect():
+            for sample in family.samples:
+                if sample.name.endswith(("_bucket", "_created")):
+                    continue
+                labels = tuple(sorted(sample.labels.items()))
+                samples.setdefault(sample.name, {})[labels] = sample.value
+    return samples
+
+
+def _metric_delta(before: Dict[str, Dict[tuple, float]],
+                  after: Dict[str, Dict[tuple, float]]) -> Dict[str, Dict[tuple, float]]:
+    delta: Dict[str, Dict[tuple, float]] = {}
+    for name, values in after.items():
+        for labels, value in values.items():
+            change = value - before.get(name, {}).get(labels, 0.0)
+            if change:
+                delta.setdefault(name, {})[labels] = change
+    return delta
+
+
+def _summarize(delta: Dict[str, Dict[tuple, float]]) -> Dict[str, Any]:
+    stages: Dict[str, Dict[str, float]] = {}
+    for name, field in (("artemis3_refresh_stage_seconds_count", "count"),
+                        ("artemis3_refresh_stage_seconds_sum", "seconds"),
+                        ("artemis3_refresh_stage_errors_total", "errors"),
+                        ("artemis3_refresh_stage_bytes_total", "bytes")):
+        for labels, value in delta.get(name, {}).items():
+            stage = dict(labels)["stage"]
+            entry = stages.setdefault(stage, {"count": 0, "seconds": 0.0, "errors": 0, "bytes": 0})
+            entry[field] = round(value, 4) if field == "seconds" else int(value)
+
+    requests: Dict[str, Dict[str, Dict[str, int]]] = {}
+    for labels, value in delta.get("artemis3_outbound_requests_total", {}).items():
+        labels = dict(labels)
+        operations = requests.setdefault(labels["service"], {})
+        operations.setdefault(labels["operation"], {})[labels["outcome"]] = int(value)
+
+    response_bytes: Dict[str, int] = {}
+    for labels, value in delta.get("artemis3_outbound_response_bytes_total", {}).items():
+        labels = dict(labels)
+        response_bytes[f"{labels['service']}.{labels['operation']}"] = int(value)
+
+    objects = {dict(labels)["result"]: int(value)
+               for labels, value in delta.get("artemis3_refresh_objects_total", {}).items()}
+    return {"stages": stages, "requests": requests, "response_bytes": response_bytes,
+            "objects": objects}
+
+
+def _wait_for_meili(bucket: str, timeout: float = 600.0) -> float:
+    """Block until a real Meilisearch has processed every task for the index."""
+    import meilisearch
+
+    client = meilisearch.Client(os.environ["MEILISEARCH_URL"])
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        pending = client.get_tasks({"indexUids": [bucket], "statuses": ["enqueued", "processing"]})
+        if not pending.results:
+            break
+        time.sleep(0.25)
+    return time.perf_counter() - start
+
+
+def _run_refresh(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run inside a fresh process so peak RSS only covers the refresh."""
+    use_endpoint(options["s3_endpoint"])
+    os.environ.setdefault("DATABASE_URL", options["database_url"] or "postgresql://benchmark")
+    if options["meili_url"]:
+        os.environ["MEILISEARCH_URL"] = options["meili_url"]
+    else:
+        os.environ.setdefault("MEILISEARCH_URL", "http://meilisearch.invalid")
+
+    from benchmarks.fakes import FakeDatabase, FakeMeiliServer, install_fakes
+    from app.s3.index_refresh import REBUILD_INDEX_SUFFIX, rebuild_meili_index, refresh_meili_index
+
+    fake_meili = None if options["meili_url"] else FakeMeiliServer()
+    fake_database = None if options["database_url"] else FakeDatabase()
+    install_fakes(fake_meili, fake_database)
+
+    bucket = options["bucket"]
+    s3_uri = f"s3://{bucket}"
+    if options["meili_url"]:
+        import meilisearch
+        meilisearch.Client(options["meili_url"]).delete_index(bucket)
+        meilisearch.Client(options["meili_url"]).delete_index(bucket + REBUILD_INDEX_SUFFIX)
+        _wait_for_meili(bucket)
+
+    if options["scenario"] in ("incremental", "rebuild"):
+        # index the bucket once, then change part of it so the measured run
+        # exercises the diff, additions and removals, or rebuilds over a live index
+        refresh_meili_index(bucket, s3_uri=s3_uri)
+        if options["meili_url"]:
+            _wait_for_meili(bucket)
+        keys = list_keys(options["s3_endpoint"], bucket)
+        churn = int(len(keys) * options["churn"])
+        delete_objects(options["s3_endpoint"], bucket, keys[:churn])
+        spec = BucketSpec(**{**options["spec"], "objects": churn})
+        seed_bucket(options["s3_endpoint"], bucket, spec, start=options["spec"]["objects"])
+
+    before = _metric_samples()
+    rss_reset = _reset_peak_rss()
+    rss_start = _peak_rss_bytes()
+    start = time.perf_counter()
+    if options["scenario"] == "rebuild":
+        rebuild_meili_index(bucket, s3_uri=s3_uri)
+    else:
+        refresh_meili_index(bucket, s3_uri=s3_uri)
+    refresh_seconds = time.perf_counter() - start
+    peak_rss = _peak_rss_bytes()
+    settle_seconds = _wait_for_meili(bucket) if options["meili_url"] else 0.0
+    summary = _summarize(_metric_delta(before, _metric_samples()))
+
+    from app.s3.refresh_status import get_status
+    status = get_status(s3_uri)
+    processed = status.get("processed", 0)
+    return {
+        "refresh_seconds": round(refresh_seconds, 4),
+        "meili_settle_seconds": round(settle_seconds, 4),
+        "objects_processed": processed,
+        "objects_per_sec": round(processed / refresh_seconds, 2) if refresh_seconds else None,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        "rss_growth_mb": round((peak_rss - rss_start) / 2 ** 20, 1),
+        "peak_rss_reset": rss_reset,
+        "status": status.get("status"),
+        "postgres_statements": fake_database.statements if fake_database else None,
+        **summary,
+    }
+
+
+def _refresh_worker(options: Dict[str, Any], queue) -> None:
+    try:
+        queue.put(("ok", _run_refresh(options)))
+    except BaseException as e:
+        queue.put(("error", repr(e)))
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    spec = BucketSpec(
+        objects=args.objects,
+        depth=args.depth,
+        fanout=args.fanout,
+        mean_size_kb=args.size_kb,
+        pdf_pages=args.pdf_pages,
+        mix=parse_mix(args.mix),
+        seed=args.seed,
+    )
+    server = nullcontext(args.s3_endpoint) if args.s3_endpoint else moto_server()
+    with server as endpoint:
+        print(f"Seeding {spec.objects} objects into {endpoint}/{args.bucket}")
+        seed_start = time.perf_counter()
+        seeded = seed_bucket(endpoint, args.bucket, spec)
+        print(f"Seeded {seeded['objects']} objects ({seeded['bytes']} bytes) "
+              f"in {time.perf_counter() - seed_start:.1f}s")
+
+        options = {
+            "s3_endpoint": endpoint,
+            "meili_url": args.meili_url,
+            "database_url": args.database_url,
+            "bucket": args.bucket,
+            "scenario": args.scenario,
+            "churn": args.churn,
+            "spec": {**spec.__dict__},
+        }
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_refresh_worker, args=(options, queue))
+        process.start()
+        outcome, measured = queue.get()
+        process.join()
+        if outcome != "ok":
+            raise RuntimeError(f"Refresh benchmark failed: {measured}")
+        if args.s3_endpoint:
+            delete_objects(endpoint, args.bucket, list_keys(endpoint, args.bucket))
+
+    return {
+        **result_header("refresh"),
+        "params": {
+            "scenario": args.scenario,
+            "churn": args.churn if args.scenario != "full" else None,
+            "meili": "real" if args.meili_url else "fake",
+            "postgres": "real" if args.database_url else "fake",
+            "s3": "external" if args.s3_endpoint else "moto",
+            **options["spec"],
+        },
+        "seeded": seeded,
+        **measured,
+    }
+
+
+def _request_total(result: Dict[str, Any], service: str) -> int:
+    operations = result.get("requests", {}).get(service, {})
+    return sum(sum(outcomes.values()) for outcomes in operations.values())
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> bool:
+    """Print the change between two results; return False on a throughput regression."""
+    rows = [
+        ("objects/sec", base.get("objects_per_sec"), head.get("objects_per_sec"), True),
+        ("refresh seconds", base.get("refresh_seconds"), head.get("refresh_seconds"), False),
+        ("peak RSS MB", base.get("peak_rss_mb"), head.get("peak_rss_mb"), False),
+    ]
+    for service in ("s3", "meilisearch", "postgres"):
+        rows.append((f"{service} requests", _request_total(base, service),
+                     _request_total(head, service), False))
+    for stage in sorted(set(base.get("stages", {})) | set(head.get("stages", {}))):
+        rows.append((f"{stage} seconds",
+                     base.get("stages", {}).get(stage, {}).get("seconds"),
+                     head.get("stages", {}).get(stage, {}).get("seconds"), False))
+
+    print(f"base {base.get('commit')}  head {head.get('commit')}")
+    if base.get("params") != head.get("params"):
+        print("warning: results were produced with different parameters")
+    print(f"{'metric':<24}{'base':>14}{'head':>14}{'change':>10}")
+    regressed = False
+    for name, old, new, higher_is_better in rows:
+        change = ""
+        percent = percent_change(old, new)
+        if percent is not None:
+            change = f"{percent:+.1f}%"
+            if higher_is_better and percent < -threshold:
+                regressed = True
+                change += " !"
+        print(f"{name:<24}{str(old):>14}{str(new):>14}{change:>10}")
+    return not regressed
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Index refresh throughput benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed a synthetic bucket and time a refresh")
+    run_parser.add_argument("--objects", type=int, default=1000)
+    run_parser.add_argument("--depth", type=int, default=3, help="maximum folder depth of keys")
+    run_parser.add_argument("--fanout", type=int, default=5, help="folders per level")
+    run_parser.add_argument("--size-kb", type=int, default=8, help="mean size of text and binary objects")
+    run_parser.add_argument("--pdf-pages", type=int, default=2)
+    run_parser.add_argument("--mix", default=DEFAULT_MIX,
+                            help="content kind weights, from text, pdf, label and binary")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--scenario", choices=("full", "incremental", "rebuild"), default="full",
+                            help="index a new bucket, or re-index or rebuild one after changing part of it")
+    run_parser.add_argument("--churn", type=float, default=0.1,
+                            help="fraction of objects replaced in the incremental and rebuild scenarios")
+    run_parser.add_argument("--bucket", default=BUCKET)
+    run_parser.add_argument("--s3-endpoint", help="existing S3 compatible endpoint instead of moto")
+    run_parser.add_argument("--meili-url", help="real Meilisearch instead of the in-memory fake")
+    run_parser.add_argument("--database-url", help="real Postgres instead of the in-memory fake")
+    run_parser.add_argument("--output", help="results directory or .json file")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--threshold", type=float, default=10.0,
+                                help="objects/sec drop, in percent, treated as a regression")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        ok = compare(load_result(args.base), load_result(args.head), args.threshold)
+        return 0 if ok else 1
+
+    result = run(args)
+    path = write_result(result, f"refresh-{args.scenario}", args.output)
+    print(f"{result['objects_processed']} objects in {result['refresh_seconds']}s "
+          f"({result['objects_per_sec']} objects/sec), peak RSS {result['peak_rss_mb']} MB")
+    print(f"Results written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+import boto3
+import fitz
+
+
+# Content types a generated object can have, keyed by the name used in `--mix`
+#   label objects are served as binary/octet-stream like most PDS buckets, so
+#   the refresh has to resolve their type through custom_mime_types
+CONTENT_KINDS = {
+    "text": ("txt", "text/plain"),
+    "pdf": ("pdf", "application/pdf"),
+    "label": ("lbl", "binary/octet-stream"),
+    "binary": ("img", "application/octet-stream"),
+}
+DEFAULT_MIX = "text=40,pdf=10,label=20,binary=30"
+
+WORDS = (
+    "mars rover orbiter lander crater regolith spectrometer camera mastcam navcam "
+    "hazcam chemcam apxs sol target instrument calibration radiometric thermal "
+    "infrared ultraviolet image product label volume mission phase cruise approach "
+    "landing surface operations telemetry downlink uplink sequence observation "
+    "latitude longitude elevation azimuth filter exposure compression dataset "
+    "archive release version processing level raw calibrated derived reduced"
+).split()
+
+MOTO_ACCESS_KEY = "benchmark"
+MOTO_SECRET_KEY = "benchmark"
+MOTO_REGION = "us-east-1"
+
+
+@dataclass
+class BucketSpec:
+    """Shape of a synthetic bucket."""
+    objects: int = 1000
+    depth: int = 3
+    fanout: int = 5
+    mean_size_kb: int = 8
+    pdf_pages: int = 2
+    mix: Dict[str, int] = field(default_factory=lambda: parse_mix(DEFAULT_MIX))
+    seed: int = 0
+
+
+@dataclass
+class SyntheticObject:
+    key: str
+    kind: str
+    content_type: str
+    body: bytes
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Parse a `kind=weight,...` content type mix."""
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in CONTENT_KINDS:
+            raise ValueError(f"Unknown content kind '{kind}', expected one of {sorted(CONTENT_KINDS)}")
+        mix[kind] = int(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Content mix must have at least one positive weight")
+    return mix
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _text_body(rng: random.Random, size: int) -> bytes:
+    lines = []
+    written = 0
+    while written < size:
+        line = _sentence(rng, rng.randint(6, 14))
+        lines.append(line)
+        written += len(line) + 1
+    return "\n".join(lines).encode()[:size]
+
+
+def _label_body(rng: random.Random, key: str) -> bytes:
+    lines = [
+        "PDS_VERSION_ID = PDS3",
+        f"PRODUCT_ID = \"{os.path.basename(key).upper()}\"",
+        f"TARGET_NAME = {rng.choice(['MARS', 'PHOBOS', 'DEIMOS', 'CALIBRATION'])}",
+        f"INSTRUMENT_ID = {rng.choice(['MASTCAM', 'NAVCAM', 'CHEMCAM', 'APXS'])}",
+        f"PRODUCT_TYPE = {rng.choice(['RDR', 'EDR'])}",
+        f"DESCRIPTION = \"{_sentence(rng, 20)}\"",
+        "END",
+    ]
+    return "\r\n".join(lines).encode()
+
+
+def _pdf_body(rng: random.Random, pages: int) -> bytes:
+    document = fitz.open()
+    for _ in range(max(1, pages)):
+        page = document.new_page(width=612, height=792)
+        page.insert_textbox(fitz.Rect(36, 36, 576, 756), _sentence(rng, 300), fontsize=9)
+    data = document.tobytes(deflate=True)
+    document.close()
+    return data
+
+
+def _key_for(rng: random.Random, spec: BucketSpec, index: int, extension: str) -> str:
+    levels = rng.randint(0, spec.depth)
+    parts = [f"level{level}-{rng.randrange(spec.fanout)}" for level in range(levels)]
+    parts.append(f"object-{index:07d}.{extension}")
+    return "/".join(parts)
+
+
+def generate_objects(spec: BucketSpec, start: int = 0) -> Iterator[SyntheticObject]:
+    """Yield the objects of a synthetic bucket, deterministic for a given seed."""
+    rng = random.Random(spec.seed + start)
+    kinds = list(spec.mix)
+    weights = [spec.mix[kind] for kind in kinds]
+    mean_size = spec.mean_size_kb * 1024
+    for index in range(start, start + spec.objects):
+        kind = rng.choices(kinds, weights)[0]
+        extension, content_type = CONTENT_KINDS[kind]
+        key = _key_for(rng, spec, index, extension)
+        size = max(64, int(rng.expovariate(1 / mean_size))) if mean_size else 64
+        if kind == "text":
+            body = _text_body(rng, size)
+        elif kind == "pdf":
+            body = _pdf_body(rng, spec.pdf_pages)
+        elif kind == "label":
+            body = _label_body(rng, key)
+        else:
+            body = rng.randbytes(size)
+        yield SyntheticObject(key, kind, content_type, body)
+
+
+def get_seed_client(endpoint_url: str):
+    """Return a signed client for writing to the local S3 stand-in."""
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name=MOTO_REGION,
+        aws_access_key_id=MOTO_ACCESS_KEY,
+        aws_secret_access_key=MOTO_SECRET_KEY,
+    )
+
+
+def seed_bucket(endpoint_url: str,
+                bucket: str,
+                spec: BucketSpec,
+                start: int = 0,
+                workers: int = 16) -> Dict[str, int]:
+    """
+    Create a public bucket in the S3 stand-in and upload a synthetic object set.
+
+    Objects are public-read so the unsigned client used by the app can read them.
+    Returns the number of objects and bytes uploaded per content kind.
+    """
+    s3 = get_seed_client(endpoint_url)
+    try:
+        s3.create_bucket(Bucket=bucket, ACL="public-read")
+    except s3.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    totals: Dict[str, int] = {"objects": 0, "bytes": 0}
+
+    def upload(obj: SyntheticObject) -> SyntheticObject:
+        s3.put_object(Bucket=bucket, Key=obj.key, Body=obj.body,
+                      ContentType=obj.content_type, ACL="public-read")
+        return obj
+
+    objects = generate_objects(spec, start)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # upload in bounded batches so large buckets are never held in memory at once
+            batch = list(islice(objects, workers * 16))
+            if not batch:
+                break
+            for obj in executor.map(upload, batch):
+                totals["objects"] += 1
+                totals["bytes"] += len(obj.body)
+                totals[obj.kind] = totals.get(obj.kind, 0) + 1
+    return totals
+
+
+def delete_objects(endpoint_url: str, bucket: str, keys: List[str]) -> None:
+    s3 = get_seed_client(endpoint_url)
+    for start in range(0, len(keys), 1000):
+        chunk = keys[start:start + 1000]
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in chunk]})
+
+
+def list_keys(endpoint_url: str, bucket: str) -> List[str]:
+    s3 = get_seed_client(endpoint_url)
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return keys
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def moto_server(port: Optional[int] = None, timeout: float = 30.0) -> Iterator[str]:
+    """
+    Run a moto S3 server in a child process and yield its endpoint URL.
+
+    The server runs out of process so its object storage does not count
+    towards the memory measured by the benchmark.
+    """
+    port = port or _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-H", "127.0.0.1", "-p", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(
+                        "moto server did not start, install benchmarks/requirements.txt")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def use_endpoint(endpoint_url: str) -> None:
+    """Point every boto3 S3 client created by the app at the given endpoint."""
+    os.environ["AWS_ENDPOINT_URL_S3"] = endpoint_url
+    os.environ.setdefault("AWS_DEFAULT_REGION", MOTO_REGION)
@@ -70,6 +70,8 @@ def mock_meili_client():
     idx = MagicMock()
     client.index.return_value = idx
     client.create_index.return_value = {}
+    # empty Meilisearch task queue
+    client.get_tasks.return_value.total = 0
     return client
 
 
@@ -112,5 +114,9 @@ def meili_helpers(monkeypatch):
 def clear_state():
     # reset internal state before each test
     refresh_module._status_by_uri.clear()
+    refresh_module._last_flush.clear()
+    refresh_module._flush_seq.clear()
+    refresh_module._saved_seq.clear()
     yield
-    refresh_module._status_by_uri.clear()
\ No newline at end of file
+    refresh_module._status_by_uri.clear()
+    refresh_module._last_flush.clear()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import io
+import zipfile
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.s3.archive as archive
+
+
+def _mock_s3(objects):
+    s3 = MagicMock()
+
+    def get_object(Bucket, Key):
+        if Key not in objects:
+            raise Exception("NoSuchKey")
+        data = objects[Key]
+        return {
+            "Body": io.BytesIO(data),
+            "ContentLength": len(data),
+            "LastModified": datetime(2024, 5, 1, 12, 0, 0)
+        }
+    s3.get_object.side_effect = get_object
+    return s3
+
+
+def _read_archive(chunks):
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+def test_archive_entry_name_strips_root_and_unsafe_parts():
+    assert archive.archive_entry_name("a/b/c.txt", "a") == "b/c.txt"
+    assert archive.archive_entry_name("a/b/c.txt") == "a/b/c.txt"
+    assert archive.archive_entry_name("x/../../etc/passwd", "") == "x/etc/passwd"
+    assert archive.archive_entry_name("ab/c.txt", "a") == "ab/c.txt"
+
+
+def test_stream_zip_archive_contains_all_objects_in_order():
+    objects = {
+        "root/a.txt": b"alpha" * 100,
+        "root/sub/b.bin": bytes(range(256)) * 50,
+        "root/c.txt": b""
+    }
+    s3 = _mock_s3(objects)
+    chunks = list(archive.stream_zip_archive(
+        "bucket", list(objects), root="root", s3=s3,
+        prefetch=2, read_ahead_chunks=1, chunk_size=64))
+
+    # archive is emitted incrementally rather than as one buffer
+    assert len(chunks) > 3
+    with _read_archive(chunks) as zf:
+        assert zf.namelist() == ["a.txt", "sub/b.bin", "c.txt"]
+        assert zf.read("sub/b.bin") == objects["root/sub/b.bin"]
+        assert zf.read("c.txt") == b""
+        assert zf.getinfo("a.txt").date_time == (2024, 5, 1, 12, 0, 0)
+
+
+def test_stream_zip_archive_records_failed_objects():
+    s3 = _mock_s3({"a.txt": b"data"})
+    chunks = list(archive.stream_zip_archive(
+        "bucket", ["a.txt", "missing.txt", "folder/"], s3=s3))
+
+    with _read_archive(chunks) as zf:
+        assert zf.namelist() == ["a.txt", archive.ERRORS_ENTRY_NAME]
+        assert b"missing.txt" in zf.read(archive.ERRORS_ENTRY_NAME)
+
+
+@pytest.mark.parametrize("keys", [["a//b", "a/b", "a/b.1"], ["a/b", "a/b.2", "a//b"]])
+def test_stream_zip_archive_renames_duplicate_entries_uniquely(keys):
+    objects = {key: str(i).encode() for i, key in enumerate(keys, 1)}
+    chunks = list(archive.stream_zip_archive("bucket", list(objects), s3=_mock_s3(objects)))
+
+    with _read_archive(chunks) as zf:
+        names = zf.namelist()
+        assert len(set(names)) == 3
+        assert sorted(zf.read(name) for name in names) == [b"1", b"2", b"3"]
+
+def test_stream_zip_archive_stops_readers_when_closed():
+    objects = {f"k{i}": b"x" * 1024 for i in range(10)}
+    s3 = _mock_s3(objects)
+    stream = archive.stream_zip_archive(
+        "bucket", list(objects), s3=s3, prefetch=3, read_ahead_chunks=1, chunk_size=16)
+    next(stream)
+    stream.close()
+    # only the prefetch window was ever requested from S3
+    assert s3.get_object.call_count <= 4
@@ -0,0 +1,71 @@
+import bz2
+import gzip
+import io
+import zipfile
+
+import pytest
+
+import app.s3.compressed as compressed
+from app.s3.imagery import BytesReader, RangeReader
+
+
+TEXT = b"".join(b"observation %d of MARS\n" % i for i in range(20000))
+
+
+def _chunks(data: bytes, size: int = 1000):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def test_compression_codec_and_uncompressed_key():
+    assert compressed.compression_codec("a/b.CSV.GZ") == "gzip"
+    assert compressed.compression_codec("a/b.lbl.bz2") == "bz2"
+    assert compressed.compression_codec("a/b.zip") == "zip"
+    assert compressed.compression_codec("a/b.csv") is None
+    assert compressed.uncompressed_key("a/b.CSV.GZ") == "a/b.CSV"
+
+
+@pytest.mark.parametrize("compress, codec", [(gzip.compress, "gzip"), (bz2.compress, "bz2")])
+def test_iter_decompressed_reads_concatenated_streams(compress, codec):
+    data = compress(TEXT[:100000]) + compress(TEXT[100000:]) + b"\0" * 16
+
+    assert b"".join(compressed.iter_decompressed(_chunks(data), codec)) == TEXT
+
+
+def test_iter_decompressed_stops_pulling_input_at_cap():
+    chunks = _chunks(gzip.compress(TEXT))
+    pulled = []
+
+    def source():
+        for chunk in chunks:
+            pulled.append(chunk)
+            yield chunk
+
+    output = b"".join(compressed.iter_decompressed(source(), "gzip", 5000))
+
+    assert output == TEXT[:5000]
+    assert len(pulled) < len(chunks)
+
+
+def test_zip_entry_names_reads_only_the_central_directory():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("data/PSP_001.IMG", b"\0" * 200000)
+        zf.writestr("data/PSP_001.LBL", b"label")
+        zf.writestr("données/notes.txt", b"x")
+        zf.comment = b"archive comment"
+    data = archive.getvalue()
+    fetched = []
+
+    def fetch(offset, length):
+        fetched.append((offset, length))
+        return data[offset:offset + length]
+
+    names = compressed.zip_entry_names(RangeReader(fetch, len(data), 0, 4, 1024 * 1024))
+
+    assert names == ["data/PSP_001.IMG", "data/PSP_001.LBL", "données/notes.txt"]
+    assert sum(length for _, length in fetched) < 2000
+
+
+def test_zip_entry_names_rejects_other_content():
+    with pytest.raises(ValueError):
+        compressed.zip_entry_names(BytesReader(b"not a zip" * 100))
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+
+import app.s3.concurrency as concurrency
+from app.metrics import registry
+
+
+def _feed(limiter, latency, count, throttled=False):
+    for _ in range(count):
+        limiter._record(latency, throttled)
+
+
+def test_limit_grows_additively_while_latency_holds():
+    limiter = concurrency.AdaptiveLimiter("test", initial=4, minimum=2, maximum=6)
+    _feed(limiter, 0.1, concurrency.CONCURRENCY_MIN_SAMPLES * 5)
+    assert limiter.limit == 6
+
+
+def test_limit_backs_off_on_throttling_latency_and_backpressure(monkeypatch):
+    monkeypatch.setattr(concurrency, "CONCURRENCY_BACKOFF", 0.5)
+    limiter = concurrency.AdaptiveLimiter("test", initial=16, minimum=2, maximum=64)
+    window = concurrency.CONCURRENCY_MIN_SAMPLES
+
+    _feed(limiter, 0.1, 16)
+    assert limiter.limit == 17
+
+    _feed(limiter, 0.1, 17, throttled=True)
+    assert limiter.limit == 8
+
+    _feed(limiter, 1.0, window)
+    assert limiter.limit == 4
+
+    limiter.congested()
+    _feed(limiter, 0.1, window)
+    assert limiter.limit == 2
+    _feed(limiter, 0.1, window, throttled=True)
+    assert limiter.limit == 2
+
+
+def test_throttled_s3_responses_count_as_throttling():
+    limiter = concurrency.AdaptiveLimiter("test", initial=8)
+    registry._note_s3_throttle()
+    _feed(limiter, 0.1, concurrency.CONCURRENCY_MIN_SAMPLES)
+    assert limiter.limit < 8
+
+
+def test_is_throttle_error():
+    slow_down = ClientError({"Error": {"Code": "SlowDown"}, "ResponseMetadata": {"HTTPStatusCode": 503}},
+                            "GetObject")
+    missing = ClientError({"Error": {"Code": "NoSuchKey"}, "ResponseMetadata": {"HTTPStatusCode": 404}},
+                          "GetObject")
+    assert concurrency.is_throttle_error(slow_down)
+    assert not concurrency.is_throttle_error(missing)
+    assert not concurrency.is_throttle_error(ValueError("SlowDown"))
+
+
+def test_slot_never_exceeds_limit_and_learns_from_errors():
+    limiter = concurrency.AdaptiveLimiter("test", initial=3, minimum=3, maximum=3)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def task():
+        with limiter.slot():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(lambda _: task(), range(30)))
+    assert max(peak) == 3
+
+    with pytest.raises(ClientError):
+        with limiter.slot():
+            raise ClientError({"Error": {"Code": "SlowDown"}}, "HeadObject")
+    assert limiter._throttled
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import app.s3.extraction_cache as cache_module
+
+
+def _conn(rows=None):
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchall.return_value = rows or []
+    conn.cursor.return_value.__enter__.return_value = cur
+    return conn, cur
+
+
+def test_extraction_cache_key_normalizes_etags():
+    assert cache_module.extraction_cache_key('"abc"', "text") == ("abc", cache_module.EXTRACTOR_VERSIONS["text"])
+    assert cache_module.extraction_cache_key(None, "pdf") is None
+    assert cache_module.extraction_cache_key('""', "pdf") is None
+    assert cache_module.extraction_cache_key("abc", "gzip:csv") == ("abc", "gzip:1+csv:1")
+
+
+def test_lookup_extractions_queries_batch_once():
+    conn, cur = _conn([("abc", "text:1", ["a", "b"], {}), ("abc", "pds_label:1", ["MARS"], '{"TargetName": "MARS"}')])
+    cached = cache_module.lookup_extractions(conn, ['"abc"', '"def"', '"abc"', None])
+
+    cur.execute.assert_called_once()
+    assert cur.execute.call_args.args[1] == (["abc", "def"],)
+    assert cached == {("abc", "text:1"): cache_module.Extraction(["a", "b"]),
+                      ("abc", "pds_label:1"): cache_module.Extraction(["MARS"], {"TargetName": "MARS"})}
+
+    conn, cur = _conn()
+    assert cache_module.lookup_extractions(conn, [None]) == {}
+    cur.execute.assert_not_called()
+
+
+def test_lookup_extractions_treats_errors_as_empty():
+    conn, cur = _conn()
+    cur.execute.side_effect = Exception("relation \"extraction_cache\" does not exist")
+    assert cache_module.lookup_extractions(conn, ["abc"]) == {}
+    conn.rollback.assert_called_once()
+
+
+def test_store_extractions_only_inserts_new_entries():
+    conn, cur = _conn()
+    cached = {("abc", "text:1"): cache_module.Extraction(["a"])}
+    extracted = {**cached, ("def", "pds_label:1"): cache_module.Extraction(["d"], {"ProductType": "EDR"})}
+    cache_module.store_extractions(conn, extracted, cached)
+    cur.executemany.assert_called_once()
+    assert cur.executemany.call_args.args[1] == [("def", "pds_label:1", ["d"], '{"ProductType": "EDR"}')]
+    conn.commit.assert_called_once()
+
+    conn, cur = _conn()
+    cache_module.store_extractions(conn, cached, cached)
+    cur.executemany.assert_not_called()
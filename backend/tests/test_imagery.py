@@ -0,0 +1,89 @@
+import struct
+
+import pytest
+
+import app.s3.imagery as imagery
+
+
+def _reader(data: bytes, head_bytes: int = 64, max_reads: int = 8):
+    fetched = []
+
+    def fetch(offset, length):
+        fetched.append((offset, length))
+        return data[offset:offset + length]
+
+    reader = imagery.RangeReader(fetch, len(data), head_bytes, max_reads, 1024)
+    return reader, fetched
+
+
+def _box(box_type: bytes, content: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(content), box_type) + content
+
+
+def _tiff(width, height, epsg, padding=0):
+    # little-endian classic TIFF: width, height, samples and a GeoKeyDirectory stored past the IFD
+    geo_keys = struct.pack("<8H", 1, 1, 0, 1, imagery.PROJECTED_CRS_KEY, 0, 1, epsg)
+    ifd_offset = 8 + padding
+    values_offset = ifd_offset + 2 + 4 * 12 + 4
+    entries = [
+        struct.pack("<HHII", imagery.TIFF_WIDTH, 4, 1, width),
+        struct.pack("<HHII", imagery.TIFF_HEIGHT, 4, 1, height),
+        struct.pack("<HHIHH", imagery.TIFF_SAMPLES, 3, 1, 3, 0),
+        struct.pack("<HHII", imagery.TIFF_GEO_KEYS, 3, 8, values_offset),
+    ]
+    return (b"II*\0" + struct.pack("<I", ifd_offset) + b"\0" * padding
+            + struct.pack("<H", 4) + b"".join(entries) + b"\0\0\0\0" + geo_keys)
+
+
+def test_geotiff_reads_ifd_past_the_head():
+    data = _tiff(8000, 6000, 32611, padding=200) + b"\0" * 10000
+    reader, fetched = _reader(data)
+
+    extraction = imagery.read_image_metadata(reader)
+
+    assert extraction.fields == {"Width": 8000, "Height": 6000, "Bands": 3, "Crs": "EPSG:32611"}
+    assert {"TIFF", "GeoTIFF", "EPSG:32611", "8000x6000"} <= set(extraction.keywords)
+    # header, IFD and GeoKey values, never the pixels
+    assert sum(length for _, length in fetched) < 400
+
+
+def test_jp2_header_boxes_and_gml():
+    ihdr = _box(b"ihdr", struct.pack(">IIHBBBB", 4096, 2048, 1, 7, 7, 0, 0))
+    gml = _box(b"xml ", b'<gml:FeatureCollection xmlns:gml="http://www.opengis.net/gml">'
+                        b'<gml:RectifiedGrid srsName="urn:ogc:def:crs:EPSG::4326"/></gml:FeatureCollection>')
+    data = (imagery.JP2_SIGNATURE + _box(b"ftyp", b"jp2 \0\0\0\0jp2 ") + _box(b"jp2h", ihdr)
+            + _box(b"asoc", _box(b"lbl ", b"gml.data") + gml) + _box(b"jp2c", b"\xff" * 100000))
+    reader, fetched = _reader(data)
+
+    extraction = imagery.read_image_metadata(reader)
+
+    assert extraction.fields == {"Width": 2048, "Height": 4096, "Bands": 1, "Crs": "EPSG:4326"}
+    assert {"JPEG2000", "8bit", "gml.data", "FeatureCollection", "RectifiedGrid"} <= set(extraction.keywords)
+    assert all(offset < len(data) - 100000 for offset, _ in fetched)
+
+
+def test_png_jpeg_and_pds_headers():
+    png = imagery.PNG_SIGNATURE + struct.pack(">I4sIIBB", 13, b"IHDR", 640, 480, 8, 6) + b"\0" * 100
+    assert imagery.read_image_metadata(_reader(png)[0]).fields == {"Width": 640, "Height": 480, "Bands": 4}
+
+    jpeg = (b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"\0" * 14
+            + b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, 300, 400, 3) + b"\0" * 100)
+    assert imagery.read_image_metadata(_reader(jpeg)[0]).fields == {"Width": 400, "Height": 300, "Bands": 3}
+
+    pds = (b"PDS_VERSION_ID = PDS3\r\nTARGET_NAME = MARS\r\nOBJECT = IMAGE\r\nLINES = 1024\r\n"
+           b"LINE_SAMPLES = 512\r\nEND_OBJECT = IMAGE\r\nEND\r\n" + b"\x07" * 1000)
+    extraction = imagery.read_image_metadata(_reader(pds, head_bytes=512)[0])
+    assert extraction.fields == {"Width": 512, "Height": 1024, "TargetName": "MARS"}
+    assert "PDS3" in extraction.keywords
+
+
+def test_unrecognized_header_and_read_budget():
+    with pytest.raises(ValueError):
+        imagery.read_image_metadata(_reader(b"GIF89a" + b"\0" * 100)[0])
+
+    reader, _ = _reader(b"\0" * 5000, head_bytes=10, max_reads=2)
+    reader.read(100, 10)
+    with pytest.raises(ValueError):
+        reader.read(200, 10)
+    with pytest.raises(ValueError):
+        reader.read(4995, 10)
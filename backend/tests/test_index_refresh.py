@@ -1,5 +1,8 @@
+import gzip
+import struct
 import types
 import app.s3.index_refresh as module
+from app.s3.extraction_cache import EXTRACTOR_VERSIONS, Extraction
 from tests.fixtures import *
 
 def test_config_index_settings_calls_update(monkeypatch, mock_meili_client):
@@ -8,6 +11,30 @@ def test_config_index_settings_calls_update(monkeypatch, mock_meili_client):
     idx.update_settings.assert_called_once_with(module.INDEX_SETTINGS)
 
 
+def test_config_index_settings_skips_unchanged_settings():
+    idx = MagicMock(uid="bucket")
+    idx.get_settings.return_value = {
+        **module.INDEX_SETTINGS,
+        # returned in another order, still the same set
+        "filterableAttributes": list(reversed(module.INDEX_SETTINGS["filterableAttributes"])),
+        "displayedAttributes": ["*"],
+    }
+    assert module.config_index_settings(idx) is None
+    idx.update_settings.assert_not_called()
+
+
+def test_config_index_settings_sends_only_changed_keys(capsys):
+    idx = MagicMock(uid="bucket")
+    idx.get_settings.return_value = {**module.INDEX_SETTINGS, "sortableAttributes": ["Key"],
+                                     "rankingRules": ["words", "sort"]}
+    module.config_index_settings(idx)
+    idx.update_settings.assert_called_once_with({
+        "rankingRules": module.INDEX_SETTINGS["rankingRules"],
+        "sortableAttributes": module.INDEX_SETTINGS["sortableAttributes"],
+    })
+    assert "sortableAttributes of index bucket" in capsys.readouterr().out
+
+
 def test_get_current_s3_objects_success(monkeypatch, mock_s3_client, status_mocks):
     monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
     objs = module.get_current_s3_objects("bucket", prefix="pfx", s3_uri="s3://u")
@@ -54,13 +81,101 @@ def test_refresh_meili_index_existing_index(monkeypatch, mock_s3_client, mock_me
     monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
     # patch add/remove
     called = {}
-    monkeypatch.setattr(module, "add_files_to_index", lambda index, files, s3_uri=None: called.setdefault("add", files))
-    monkeypatch.setattr(module, "remove_files_from_index", lambda index, files, s3_uri=None: called.setdefault("remove", files))
+    def mock_add(index, files, s3_uri=None):
+        called.setdefault("add", files)
+        return []
+    def mock_remove(index, files, s3_uri=None):
+        called.setdefault("remove", files)
+        return []
+    monkeypatch.setattr(module, "add_files_to_index", mock_add)
+    monkeypatch.setattr(module, "remove_files_from_index", mock_remove)
     module.refresh_meili_index("bucket", prefix="pfx", s3_uri="s3://u")
     # since paginate returned a.txt and dir/ and prev had a.txt, new_files should be dir/ (folder) and removed none
     assert "add" in called
 
 
+def test_refresh_meili_index_waits_for_tasks_before_done(monkeypatch, mock_s3_client, mock_meili_client, meili_helpers, status_mocks, mock_psycopg):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    mock_meili_client.create_index.return_value = MagicMock(task_uid=1)
+    mock_meili_client.index.return_value.update_settings.return_value = MagicMock(task_uid=2)
+    monkeypatch.setattr(module, "add_files_to_index", lambda index, files, s3_uri=None: [3, 4])
+    wait = MagicMock(return_value={"tasks": 4, "failed": 1, "errors": ["task 4 (documentAdditionOrUpdate): bad"],
+                                   "indexing_seconds": 2.5})
+    monkeypatch.setattr(module, "wait_for_tasks", wait)
+
+    module.refresh_meili_index("bucket", s3_uri="s3://u")
+
+    assert wait.call_args.args[1] == [1, 2, 3, 4]
+    assert module.set_status.call_args.kwargs["status"] == "indexing"
+    kwargs = module.finish_refresh.call_args.kwargs
+    assert (kwargs["failed_tasks"], kwargs["indexing_seconds"]) == (1, 2.5)
+    assert "1 of 4 Meilisearch tasks failed" in kwargs["message"]
+
+
+def test_refresh_meili_index_fails_when_tasks_time_out(monkeypatch, mock_s3_client, mock_meili_client, meili_helpers, status_mocks, mock_psycopg):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "add_files_to_index", lambda index, files, s3_uri=None: [3])
+    monkeypatch.setattr(module, "wait_for_tasks", MagicMock(side_effect=TimeoutError("still processing")))
+
+    with pytest.raises(TimeoutError):
+        module.refresh_meili_index("bucket", s3_uri="s3://u")
+    module.finish_refresh.assert_not_called()
+    module.fail_refresh.assert_called_once_with("s3://u", "still processing")
+
+
+def test_rebuild_meili_index_swaps_shadow_index(monkeypatch, mock_meili_client, status_mocks, mock_psycopg):
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "get_current_s3_objects", lambda bucket, prefix, s3_uri=None: [{"Key": "a"}, {"Key": "dir/"}, {"Key": "b"}])
+    monkeypatch.setattr(module, "get_all_indexes", lambda: [{"uid": "bucket"}, {"uid": "bucket__rebuild"}])
+    monkeypatch.setattr(module, "get_doc_id", lambda k: "h-" + k)
+    monkeypatch.setattr(module, "build_document",
+                        lambda index, file, dbTags, extracted=None: None if file["Key"].endswith("/") else {"ID": "h-" + file["Key"]})
+    monkeypatch.setattr(module, "REBUILD_BATCH_SIZE", 2)
+    conn, _ = mock_psycopg
+    conn.__enter__.return_value = conn
+    live, shadow = MagicMock(), MagicMock()
+    mock_meili_client.index.side_effect = lambda uid: shadow if uid == "bucket__rebuild" else live
+    shadow.add_documents.side_effect = [MagicMock(task_uid=3), MagicMock(task_uid=4), MagicMock(task_uid=5)]
+    live.get_documents.side_effect = [types.SimpleNamespace(results=[types.SimpleNamespace(ID="h-other")]),
+                                      types.SimpleNamespace(results=[])]
+    wait = MagicMock(return_value={"tasks": 1, "failed": 0, "errors": [], "indexing_seconds": 1.5})
+    monkeypatch.setattr(module, "wait_for_tasks", wait)
+
+    module.rebuild_meili_index("bucket", prefix="pfx", s3_uri="s3://u")
+
+    # the stale shadow index is dropped, then recreated with settings before any document
+    mock_meili_client.delete_index.assert_any_call("bucket__rebuild")
+    mock_meili_client.create_index.assert_called_once_with("bucket__rebuild", {"primaryKey": "ID"})
+    shadow.update_settings.assert_called_once_with(module.INDEX_SETTINGS)
+    assert [c.args[0] for c in shadow.add_documents.call_args_list] == [[{"ID": "h-a"}], [{"ID": "h-b"}], [{"ID": "h-other"}]]
+    # files outside the rebuilt prefix are carried over from the live index
+    assert live.get_documents.call_args_list[0].args[0]["filter"].startswith("NOT (")
+    mock_meili_client.swap_indexes.assert_called_once_with([{"indexes": ["bucket", "bucket__rebuild"]}])
+    assert mock_meili_client.delete_index.call_args.args == ("bucket__rebuild",)
+    module.finish_refresh.assert_called_once_with("s3://u", indexing_seconds=1.5)
+    assert [c.args for c in module.increment_processed.call_args_list] == [("s3://u", 2), ("s3://u", 1)]
+
+
+def test_rebuild_meili_index_keeps_live_index_when_tasks_fail(monkeypatch, mock_meili_client, status_mocks, mock_psycopg):
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "get_current_s3_objects", lambda bucket, prefix, s3_uri=None: [{"Key": "a"}])
+    monkeypatch.setattr(module, "get_all_indexes", lambda: [])
+    monkeypatch.setattr(module, "build_document", lambda index, file, dbTags, extracted=None: {"ID": file["Key"]})
+    monkeypatch.setattr(module, "wait_for_tasks", MagicMock(return_value={
+        "tasks": 4, "failed": 1, "errors": ["task 3 (documentAdditionOrUpdate): bad"], "indexing_seconds": 1.0}))
+
+    with pytest.raises(RuntimeError):
+        module.rebuild_meili_index("bucket", s3_uri="s3://u")
+
+    # a missing live index is created so it can be swapped
+    mock_meili_client.create_index.assert_any_call("bucket", {"primaryKey": "ID"})
+    mock_meili_client.swap_indexes.assert_not_called()
+    module.finish_refresh.assert_not_called()
+    assert "1 of 4 Meilisearch tasks failed" in module.fail_refresh.call_args.args[1]
+
+
 def test_create_document_text_and_folder(monkeypatch, mock_s3_client, mock_meili_client, meili_helpers, mock_psycopg, status_mocks):
     monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
     # ensure DB tags empty
@@ -86,21 +201,188 @@ def test_add_files_to_index_executes_create(monkeypatch, mock_s3_client, mock_me
     files = [{"Key": "f1.txt", "Size": 1, "LastModified": __import__("datetime").datetime(2021,1,1)}]
     # patch create_document to record calls
     called = []
-    monkeypatch.setattr(module, "create_document", lambda index, file, meili_client, dbTags, s3_uri=None: called.append((index, file)))
+    monkeypatch.setattr(module, "create_document", lambda index, file, meili_client, dbTags, s3_uri=None, extracted=None: called.append((index, file)))
     module.add_files_to_index("bucket", files, s3_uri=None)
     assert called and called[0][0] == "bucket"
 
 
+def test_add_files_to_index_applies_backpressure_and_returns_task_uids(monkeypatch, mock_meili_client, mock_psycopg):
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "get_doc_id", lambda k: "h-" + k)
+    monkeypatch.setattr(module, "REFRESH_INDEX_BATCH_SIZE", 2)
+    wait = MagicMock(return_value=0.0)
+    monkeypatch.setattr(module, "wait_for_queue_capacity", wait)
+
+    def create(index, file, meili_client, dbTags, s3_uri=None, extracted=None):
+        if file["Key"] == "bad":
+            raise Exception("head failed")
+        if file["Key"].endswith("/"):
+            return None
+        return MagicMock(task_uid=ord(file["Key"]))
+    monkeypatch.setattr(module, "create_document", create)
+
+    files = [{"Key": key} for key in ("a", "bad", "dir/", "b")]
+    assert module.add_files_to_index("bucket", files) == [ord("a"), ord("b")]
+    # the queue is checked before each batch is enqueued
+    assert wait.call_count == 2
+
+
+def test_add_files_to_index_looks_up_tags_per_batch(monkeypatch, mock_meili_client, mock_psycopg):
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "get_doc_id", lambda k: "h-" + k)
+    monkeypatch.setattr(module, "REFRESH_INDEX_BATCH_SIZE", 2)
+    conn, cur = mock_psycopg
+    conn.__enter__.return_value = conn
+    cur.fetchall.side_effect = [[("h-a", "bucket", ["x"])], []]
+    seen = []
+    monkeypatch.setattr(module, "create_document",
+                        lambda index, file, meili_client, dbTags, s3_uri=None, extracted=None: seen.append((file["Key"], dbTags)))
+
+    files = [{"Key": key} for key in ("a", "b", "c")]
+    module.add_files_to_index("bucket", files)
+
+    # one lookup per batch, scoped to the batch's keys
+    assert [c.args[1] for c in cur.execute.call_args_list] == [(["h-a", "h-b"],), (["h-c"],)]
+    assert "ANY(%s)" in cur.execute.call_args.args[0]
+    assert dict(seen)["a"] == {"h-a": ("h-a", "bucket", ["x"])}
+    assert dict(seen)["c"] == {}
+    conn.cursor.assert_called_with()
+
+
+def test_add_files_to_index_scans_bucket_tags_for_large_sets(monkeypatch, mock_meili_client, mock_psycopg):
+    monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
+    monkeypatch.setattr(module, "get_doc_id", lambda k: "h-" + k)
+    monkeypatch.setattr(module, "REFRESH_TAG_SCAN_MIN_FILES", 2)
+    conn, cur = mock_psycopg
+    conn.__enter__.return_value = conn
+    named = MagicMock()
+    named.__iter__.return_value = iter([("h-a", "bucket", ["x"]), ("h-gone", "bucket", ["y"])])
+
+    def cursor(name=None):
+        ctx = MagicMock()
+        ctx.__enter__.return_value = named if name else cur
+        return ctx
+    conn.cursor.side_effect = cursor
+    seen = []
+    monkeypatch.setattr(module, "create_document",
+                        lambda index, file, meili_client, dbTags, s3_uri=None, extracted=None: seen.append(dbTags))
+
+    module.add_files_to_index("bucket", [{"Key": "a"}, {"Key": "b"}])
+
+    named.execute.assert_called_once()
+    assert named.execute.call_args.args[1] == ("bucket",)
+    cur.execute.assert_not_called()
+    # rows of files that are not being indexed are not kept
+    assert seen[0] == {"h-a": ("h-a", "bucket", ["x"])}
+
+
 def test_remove_files_from_index_deletes_and_db(monkeypatch, mock_s3_client, mock_meili_client, meili_helpers, mock_psycopg, status_mocks):
     monkeypatch.setattr(module, "meilisearch", MagicMock(Client=MagicMock(return_value=mock_meili_client)))
     # patch get_doc_id to simple hash
     monkeypatch.setattr(module, "get_doc_id", lambda k: "h-"+k)
-    keys = ["a.txt", "b.txt"]
-    module.remove_files_from_index("bucket", keys, s3_uri="s3://u")
-    # ensure delete_document called for each
-    assert mock_meili_client.index("bucket").delete_document.call_count == 2
-    module.increment_processed.assert_called()
+    monkeypatch.setattr(module, "REFRESH_DELETE_BATCH_SIZE", 2)
+    idx = mock_meili_client.index("bucket")
+    idx.delete_documents.side_effect = [MagicMock(task_uid=1), MagicMock(task_uid=2)]
+    conn, cur = mock_psycopg
+    conn.__enter__.return_value = conn
+    keys = ["a.txt", "b.txt", "c.txt"]
+    task_uids = module.remove_files_from_index("bucket", keys, s3_uri="s3://u")
+    # one task and one statement per chunk
+    assert task_uids == [1, 2]
+    idx.delete_documents.assert_any_call(["h-a.txt", "h-b.txt"])
+    idx.delete_documents.assert_any_call(["h-c.txt"])
+    idx.delete_document.assert_not_called()
+    assert cur.execute.call_count == 2
+    assert cur.execute.call_args.args[1] == (["h-c.txt"],)
+    assert conn.commit.call_count == 2
+    assert [c.args for c in module.increment_processed.call_args_list] == [("s3://u", 2), ("s3://u", 1)]
+
+
+def test_extract_content_uses_and_fills_cache(monkeypatch, mock_s3_client):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    extracted = {("same", EXTRACTOR_VERSIONS["text"]): Extraction(["cached"])}
+
+    cached = module.extract_content("bucket", {"Key": "a.txt", "ETag": '"same"'}, "text", extracted)
+    assert cached.keywords == ["cached"]
+    mock_s3_client.get_object.assert_not_called()
+
+    extraction = module.extract_content("bucket", {"Key": "b.txt", "ETag": '"new"'}, "text", extracted)
+    assert "hello" in extraction.keywords
+    assert extracted[("new", EXTRACTOR_VERSIONS["text"])] == extraction
+
+    # failed extractions fall back to the key and are not cached
+    mock_s3_client.get_object.side_effect = Exception("denied")
+    extraction = module.extract_content("bucket", {"Key": "c.txt", "ETag": '"bad"'}, "text", extracted)
+    assert sorted(extraction.keywords) == ["c", "txt"]
+    assert ("bad", EXTRACTOR_VERSIONS["text"]) not in extracted
+
+
+def test_pds_label_is_read_until_end_only(monkeypatch, mock_s3_client, meili_helpers):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    monkeypatch.setattr(module, "STREAM_CHUNK_BYTES", 64)
+    label = (b'PDS_VERSION_ID = PDS3\r\nTARGET_NAME = "MARS"\r\nINSTRUMENT_ID = HIRISE\r\n'
+             b'PRODUCT_TYPE = EDR\r\n^IMAGE = "PSP_001.IMG"\r\nEND\r\n' + b"\0" * 100000)
+    raw = io.BytesIO(label)
+    body = MagicMock()
+    body.read.side_effect = raw.read
+    mock_s3_client.get_object.return_value = {"Body": body}
+    mock_s3_client.head_object.return_value = {"ContentType": "text/lbl"}
+
+    document = module.build_document("bucket", {"Key": "a/PSP_001.LBL", "Size": len(label),
+                                                "LastModified": __import__("datetime").datetime(2020, 1, 1)}, {})
+
+    assert (document["TargetName"], document["InstrumentId"], document["ProductType"]) == ("MARS", "HIRISE", "EDR")
+    assert document["Keywords"][:2] == ["MARS", "HIRISE"]
+    assert "PSP_001.IMG" in document["Keywords"]
+    # the padding after END is never downloaded
+    assert raw.tell() < 1000
+    body.close.assert_called_once()
+
+
+def test_structured_content_is_read_up_to_byte_cap(monkeypatch, mock_s3_client):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    monkeypatch.setattr(module, "STREAM_CHUNK_BYTES", 64)
+    monkeypatch.setattr(module, "STRUCTURED_MAX_BYTES", 200)
+    table = b"target,instrument\n" + b"MARS,HIRISE\n" * 100000
+    raw = io.BytesIO(table)
+    body = MagicMock()
+    body.read.side_effect = raw.read
+    mock_s3_client.get_object.return_value = {"Body": body}
+
+    extraction = module.extract_content("bucket", {"Key": "obs.csv"}, module.content_extractor("text/csv"))
+
+    assert extraction.keywords == ["target", "instrument", "MARS", "HIRISE"]
+    assert raw.tell() == 200
+    body.close.assert_called_once()
+    assert module.content_extractor("application/json") == "json"
+    assert module.content_extractor("application/xml") == "xml"
+    assert module.content_extractor("text/html") == "text"
+
+def test_image_metadata_uses_ranged_gets(monkeypatch, mock_s3_client):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    png = b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sIIBB", 13, b"IHDR", 640, 480, 8, 2)
+    mock_s3_client.get_object.side_effect = lambda **kwargs: {"Body": io.BytesIO(png)}
+
+    extraction = module.extract_content("bucket", {"Key": "a/b.png", "Size": 50 * 1024 * 1024},
+                                        module.content_extractor("image/png"))
+
+    assert extraction.fields == {"Width": 640, "Height": 480, "Bands": 3}
+    mock_s3_client.get_object.assert_called_once_with(
+        Bucket="bucket", Key="a/b.png", Range=f"bytes=0-{module.IMAGE_HEADER_BYTES - 1}")
+
+def test_compressed_objects_are_read_through_their_codec(monkeypatch, mock_s3_client):
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    monkeypatch.setattr(module, "guess_mime_type",
+                        lambda ext: {"csv": "text/csv", "lbl": "text/lbl"}.get(ext.lower(), "binary/octet-stream"))
+    table = gzip.compress(b"target,instrument\n" + b"MARS,HIRISE\n" * 1000)
+    mock_s3_client.get_object.return_value = {"Body": io.BytesIO(table)}
 
+    assert module.compressed_extractor("a/obs.csv.gz") == "gzip:csv"
+    assert module.compressed_extractor("a/PSP.LBL.bz2") == "bz2:pds_label"
+    assert module.compressed_extractor("a/image.raw.gz") is None
+    assert module.compressed_extractor("a/volume.zip") == "zip"
+    extraction = module.extract_content("bucket", {"Key": "a/obs.csv.gz", "ETag": '"e"'}, "gzip:csv", {})
+    assert extraction.keywords == ["target", "instrument", "MARS", "HIRISE"]
 
 def test_get_keywords_from_key_various():
     # uses separation characters; provide a string
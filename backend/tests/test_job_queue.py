@@ -0,0 +1,198 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.jobs.queue as queue_module
+import app.worker as worker_module
+from app.jobs.queue import RefreshJob
+from tests.fixtures import *
+
+
+@pytest.fixture
+def job_conn():
+    conn = MagicMock()
+    cur = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    conn.__enter__.return_value = conn
+    return conn, cur
+
+
+def _row(job_id=1, s3_uri="s3://bucket/pfx", kind="refresh", status="queued", attempts=0):
+    return (job_id, s3_uri, kind, status, attempts, None, None, None, None, None)
+
+
+def test_enqueue_job_creates_job(job_conn):
+    conn, cur = job_conn
+    cur.fetchone.return_value = _row()
+
+    job, created = queue_module.enqueue_job(conn, "s3://bucket/pfx", "refresh")
+
+    assert created is True
+    assert job == RefreshJob(1, "s3://bucket/pfx", "refresh", "queued")
+    sql, params = cur.execute.call_args.args
+    assert "ON CONFLICT (s3_uri) WHERE status IN ('queued', 'running') DO NOTHING" in sql
+    assert params == ("s3://bucket/pfx", "refresh")
+    conn.commit.assert_called_once()
+
+
+def test_enqueue_job_returns_active_job(job_conn):
+    conn, cur = job_conn
+    cur.fetchone.side_effect = [None, _row(job_id=7, kind="rebuild", status="running", attempts=1)]
+
+    job, created = queue_module.enqueue_job(conn, "s3://bucket/pfx", "refresh")
+
+    assert created is False
+    assert (job.id, job.kind, job.status) == (7, "rebuild", "running")
+
+
+def test_enqueue_job_rejects_unknown_kind(job_conn):
+    conn, cur = job_conn
+    with pytest.raises(ValueError):
+        queue_module.enqueue_job(conn, "s3://bucket", "reindex")
+    cur.execute.assert_not_called()
+
+
+def test_claim_job_skips_locked_jobs(job_conn):
+    conn, cur = job_conn
+    cur.fetchone.return_value = _row(status="running", attempts=1)
+
+    job = queue_module.claim_job(conn, "worker-1")
+
+    assert job.status == "running"
+    sql, params = cur.execute.call_args.args
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert params == ("worker-1",)
+
+    cur.fetchone.return_value = None
+    assert queue_module.claim_job(conn, "worker-1") is None
+
+
+def test_finish_job_records_error(job_conn):
+    conn, cur = job_conn
+    queue_module.finish_job(conn, 3)
+    assert cur.execute.call_args.args[1] == ("done", None, 3, None, None)
+
+    queue_module.finish_job(conn, 3, "boom")
+    assert cur.execute.call_args.args[1] == ("error", "boom", 3, None, None)
+
+
+def test_finish_job_needs_the_worker_holding_it(job_conn):
+    conn, cur = job_conn
+    cur.fetchone.return_value = None
+
+    assert queue_module.finish_job(conn, 3, worker="worker-1") is False
+    sql, params = cur.execute.call_args.args
+    assert "status = 'running'" in sql
+    assert params == ("done", None, 3, "worker-1", "worker-1")
+
+
+def test_requeue_stale_jobs_counts_requeued(job_conn):
+    conn, cur = job_conn
+    cur.fetchall.return_value = [("queued",), ("error",), ("queued",)]
+
+    assert queue_module.requeue_stale_jobs(conn, lease=60) == 2
+    sql, params = cur.execute.call_args.args
+    assert "heartbeat_at < now()" in sql
+    assert "refresh_shards" in sql  # sharded jobs are kept alive by their shards
+    assert params == (queue_module.JOB_MAX_ATTEMPTS, 60)
+
+
+def test_heartbeat_job_reports_lost_lease(job_conn):
+    conn, cur = job_conn
+    cur.fetchone.return_value = (4,)
+    assert queue_module.heartbeat_job(conn, 4, "worker-1") is True
+    assert cur.execute.call_args.args[1] == (4, "worker-1")
+
+    cur.fetchone.return_value = None
+    assert queue_module.heartbeat_job(conn, 4, "worker-1") is False
+
+
+def test_keep_alive_flags_lost_lease():
+    beats = []
+
+    def beat():
+        beats.append(1)
+        return len(beats) < 2
+
+    with queue_module.keep_alive(beat, interval=0.01) as lost:
+        assert lost.wait(1)
+    count = len(beats)
+    threading.Event().wait(0.05)
+    assert len(beats) == count  # no heartbeat after the block
+
+
+def test_run_job_dispatches_on_kind(monkeypatch):
+    refresh, rebuild = MagicMock(), MagicMock()
+    monkeypatch.setattr(worker_module, "refresh_meili_index", refresh)
+    monkeypatch.setattr(worker_module, "rebuild_meili_index", rebuild)
+
+    worker_module.run_job(RefreshJob(1, "s3://bucket/pfx", "refresh", "running"))
+    worker_module.run_job(RefreshJob(2, "s3://bucket", "rebuild", "running"))
+
+    refresh.assert_called_once_with("bucket", "pfx", s3_uri="s3://bucket/pfx")
+    rebuild.assert_called_once_with("bucket", "", s3_uri="s3://bucket")
+
+
+@pytest.fixture
+def worker_queue(monkeypatch, job_conn):
+    conn, _ = job_conn
+    monkeypatch.setattr(worker_module, "psycopg", MagicMock(connect=MagicMock(return_value=conn)))
+    mocks = {name: MagicMock() for name in ["requeue_stale_jobs", "expire_shards", "claim_shard", "claim_job", "finish_job", "run_job"]}
+    for name, mock in mocks.items():
+        monkeypatch.setattr(worker_module, name, mock)
+    mocks["claim_shard"].return_value = None
+    mocks["expire_shards"].return_value = []
+    mocks["run_job"].return_value = True
+    return mocks
+
+
+def test_work_once_runs_and_finishes_job(worker_queue):
+    job = RefreshJob(5, "s3://bucket", "refresh", "running")
+    worker_queue["claim_job"].return_value = job
+
+    assert worker_module.work_once("postgres://db", "worker-1") is True
+    worker_queue["run_job"].assert_called_once_with(job, "postgres://db")
+    assert worker_queue["finish_job"].call_args.args[1:] == (5, None)
+    assert worker_queue["finish_job"].call_args.kwargs == {"worker": "worker-1"}
+
+
+def test_work_once_records_failure(worker_queue):
+    worker_queue["claim_job"].return_value = RefreshJob(5, "s3://bucket", "refresh", "running")
+    worker_queue["run_job"].side_effect = RuntimeError("listing failed")
+
+    assert worker_module.work_once("postgres://db", "worker-1") is True
+    assert worker_queue["finish_job"].call_args.args[1:] == (5, "listing failed")
+
+
+def test_work_once_leaves_job_alone_after_losing_lease(worker_queue, monkeypatch):
+    worker_queue["claim_job"].return_value = RefreshJob(5, "s3://bucket", "refresh", "running")
+    lost = threading.Event()
+    lost.set()
+    keep_alive = MagicMock()
+    keep_alive.return_value.__enter__.return_value = lost
+    monkeypatch.setattr(worker_module, "keep_alive", keep_alive)
+
+    assert worker_module.work_once("postgres://db", "worker-1") is True
+    worker_queue["finish_job"].assert_not_called()
+
+
+def test_work_once_reports_jobs_of_abandoned_sweeps(worker_queue, monkeypatch):
+    worker_queue["expire_shards"].return_value = ["s3://bucket/pfx"]
+    worker_queue["claim_job"].return_value = None
+    update = MagicMock()
+    monkeypatch.setattr(worker_module, "update_shared_status", update)
+
+    assert worker_module.work_once("postgres://db", "worker-1") is False
+    assert update.call_args.args == ("s3://bucket/pfx",)
+    assert update.call_args.kwargs["status"] == "error"
+
+
+def test_run_worker_stops_when_queue_is_empty_and_stop_set(worker_queue, monkeypatch):
+    stop = threading.Event()
+    worker_queue["claim_job"].return_value = None
+    monkeypatch.setattr(worker_module, "work_once", MagicMock(side_effect=lambda *args: stop.set() or False))
+
+    worker_module.run_worker(stop, "postgres://db", "worker-1")
+
+    worker_module.work_once.assert_called_once_with("postgres://db", "worker-1")
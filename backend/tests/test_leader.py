@@ -0,0 +1,87 @@
+from unittest.mock import MagicMock
+
+import psycopg
+import pytest
+
+import app.jobs.leader as leader_module
+from tests.fixtures import *
+
+
+@pytest.fixture
+def lock_conns(monkeypatch):
+    """Connections handed out by psycopg.connect, each granting the lock or not as queued in `grants`."""
+    grants = []
+    conns = []
+
+    def connect(url, autocommit=False):
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (grants.pop(0),)
+        conns.append(conn)
+        return conn
+
+    monkeypatch.setattr(leader_module.psycopg, "connect", connect)
+    return grants, conns
+
+
+def test_advisory_lock_key_is_stable_signed_64_bit():
+    key = leader_module.advisory_lock_key("refresh-scheduler")
+    assert key == leader_module.advisory_lock_key("refresh-scheduler")
+    assert key != leader_module.advisory_lock_key("other")
+    assert -2 ** 63 <= key < 2 ** 63
+
+
+def test_follower_closes_connection_and_retries(lock_conns):
+    grants, conns = lock_conns
+    grants.extend([False, True])
+    election = leader_module.LeaderElection("scheduler", "postgres://db")
+
+    assert election.ensure() is False
+    conns[0].close.assert_called_once()
+    conns[0].execute.assert_called_once_with("SELECT pg_try_advisory_lock(%s)", (election.key,))
+
+    assert election.ensure() is True
+    conns[1].close.assert_not_called()
+
+
+def test_leader_keeps_lock_on_its_connection(lock_conns):
+    grants, conns = lock_conns
+    grants.append(True)
+    election = leader_module.LeaderElection("scheduler", "postgres://db")
+
+    assert election.ensure() is True
+    assert election.ensure() is True
+    # checked on the same connection, without asking for the lock again
+    assert len(conns) == 1
+    conns[0].execute.assert_called_with("SELECT 1")
+
+
+def test_leader_fails_over_when_connection_drops(lock_conns):
+    grants, conns = lock_conns
+    grants.extend([True, False])
+    election = leader_module.LeaderElection("scheduler", "postgres://db")
+    assert election.ensure() is True
+
+    conns[0].execute.side_effect = psycopg.OperationalError("server closed the connection")
+    # another process may hold the lock by now
+    assert election.ensure() is False
+    conns[0].close.assert_called_once()
+    assert len(conns) == 2
+
+
+def test_release_unlocks_and_closes(lock_conns):
+    grants, conns = lock_conns
+    grants.append(True)
+    election = leader_module.LeaderElection("scheduler", "postgres://db")
+    election.ensure()
+
+    election.release()
+
+    conns[0].execute.assert_called_with("SELECT pg_advisory_unlock(%s)", (election.key,))
+    conns[0].close.assert_called_once()
+    election.release()  # no-op once released
+
+
+def test_unreachable_database_is_not_leader(monkeypatch):
+    monkeypatch.setattr(leader_module.psycopg, "connect",
+                        MagicMock(side_effect=psycopg.OperationalError("connection refused")))
+    assert leader_module.LeaderElection("scheduler", "postgres://db").ensure() is False
@@ -0,0 +1,49 @@
+import app.s3.listing_cache as module
+
+
+def test_ttl_cache_get_set_and_lru_eviction():
+    cache = module.TTLCache(ttl_seconds=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+    cache = module.TTLCache(ttl_seconds=10, max_entries=10)
+    cache.set("a", "value")
+    now[0] = 109.0
+    assert cache.get("a") == "value"
+    now[0] = 110.0
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_delete_and_clear():
+    cache = module.TTLCache(ttl_seconds=10, max_entries=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_weight_limit():
+    cache = module.TTLCache(ttl_seconds=60, max_entries=10, max_weight=10)
+    cache.set("a", "x", weight=6)
+    cache.set("b", "y", weight=3)
+    assert cache.weight == 9
+    cache.set("c", "z", weight=4)
+    assert cache.get("a") is None
+    assert cache.weight == 7
+    # an entry heavier than the whole budget is never stored
+    cache.set("d", "huge", weight=11)
+    assert cache.get("d") is None
+    assert cache.weight == 7
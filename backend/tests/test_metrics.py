@@ -0,0 +1,54 @@
+import pytest
+from botocore.stub import Stubber
+from prometheus_client import REGISTRY
+
+import app.metrics.registry as metrics
+from app.s3.utils import get_public_client
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_track_stage_records_latency_and_errors():
+    count_before = _sample("artemis3_refresh_stage_seconds_count", {"stage": "unit"})
+    errors_before = _sample("artemis3_refresh_stage_errors_total", {"stage": "unit"})
+
+    with metrics.track_stage("unit"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.track_stage("unit"):
+            raise ValueError("boom")
+
+    assert _sample("artemis3_refresh_stage_seconds_count", {"stage": "unit"}) == count_before + 2
+    assert _sample("artemis3_refresh_stage_errors_total", {"stage": "unit"}) == errors_before + 1
+
+
+def test_track_call_records_outcome():
+    labels = {"service": "postgres", "operation": "unit", "outcome": "error"}
+    before = _sample("artemis3_outbound_requests_total", labels)
+    with pytest.raises(RuntimeError):
+        with metrics.track_call("postgres", "unit"):
+            raise RuntimeError("down")
+    assert _sample("artemis3_outbound_requests_total", labels) == before + 1
+
+
+def test_public_client_records_s3_calls():
+    s3 = get_public_client(region="us-east-1")
+    labels = {"service": "s3", "operation": "HeadObject", "outcome": "success"}
+    before = _sample("artemis3_outbound_requests_total", labels)
+
+    with Stubber(s3) as stubber:
+        stubber.add_response("head_object", {"ContentLength": 5},
+                             {"Bucket": "bucket", "Key": "a.txt"})
+        s3.head_object(Bucket="bucket", Key="a.txt")
+
+    assert _sample("artemis3_outbound_requests_total", labels) == before + 1
+    assert _sample("artemis3_outbound_request_seconds_count",
+                   {"service": "s3", "operation": "HeadObject"}) >= 1
+
+
+def test_render_metrics_exposes_text_format():
+    body, content_type = metrics.render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b"artemis3_refresh_stage_seconds" in body
@@ -0,0 +1,58 @@
+import app.s3.pds_label as label_module
+
+
+LABEL = """PDS_VERSION_ID       = PDS3
+/* identification */
+DATA_SET_ID          = "MRO-M-HIRISE-2-EDR-V1.0"
+PRODUCT_ID           = PSP_001330_1395_RED0_0
+TARGET_NAME          = MARS
+INSTRUMENT_ID        = "HIRISE"   /* trailing comment */
+PRODUCT_TYPE         = EDR
+MISSION_PHASE_NAME   = "PRIMARY SCIENCE
+                        PHASE"
+RECORD_BYTES         = 2048
+EMISSION_ANGLE       = 0.5 <DEG>
+^IMAGE               = ("PSP_001330_1395_RED0_0.IMG", 3)
+OBJECT               = IMAGE
+  LINES              = 80000
+  FILTER_NAME        = (RED,
+                        "NEAR INFRARED")
+END_OBJECT           = IMAGE
+END
+TARGET_NAME          = PHOBOS
+"""
+
+
+def test_iter_label_statements_joins_values_and_stops_at_end():
+    statements = dict(label_module.iter_label_statements(LABEL.splitlines()))
+    assert statements["INSTRUMENT_ID"] == '"HIRISE"'
+    assert statements["MISSION_PHASE_NAME"] == '"PRIMARY SCIENCE PHASE"'
+    assert statements["FILTER_NAME"] == '(RED, "NEAR INFRARED")'
+    # nothing after END is read
+    assert statements["TARGET_NAME"] == "MARS"
+
+
+def test_parse_label_value():
+    assert label_module.parse_label_value('"MRO-M-HIRISE"') == "MRO-M-HIRISE"
+    assert label_module.parse_label_value("0.5 <DEG>") == "0.5"
+    assert label_module.parse_label_value('(RED, "NEAR INFRARED")') == ["RED", "NEAR INFRARED"]
+    assert label_module.parse_label_value('{"MARS", "PHOBOS"}') == ["MARS", "PHOBOS"]
+
+
+def test_label_fields_and_keywords():
+    statements = label_module.parse_label(LABEL.splitlines())
+    assert label_module.label_fields(statements) == {
+        "TargetName": "MARS", "InstrumentId": "HIRISE", "ProductType": "EDR"}
+
+    keywords = label_module.label_keywords(statements)
+    assert keywords[:3] == ["MARS", "HIRISE", "EDR"]
+    assert "PRIMARY SCIENCE PHASE" in keywords
+    assert "PSP_001330_1395_RED0_0.IMG" in keywords
+    assert "NEAR" in keywords
+    # structure, units and numbers are not keywords
+    assert not {"PDS3", "IMAGE", "0.5", "80000", "2048", "DEG"} & set(keywords)
+
+
+def test_label_fields_skip_unknown_values():
+    statements = label_module.parse_label(['TARGET_NAME = "N/A"', "PRODUCT_TYPE = UNK", "END"])
+    assert label_module.label_fields(statements) == {}
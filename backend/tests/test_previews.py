@@ -0,0 +1,114 @@
+import io
+import os
+from unittest.mock import MagicMock
+
+import fitz
+import pytest
+
+import app.s3.previews as previews
+
+
+def _pdf_bytes():
+    document = fitz.open()
+    page = document.new_page(width=612, height=792)
+    page.insert_text((72, 72), "ArtemiS3 preview")
+    return document.tobytes()
+
+
+def _mock_s3(data, content_type="application/pdf", etag='"abc"'):
+    s3 = MagicMock()
+    s3.head_object.return_value = {
+        "ContentType": content_type,
+        "ContentLength": len(data),
+        "ETag": etag
+    }
+    s3.get_object.side_effect = lambda Bucket, Key: {"Body": io.BytesIO(data)}
+    return s3
+
+
+def test_preview_filetype():
+    assert previews.preview_filetype("a/b.pdf", "binary/octet-stream") == "pdf"
+    assert previews.preview_filetype("a/b.JPG", None) == "jpg"
+    assert previews.preview_filetype("a/b", "image/png") == "png"
+    assert previews.preview_filetype("a/b.txt", "text/plain") is None
+
+
+def test_get_preview_renders_then_hits_cache(tmp_path):
+    s3 = _mock_s3(_pdf_bytes())
+    preview, media_type, digest = previews.get_preview(
+        "bucket", "doc.pdf", dimension=128, s3=s3, cache_dir=str(tmp_path))
+
+    assert media_type == "image/png"
+    rendered = fitz.Pixmap(preview)
+    assert max(rendered.width, rendered.height) == pytest.approx(128, abs=1)
+
+    again = previews.get_preview(
+        "bucket", "doc.pdf", dimension=128, s3=s3, cache_dir=str(tmp_path))
+    assert again == (preview, media_type, digest)
+    assert s3.get_object.call_count == 1
+
+
+def test_get_preview_regenerates_evicted_derivative(tmp_path):
+    s3 = _mock_s3(_pdf_bytes())
+    preview, _, _ = previews.get_preview("bucket", "doc.pdf", s3=s3, cache_dir=str(tmp_path))
+    for root, _, files in os.walk(tmp_path):
+        for name in files:
+            os.remove(os.path.join(root, name))
+
+    again, _, _ = previews.get_preview("bucket", "doc.pdf", s3=s3, cache_dir=str(tmp_path))
+    assert again == preview
+    assert s3.get_object.call_count == 2
+
+
+def test_get_preview_new_etag_is_new_entry(tmp_path):
+    data = _pdf_bytes()
+    first = previews.get_preview("bucket", "doc.pdf", s3=_mock_s3(data, etag='"1"'),
+                                 cache_dir=str(tmp_path))
+    second = previews.get_preview("bucket", "doc.pdf", s3=_mock_s3(data, etag='"2"'),
+                                  cache_dir=str(tmp_path))
+    assert first[2] != second[2]
+
+
+def test_get_preview_rejects_unsupported_and_large(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        previews.get_preview("bucket", "a.txt", s3=_mock_s3(b"x", "text/plain"),
+                             cache_dir=str(tmp_path))
+
+    monkeypatch.setattr(previews, "PREVIEW_MAX_SOURCE_BYTES", 10)
+    s3 = _mock_s3(_pdf_bytes())
+    with pytest.raises(previews.PreviewTooLargeError):
+        previews.get_preview("bucket", "doc.pdf", s3=s3, cache_dir=str(tmp_path))
+    s3.get_object.assert_not_called()
+
+
+def test_get_preview_remembers_unrenderable_file(tmp_path):
+    s3 = _mock_s3(b"not a pdf at all")
+    with pytest.raises(previews.PreviewRenderError):
+        previews.get_preview("bucket", "doc.pdf", s3=s3, cache_dir=str(tmp_path))
+
+    # later requests, at any size, fail without downloading the file again
+    with pytest.raises(previews.PreviewRenderError):
+        previews.get_preview("bucket", "doc.pdf", dimension=128, s3=s3, cache_dir=str(tmp_path))
+    assert s3.get_object.call_count == 1
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path)
+    old_path = os.path.join(cache_dir, "aa", "old.png")
+    new_path = os.path.join(cache_dir, "bb", "new.png")
+    previews._store_derivative(old_path, b"x" * 60, cache_dir, max_bytes=100)
+    os.utime(old_path, (1, 1))
+    previews._store_derivative(new_path, b"y" * 60, cache_dir, max_bytes=100)
+
+    assert not os.path.exists(old_path)
+    assert os.path.exists(new_path)
+    assert previews._cache_bytes[cache_dir] == 60
+
+
+def test_cache_counts_rewritten_derivative_once(tmp_path):
+    cache_dir = str(tmp_path)
+    path = os.path.join(cache_dir, "aa", "same.png")
+    previews._store_derivative(path, b"x" * 60, cache_dir, max_bytes=1000)
+    # a second request that rendered the same derivative replaces the file
+    previews._store_derivative(path, b"x" * 60, cache_dir, max_bytes=1000)
+
+    assert previews._cache_bytes[cache_dir] == 60
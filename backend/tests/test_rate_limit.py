@@ -0,0 +1,85 @@
+import threading
+import time
+
+import app.s3.rate_limit as rate_limit
+
+
+def test_priority_context_and_decorator():
+    assert rate_limit.current_priority() == rate_limit.INTERACTIVE
+
+    @rate_limit.with_s3_priority(rate_limit.REFRESH)
+    def refresh():
+        return rate_limit.current_priority()
+
+    assert refresh() == rate_limit.REFRESH
+    assert rate_limit.current_priority() == rate_limit.INTERACTIVE
+
+
+def test_bucket_budgets_from_config(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_budgets", {})
+    monkeypatch.setattr(rate_limit, "S3_REQUEST_RATE", 100.0)
+    monkeypatch.setattr(rate_limit, "S3_BUCKET_REQUEST_RATES", "fast=1000, open=0")
+
+    assert rate_limit.bucket_budget("other").rate == 100.0
+    assert rate_limit.bucket_budget("fast").rate == 1000.0
+    assert rate_limit.bucket_budget("open") is None
+    assert rate_limit.bucket_budget("fast") is rate_limit.bucket_budget("fast")
+
+
+def test_refresh_leaves_a_reserve_for_interactive_requests():
+    budget = rate_limit.RequestBudget(rate=10, burst=4, reserve=0.5)
+
+    for _ in range(2):
+        assert budget.acquire(rate_limit.REFRESH) < 0.01
+    # 2 tokens left, all of them reserved for interactive requests
+    assert budget.acquire(rate_limit.INTERACTIVE) < 0.01
+    assert budget.acquire(rate_limit.INTERACTIVE) < 0.01
+    assert budget.acquire(rate_limit.REFRESH) > 0.2
+
+
+def test_refresh_requests_are_served_at_low_rates():
+    # the reserve would otherwise ask for more tokens than the burst ever holds
+    budget = rate_limit.RequestBudget(rate=1.0)
+    done = threading.Event()
+
+    def refresh():
+        budget.acquire(rate_limit.REFRESH)
+        done.set()
+
+    threading.Thread(target=refresh, daemon=True).start()
+    assert done.wait(2)
+
+
+def test_interactive_requests_preempt_waiting_refresh_requests():
+    budget = rate_limit.RequestBudget(rate=20, burst=1, reserve=0)
+    budget.acquire(rate_limit.INTERACTIVE)
+    order = []
+
+    def take(priority):
+        budget.acquire(priority)
+        order.append(priority)
+
+    refresh = threading.Thread(target=take, args=(rate_limit.REFRESH,))
+    refresh.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=take, args=(rate_limit.INTERACTIVE,))
+    interactive.start()
+    refresh.join()
+    interactive.join()
+
+    assert order == [rate_limit.INTERACTIVE, rate_limit.REFRESH]
+
+
+def test_client_hook_charges_the_request_bucket(monkeypatch):
+    budget = rate_limit.RequestBudget(rate=1000)
+    calls = []
+    monkeypatch.setattr(budget, "acquire", lambda priority: calls.append(priority) or 0.0)
+    monkeypatch.setattr(rate_limit, "bucket_budget", lambda bucket: budget if bucket == "b" else None)
+
+    with rate_limit.s3_priority(rate_limit.REFRESH):
+        rate_limit._before_s3_call({"Bucket": "b", "Key": "k"})
+    rate_limit._before_s3_call({"Bucket": "b"})
+    rate_limit._before_s3_call({"Bucket": "other"})
+    rate_limit._before_s3_call({})
+
+    assert calls == [rate_limit.REFRESH, rate_limit.INTERACTIVE]
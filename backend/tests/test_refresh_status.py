@@ -1,3 +1,4 @@
+import asyncio
 from tests.fixtures import *
 import app.s3.refresh_status as module
 
@@ -80,6 +81,17 @@ def test_finish_refresh_sets_done_and_percent():
     module.finish_refresh(uri2)
     assert module._status_by_uri[uri2].percent == 0
 
+def test_finish_refresh_records_failed_tasks():
+    uri = "s3://finish/tasks"
+    module.start_refresh(uri, total=2)
+    module.set_status(uri, status="indexing")
+    assert module.get_status(uri)["status"] == "indexing"
+    module.finish_refresh(uri, failed_tasks=1, indexing_seconds=3.5, message="1 of 2 Meilisearch tasks failed")
+    st = module.get_status(uri)
+    assert st["status"] == "done"
+    assert (st["failed_tasks"], st["indexing_seconds"]) == (1, 3.5)
+    assert st["message"] == "1 of 2 Meilisearch tasks failed"
+
 def test_fail_refresh_sets_error_and_message():
     uri = "s3://fail/one"
     module.start_refresh(uri, total=3)
@@ -114,4 +126,117 @@ def test_get_status_returns_dict_of_status():
     assert out["listed"] == 2
     assert out["processed"] == 1
     assert out["total"] == 7
-    assert "started_at" in out
\ No newline at end of file
+    assert "started_at" in out
+
+
+def test_set_status_uses_given_uri():
+    uri = "s3://bucket/existing"
+    module.start_refresh(uri, total=3)
+    module.increment_processed(uri, 2)
+    module.set_status(uri, status="running")
+    # existing progress is kept rather than replaced by a fresh status
+    assert module._status_by_uri[uri].processed == 2
+
+
+def test_file_store_shares_status_between_processes(monkeypatch, tmp_path):
+    monkeypatch.setenv("REFRESH_STATUS_STORE", "file")
+    monkeypatch.setenv("REFRESH_STATUS_DIR", str(tmp_path))
+    uri = "s3://shared/status"
+    module.start_refresh(uri, total=4)
+    module.finish_refresh(uri)
+
+    # another worker has no local state and reads the shared store
+    module._status_by_uri.clear()
+    out = module.get_status(uri)
+    assert out["status"] == "done"
+    assert out["total"] == 4
+
+
+def test_counter_updates_are_batched(monkeypatch):
+    saves = []
+    store = MagicMock(shared=True)
+    store.save.side_effect = lambda uri, status: saves.append(status["processed"])
+    monkeypatch.setattr(module, "_get_store", lambda: store)
+    now = [1000.0]
+    monkeypatch.setattr(module.time, "monotonic", lambda: now[0])
+
+    uri = "s3://batched/counts"
+    module.start_refresh(uri, total=100)
+    for _ in range(50):
+        module.increment_processed(uri, 1)
+    # start is flushed immediately, increments within the window are not
+    assert saves == [0]
+
+    now[0] += 5
+    module.increment_processed(uri, 1)
+    assert saves == [0, 51]
+
+    module.finish_refresh(uri)
+    assert len(saves) == 3
+
+
+def test_stale_snapshot_does_not_overwrite_newer_one(monkeypatch):
+    store = MagicMock(shared=True)
+    monkeypatch.setattr(module, "_get_store", lambda: store)
+    uri = "s3://racing/flush"
+    module.start_refresh(uri, total=10)
+    store.save.reset_mock()
+
+    # a newer snapshot was saved while this one waited for the store
+    module._saved_seq[uri] = module._flush_seq[uri] + 2
+    module.finish_refresh(uri)
+    store.save.assert_not_called()
+
+
+def test_update_shared_status_builds_on_stored_status(monkeypatch, tmp_path):
+    monkeypatch.setenv("REFRESH_STATUS_STORE", "file")
+    monkeypatch.setenv("REFRESH_STATUS_DIR", str(tmp_path))
+    uri = "s3://shared/sharded"
+    module.update_shared_status(uri, start=True, status="running", total=4)
+    # a running status is not kept locally, so this process reads what others write
+    assert uri not in module._status_by_uri
+
+    module.update_shared_status(uri, processed=3, listed=120)
+    out = module.get_status(uri)
+    assert (out["status"], out["processed"], out["total"], out["percent"], out["listed"]) == ("running", 3, 4, 75, 120)
+    assert out["started_at"] is not None
+
+    module.update_shared_status(uri, status="done", processed=4)
+    out = module.get_status(uri)
+    assert out["status"] == "done"
+    assert out["percent"] == 100
+    assert out["finished_at"] is not None
+
+
+def test_get_status_prefers_local_running_refresh(monkeypatch):
+    store = MagicMock(shared=True)
+    store.load.return_value = {"status": "done", "processed": 1, "total": 1, "percent": 100}
+    monkeypatch.setattr(module, "_get_store", lambda: store)
+    uri = "s3://local/running"
+    module.start_refresh(uri, total=10)
+    assert module.get_status(uri)["status"] == "running"
+    store.load.assert_not_called()
+
+
+def test_status_events_send_snapshot_then_deltas(monkeypatch):
+    statuses = iter([
+        {"status": "running", "processed": 1, "total": 4},
+        {"status": "running", "processed": 1, "total": 4},
+        {"status": "running", "processed": 3, "total": 4},
+    ])
+    monkeypatch.setattr(module, "get_status", lambda uri: next(statuses))
+
+    async def collect():
+        events = []
+        stream = module.status_events("s3://b", poll_seconds=0, heartbeat_seconds=3600)
+        async for event in stream:
+            events.append(event)
+            if len(events) == 2:
+                break
+        await stream.aclose()
+        return events
+
+    events = asyncio.run(collect())
+    assert events[0].startswith("event: status\n")
+    assert '"total": 4' in events[0]
+    assert events[1] == 'event: progress\ndata: {"processed": 3}\n\n'
@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock
+
+import psycopg
+import pytest
+from fastapi import HTTPException
+
+import app.api.s3_routes as routes_module
+import app.s3.previews as previews_module
+from tests.fixtures import *
+
+
+SEARCH_DEFAULTS = dict(contains=None, suffixes=None, min_size=None, max_size=None, storage_classes=None,
+                       modified_after=None, modified_before=None, targets=None, instruments=None,
+                       product_types=None, min_width=None, min_height=None, crs=None, limit=10,
+                       sort_by=None, sort_direction="asc")
+
+
+@pytest.fixture
+def unindexed_bucket(monkeypatch):
+    client = MagicMock()
+    client.get_index.side_effect = Exception("index_not_found")
+    monkeypatch.setattr(routes_module, "meilisearch", MagicMock(Client=MagicMock(return_value=client)))
+    listing = MagicMock(return_value=iter([{"Key": "pfx/a.txt"}]))
+    monkeypatch.setattr(routes_module, "iter_s3_objects", listing)
+    return listing
+
+
+def test_search_without_index_lists_s3(unindexed_bucket):
+    params = {**SEARCH_DEFAULTS, "contains": "a"}
+    assert routes_module.search_s3("s3://bucket/pfx", **params) == [{"Key": "pfx/a.txt"}]
+    assert "targets" not in unindexed_bucket.call_args.kwargs
+
+
+@pytest.mark.parametrize("field, value", [
+    ("targets", ["MARS"]), ("instruments", ["HIRISE"]), ("product_types", ["EDR"]),
+    ("min_width", 100), ("min_height", 100), ("crs", ["EPSG:4326"]),
+])
+def test_search_without_index_rejects_indexed_only_filters(unindexed_bucket, field, value):
+    with pytest.raises(HTTPException) as raised:
+        routes_module.search_s3("s3://bucket/pfx", **{**SEARCH_DEFAULTS, field: value})
+    assert raised.value.status_code == 400
+    unindexed_bucket.assert_not_called()
+
+
+EXPORT_DEFAULTS = {**{name: value for name, value in SEARCH_DEFAULTS.items() if name != "limit"}, "format": "ndjson"}
+
+
+@pytest.fixture
+def indexed_bucket(monkeypatch):
+    monkeypatch.setattr(routes_module, "meilisearch", MagicMock())
+
+
+def test_export_reports_search_errors_before_streaming(indexed_bucket, monkeypatch):
+    def failing_search(**kwargs):
+        raise Exception("meilisearch unavailable")
+        yield
+    monkeypatch.setattr(routes_module, "iter_search_from_meili", failing_search)
+
+    with pytest.raises(HTTPException) as raised:
+        routes_module.export_s3_search("s3://bucket/pfx", **EXPORT_DEFAULTS)
+    assert raised.value.status_code == 502
+
+
+def test_export_streams_every_result(indexed_bucket, monkeypatch):
+    objects = [{"key": "pfx/a.txt"}, {"key": "pfx/b.txt"}]
+    monkeypatch.setattr(routes_module, "iter_search_from_meili", lambda **kwargs: iter(objects))
+    exported = []
+    monkeypatch.setattr(routes_module, "export_search_results",
+                        lambda rows, fmt: exported.extend(rows) or iter(()))
+
+    routes_module.export_s3_search("s3://bucket/pfx", **EXPORT_DEFAULTS)
+    assert exported == objects
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (previews_module.PreviewTooLargeError("File is too large to preview"), 413),
+    (previews_module.PreviewRenderError("Could not render a preview of this file"), 422),
+    (ValueError("Previews are not supported for this file type"), 415),
+])
+def test_preview_thumbnail_maps_preview_errors(monkeypatch, error, status_code):
+    monkeypatch.setattr(routes_module, "get_preview", MagicMock(side_effect=error))
+
+    with pytest.raises(HTTPException) as raised:
+        routes_module.s3_preview_thumbnail(MagicMock(headers={}), "bucket", "doc.pdf", size=128)
+    assert raised.value.status_code == status_code
+
+
+def test_refresh_job_routes_report_database_errors(monkeypatch):
+    connect = MagicMock(side_effect=psycopg.OperationalError("connection refused"))
+    monkeypatch.setattr(routes_module.psycopg, "connect", connect)
+
+    with pytest.raises(HTTPException) as raised:
+        routes_module.refresh_jobs_list(s3_uri=None, limit=50)
+    assert raised.value.status_code == 502
+    with pytest.raises(HTTPException) as raised:
+        routes_module.refresh_job_status(1)
+    assert raised.value.status_code == 502
@@ -6,6 +6,15 @@ from unittest.mock import MagicMock, patch
 import app.s3.search as search
 
 
+@pytest.fixture(autouse=True)
+def clear_listing_caches():
+    search._shallow_listings.clear()
+    search._listing_pages.clear()
+    yield
+    search._shallow_listings.clear()
+    search._listing_pages.clear()
+
+
 # ---------------------------
 # Helper Function Tests
 # ---------------------------
@@ -126,6 +135,62 @@ def test_iter_s3_objects_error():
         list(search.iter_s3_objects("bucket", "", s3=mock_s3))
 
 
+def _paged_s3(pages):
+    mock_s3 = MagicMock()
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    mock_paginator.paginate.side_effect = lambda **kwargs: iter(
+        pages if "ContinuationToken" not in kwargs
+        else pages[[p.get("NextContinuationToken") for p in pages].index(kwargs["ContinuationToken"]) + 1:])
+    return mock_s3
+
+
+def test_iter_s3_objects_serves_repeat_searches_from_cache():
+    now = datetime.now()
+    mock_s3 = _paged_s3([{
+        "Contents": [
+            {"Key": "a.txt", "Size": 10, "LastModified": now, "StorageClass": "STANDARD"},
+            {"Key": "b.pdf", "Size": 500, "LastModified": now, "StorageClass": "STANDARD"},
+        ]
+    }])
+
+    assert len(list(search.iter_s3_objects("bucket", "p", limit=10, s3=mock_s3))) == 2
+    # different filters on the same prefix do not list again
+    results = list(search.iter_s3_objects("bucket", "p", limit=10, s3=mock_s3, suffixes=[".pdf"]))
+    assert [r["key"] for r in results] == ["b.pdf"]
+    results = list(search.iter_s3_objects("bucket", "p", limit=10, s3=mock_s3, min_size=100))
+    assert [r["key"] for r in results] == ["b.pdf"]
+    assert mock_s3.get_paginator.return_value.paginate.call_count == 1
+
+
+def test_iter_s3_objects_resumes_partial_listing():
+    now = datetime.now()
+    mock_s3 = _paged_s3([
+        {"Contents": [{"Key": "a.txt", "Size": 1, "LastModified": now}], "NextContinuationToken": "t1"},
+        {"Contents": [{"Key": "b.txt", "Size": 1, "LastModified": now}]},
+    ])
+    paginate = mock_s3.get_paginator.return_value.paginate
+
+    assert [r["key"] for r in search.iter_s3_objects("bucket", "", limit=1, s3=mock_s3)] == ["a.txt"]
+    assert [r["key"] for r in search.iter_s3_objects("bucket", "", limit=5, s3=mock_s3)] == ["a.txt", "b.txt"]
+    assert paginate.call_args_list[1].kwargs == {"Bucket": "bucket", "Prefix": "", "ContinuationToken": "t1"}
+
+    list(search.iter_s3_objects("bucket", "", limit=5, s3=mock_s3))
+    assert paginate.call_count == 2
+
+
+def test_iter_s3_objects_skips_cache_over_object_budget(monkeypatch):
+    monkeypatch.setattr(search, "_listing_pages", search.TTLCache(60, 10, max_weight=1))
+    now = datetime.now()
+    mock_s3 = _paged_s3([{"Contents": [
+        {"Key": "a.txt", "Size": 1, "LastModified": now},
+        {"Key": "b.txt", "Size": 1, "LastModified": now},
+    ]}])
+    list(search.iter_s3_objects("bucket", "", s3=mock_s3))
+    list(search.iter_s3_objects("bucket", "", s3=mock_s3))
+    assert mock_s3.get_paginator.return_value.paginate.call_count == 2
+
+
 # ---------------------------
 # search_from_meili
 # ---------------------------
@@ -242,4 +307,152 @@ def test_list_folder_children_invalid_path():
                 bucket="bucket",
                 prefix="a",
                 path="b"
-            )
\ No newline at end of file
+            )
+
+# ---------------------------
+# cursor pagination / export
+# ---------------------------
+
+def test_search_cursor_round_trip_and_invalid():
+    cursor = search.encode_search_cursor("Size", "desc", 42, "hash-b")
+    assert search.decode_search_cursor(cursor) == {"s": "Size", "d": "desc", "v": 42, "i": "hash-b"}
+
+    with pytest.raises(ValueError):
+        search.decode_search_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        search.decode_search_cursor(search.encode_search_cursor("Tags", "asc", 1, "k"))
+    with pytest.raises(ValueError):
+        search.decode_search_cursor(search.encode_search_cursor("Key", "asc", 1, "k"))
+
+
+def test_cursor_filter():
+    # keys equal but for case tie on Key, so the exact ID decides
+    assert search._cursor_filter({"s": "Key", "d": "asc", "v": "it's", "i": "h1"}) == \
+        "(Key > 'it\\'s' OR (Key = 'it\\'s' AND ID > 'h1'))"
+    assert search._cursor_filter({"s": "Size", "d": "desc", "v": 5, "i": "h2"}) == \
+        "(Size < 5 OR (Size = 5 AND ID < 'h2'))"
+
+
+def test_build_search_filters_pds_label_fields():
+    filters = search._build_search_filters(None, targets=["MARS", "PHOBOS"], instruments=["HIRISE"])
+    assert "TargetName IN ['MARS', 'PHOBOS']" in filters
+    assert "InstrumentId IN ['HIRISE']" in filters
+    assert not any(f.startswith("ProductType") for f in filters)
+
+
+def test_build_search_filters_image_fields():
+    filters = search._build_search_filters(None, min_width=1000, min_height=500, crs=["EPSG:4326"])
+    assert filters == ["Width>=1000", "Height>=500", "Crs IN ['EPSG:4326']"]
+
+
+def _hit(key, size):
+    return {"ID": "hash-" + key, "Key": key, "Size": size, "LastModified": 1700000000,
+            "StorageClass": "STANDARD", "Tags": []}
+
+
+@patch("app.s3.search.meilisearch.Client")
+def test_search_page_from_meili_walks_with_cursor(mock_client):
+    mock_index = MagicMock()
+    mock_client.return_value.index.return_value = mock_index
+    mock_index.search.side_effect = [
+        {"hits": [_hit("a", 1), _hit("b", 2), _hit("c", 2)]},
+        {"hits": [_hit("c", 2)]},
+    ]
+
+    first = search.search_page_from_meili("bucket", "", limit=2, sort_by="Size")
+    assert [item["key"] for item in first["items"]] == ["a", "b"]
+    assert first["next_cursor"] is not None
+    opts = mock_index.search.call_args_list[0][0][1]
+    assert opts["limit"] == 3
+    assert opts["sort"] == ["Size:asc", "ID:asc"]
+
+    second = search.search_page_from_meili(
+        "bucket", "", limit=2, sort_by="Size", cursor=first["next_cursor"])
+    assert [item["key"] for item in second["items"]] == ["c"]
+    assert second["next_cursor"] is None
+    opts = mock_index.search.call_args_list[1][0][1]
+    assert "(Size > 2 OR (Size = 2 AND ID > 'hash-b'))" in opts["filter"]
+
+    with pytest.raises(ValueError):
+        search.search_page_from_meili("bucket", "", sort_by="Key", cursor=first["next_cursor"])
+
+
+def test_iter_search_from_meili_follows_cursors(monkeypatch):
+    pages = iter([
+        {"items": [{"key": "a"}], "next_cursor": "c1"},
+        {"items": [{"key": "b"}], "next_cursor": None},
+    ])
+    cursors = []
+
+    def fake_page(bucket, prefix, limit, cursor, **kwargs):
+        cursors.append(cursor)
+        return next(pages)
+    monkeypatch.setattr(search, "search_page_from_meili", fake_page)
+
+    assert [o["key"] for o in search.iter_search_from_meili("bucket", "")] == ["a", "b"]
+    assert cursors == [None, "c1"]
+
+
+def test_export_search_results_formats():
+    objects = [{"key": "a,b.txt", "size": 1, "last_modified": datetime(2024, 1, 1),
+                "storage_class": "STANDARD", "tags": ["x", "y"]}]
+
+    lines = list(search.export_search_results(iter(objects), "ndjson"))
+    assert lines == ['{"key": "a,b.txt", "size": 1, "last_modified": "2024-01-01T00:00:00", '
+                     '"storage_class": "STANDARD", "tags": ["x", "y"]}\n']
+
+    rows = list(search.export_search_results(iter(objects), "csv"))
+    assert rows[0].strip() == "key,size,last_modified,storage_class,tags"
+    assert rows[1].strip() == '"a,b.txt",1,2024-01-01T00:00:00,STANDARD,x;y'
+
+
+# ---------------------------
+# shallow S3 browsing
+# ---------------------------
+
+@pytest.fixture
+def shallow_s3():
+    mock_s3 = MagicMock()
+    mock_paginator = MagicMock()
+    mock_s3.get_paginator.return_value = mock_paginator
+    mock_paginator.paginate.return_value = [{
+        "CommonPrefixes": [{"Prefix": "a/raw/"}, {"Prefix": "a/Derived/"}],
+        "Contents": [
+            {"Key": "a/", "Size": 0, "LastModified": datetime(2020, 1, 1)},
+            {"Key": "a/big.img", "Size": 300, "LastModified": datetime(2020, 1, 2)},
+            {"Key": "a/small.lbl", "Size": 10, "LastModified": datetime(2020, 1, 3)},
+        ]
+    }]
+    return mock_s3
+
+
+def test_list_s3_level_uses_delimiter_and_caches(shallow_s3):
+    level = search.list_s3_level("bucket", "a", s3=shallow_s3)
+    assert level["folders"] == ["a/raw", "a/Derived"]
+    assert [f["key"] for f in level["files"]] == ["a/big.img", "a/small.lbl"]
+    shallow_s3.get_paginator.return_value.paginate.assert_called_once_with(
+        Bucket="bucket", Prefix="a/", Delimiter="/")
+
+    search.list_s3_level("bucket", "a/", s3=shallow_s3)
+    assert shallow_s3.get_paginator.return_value.paginate.call_count == 1
+
+
+def test_list_folder_children_from_s3(shallow_s3):
+    result = search.list_folder_children_from_s3(
+        "bucket", prefix="a", path="a", sort_by="Size", sort_direction="desc", s3=shallow_s3)
+    assert result["path"] == "a"
+    assert [c["name"] for c in result["children"]] == ["Derived", "raw"]
+    assert [f["key"] for f in result["files"]] == ["a/big.img", "a/small.lbl"]
+
+    filtered = search.list_folder_children_from_s3(
+        "bucket", prefix="a", contains="RAW", s3=shallow_s3)
+    assert [c["path"] for c in filtered["children"]] == ["a/raw"]
+    assert filtered["files"] == []
+
+    with pytest.raises(ValueError):
+        search.list_folder_children_from_s3("bucket", prefix="a", path="b", s3=shallow_s3)
+
+
+def test_search_folders_from_s3(shallow_s3):
+    folders = search.search_folders_from_s3("bucket", prefix="a", contains="der", s3=shallow_s3)
+    assert folders == [{"path": "a/Derived", "name": "Derived", "depth": 2, "matched_count": 0}]
@@ -0,0 +1,196 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.jobs.shards as shards_module
+import app.s3.index_refresh as module
+import app.worker as worker_module
+from app.jobs.queue import RefreshJob
+from app.jobs.shards import RefreshShard
+from tests.fixtures import *
+
+
+@pytest.fixture
+def shard_conn():
+    conn = MagicMock()
+    cur = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cur
+    conn.__enter__.return_value = conn
+    return conn, cur
+
+
+def _shard(shard_id=1, folder="a", scope="subtree", status="running", **fields):
+    return RefreshShard(shard_id, 9, "s3://bucket", "bucket", folder, scope, status, **fields)
+
+
+def test_create_shards_adds_sweep(shard_conn):
+    conn, cur = shard_conn
+    job = RefreshJob(9, "s3://bucket/pfx", "refresh", "running")
+
+    count = shards_module.create_shards(conn, job, "bucket", "pfx", [("pfx", "files"), ("pfx/a", "subtree")])
+
+    assert count == 3
+    rows = cur.executemany.call_args.args[1]
+    assert rows[-1] == (9, "s3://bucket/pfx", "bucket", "pfx", "sweep")
+    conn.commit.assert_called_once()
+
+
+def test_claim_shard_takes_expired_leases_and_holds_back_sweep(shard_conn):
+    conn, cur = shard_conn
+    cur.fetchone.return_value = tuple(vars(_shard()).values())
+
+    shard = shards_module.claim_shard(conn, "worker-1", lease=30)
+
+    assert shard.folder == "a"
+    sql, params = cur.execute.call_args.args
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "s.lease_expires_at < now()" in sql
+    assert "s.attempts < %s" in sql
+    assert "s.scope <> 'sweep' OR NOT EXISTS" in sql
+    assert params == ("worker-1", 30, shards_module.JOB_MAX_ATTEMPTS)
+
+
+def test_expire_shards_fails_jobs_of_abandoned_sweeps(shard_conn):
+    conn, cur = shard_conn
+    cur.fetchall.return_value = [("s3://bucket/pfx",)]
+
+    assert shards_module.expire_shards(conn) == ["s3://bucket/pfx"]
+    sql, params = cur.execute.call_args.args
+    # the shards and their job are failed in one statement
+    assert cur.execute.call_count == 1
+    assert "attempts >= %s" in sql
+    assert "UPDATE refresh_jobs" in sql and "scope = 'sweep'" in sql
+    assert params == (shards_module.JOB_MAX_ATTEMPTS,)
+    conn.commit.assert_called_once()
+
+
+def test_heartbeat_and_finish_need_the_lease(shard_conn):
+    conn, cur = shard_conn
+    cur.fetchone.return_value = None
+    assert shards_module.heartbeat_shard(conn, 1, "worker-1") is False
+    assert shards_module.finish_shard(conn, 1, "worker-1", {"listed": 5}) is False
+
+    cur.fetchone.return_value = (1,)
+    assert shards_module.finish_shard(conn, 1, "worker-1", {"listed": 5, "added": 2, "removed": 1}) is True
+    assert cur.execute.call_args.args[1] == ("done", None, 5, 2, 1, 0, 1, "worker-1")
+    shards_module.finish_shard(conn, 1, "worker-1", error="boom")
+    assert cur.execute.call_args.args[1][:2] == ("error", "boom")
+
+
+def test_shard_progress_ignores_sweep():
+    shards = [_shard(1, status="done", listed=10, added=2), _shard(2, status="error", message="x"),
+              _shard(3, status="running"), _shard(4, "", "sweep", "queued", removed=1)]
+    assert shards_module.shard_progress(shards) == {
+        "shards": 3, "finished": 2, "failed": 1, "listed": 10, "changed": 3, "failed_tasks": 0}
+
+
+def test_plan_refresh_shards_splits_breadth_first(monkeypatch):
+    folders = {"pfx": ["pfx/a", "pfx/b"], "pfx/a": ["pfx/a/x", "pfx/a/y"], "pfx/b": []}
+    listed = []
+    monkeypatch.setattr(module, "list_child_folders", lambda bucket, folder: listed.append(folder) or folders[folder])
+
+    plan = module.plan_refresh_shards("bucket", "pfx/", 4)
+
+    assert plan == [("pfx", "files"), ("pfx/a", "files"), ("pfx/a/x", "subtree"), ("pfx/a/y", "subtree"),
+                    ("pfx/b", "subtree")]
+    assert listed == ["pfx", "pfx/a"]
+    assert module.plan_refresh_shards("bucket", "pfx/b", 4) == [("pfx/b", "subtree")]
+
+
+def test_list_child_folders_uses_delimiter(monkeypatch, mock_s3_client):
+    mock_s3_client.get_paginator.return_value.paginate.side_effect = lambda **kwargs: [
+        {"CommonPrefixes": [{"Prefix": "pfx/a/"}, {"Prefix": "pfx/b/"}]}]
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+
+    assert module.list_child_folders("bucket", "pfx") == ["pfx/a", "pfx/b"]
+    mock_s3_client.get_paginator.return_value.paginate.assert_called_once_with(
+        Bucket="bucket", Prefix="pfx/", Delimiter="/")
+
+
+def test_refresh_shard_diffs_its_folder_only(monkeypatch, mock_s3_client, mock_meili_client):
+    paginate = mock_s3_client.get_paginator.return_value.paginate
+    paginate.side_effect = lambda **kwargs: [{"Contents": [{"Key": "pfx/new.txt"}, {"Key": "pfx/kept.txt"}]}]
+    monkeypatch.setattr(module, "get_public_client", lambda: mock_s3_client)
+    filters = []
+    monkeypatch.setattr(module, "get_all_documents", lambda bucket, prefix=None, filter=None: filters.append(filter) or [
+        SimpleNamespace(Key="pfx/kept.txt"), SimpleNamespace(Key="pfx/gone.txt")])
+    added, removed = MagicMock(return_value=[1]), MagicMock(return_value=[2])
+    monkeypatch.setattr(module, "add_files_to_index", added)
+    monkeypatch.setattr(module, "remove_files_from_index", removed)
+    monkeypatch.setattr(module, "wait_for_tasks", lambda client, uids: {
+        "tasks": len(uids), "failed": 0, "errors": [], "indexing_seconds": 0.1})
+
+    result = module.refresh_shard("bucket", "pfx", "files")
+
+    paginate.assert_called_once_with(Bucket="bucket", Prefix="pfx/", Delimiter="/")
+    assert filters == ["ParentPath = 'pfx'"]
+    assert [f["Key"] for f in added.call_args.args[1]] == ["pfx/new.txt"]
+    assert removed.call_args.args[1] == ["pfx/gone.txt"]
+    assert result == {"listed": 2, "added": 1, "removed": 1, "failed_tasks": 0, "message": None}
+
+
+def test_sweep_removes_documents_outside_every_shard(monkeypatch, mock_meili_client):
+    filters = []
+    monkeypatch.setattr(module, "get_all_documents", lambda bucket, prefix=None, filter=None: filters.append(filter) or [
+        SimpleNamespace(Key="pfx/deleted/file.txt")])
+    removed = MagicMock(return_value=[3])
+    monkeypatch.setattr(module, "remove_files_from_index", removed)
+    monkeypatch.setattr(module, "wait_for_tasks", lambda client, uids: {
+        "tasks": len(uids), "failed": 0, "errors": [], "indexing_seconds": 0.1})
+
+    result = module.sweep_unsharded_documents("bucket", "pfx", [("pfx", "files"), ("pfx/a", "subtree")])
+
+    assert filters == ["(Ancestors = 'pfx' OR ParentPath = 'pfx') AND NOT ParentPath IN ['pfx'] "
+                       "AND NOT Ancestors IN ['pfx/a']"]
+    removed.assert_called_once_with("bucket", ["pfx/deleted/file.txt"])
+    assert result["removed"] == 1
+
+
+def test_run_job_splits_large_refresh_into_shards(monkeypatch, shard_conn):
+    conn, _ = shard_conn
+    monkeypatch.setattr(worker_module, "psycopg", MagicMock(connect=MagicMock(return_value=conn)))
+    monkeypatch.setattr(worker_module, "REFRESH_SHARDS", 8)
+    monkeypatch.setattr(worker_module, "plan_refresh_shards", lambda bucket, prefix, shards: [
+        ("pfx", "files"), ("pfx/a", "subtree")])
+    for name in ["prepare_index", "create_shards", "update_shared_status", "refresh_meili_index"]:
+        monkeypatch.setattr(worker_module, name, MagicMock())
+    job = RefreshJob(9, "s3://bucket/pfx", "refresh", "running")
+
+    assert worker_module.run_job(job, "postgres://db") is False
+    worker_module.prepare_index.assert_called_once_with("bucket")
+    assert worker_module.create_shards.call_args.args[1:] == (job, "bucket", "pfx", [("pfx", "files"), ("pfx/a", "subtree")])
+    worker_module.refresh_meili_index.assert_not_called()
+
+
+def test_sweep_shard_finishes_the_job(monkeypatch, shard_conn):
+    conn, _ = shard_conn
+    monkeypatch.setattr(worker_module, "psycopg", MagicMock(connect=MagicMock(return_value=conn)))
+    sweep = _shard(3, "pfx", "sweep")
+    shards = [_shard(1, status="done", listed=4, added=4), _shard(2, status="error", message="boom"), sweep]
+    monkeypatch.setattr(worker_module, "run_shard", MagicMock(return_value={"removed": 0}))
+    monkeypatch.setattr(worker_module, "finish_shard", MagicMock(return_value=True))
+    monkeypatch.setattr(worker_module, "list_shards", MagicMock(return_value=shards))
+    for name in ["finish_job", "update_shared_status", "heartbeat_shard"]:
+        monkeypatch.setattr(worker_module, name, MagicMock())
+
+    worker_module.work_on_shard("postgres://db", "worker-1", sweep)
+
+    job_id, error = worker_module.finish_job.call_args.args[1:]
+    assert job_id == 9
+    assert error.startswith("1 of 3 shards failed")
+    assert worker_module.update_shared_status.call_args.kwargs["status"] == "error"
+
+
+def test_shard_with_lost_lease_is_not_reported(monkeypatch, shard_conn):
+    conn, _ = shard_conn
+    monkeypatch.setattr(worker_module, "psycopg", MagicMock(connect=MagicMock(return_value=conn)))
+    monkeypatch.setattr(worker_module, "run_shard", MagicMock(return_value={"listed": 1}))
+    monkeypatch.setattr(worker_module, "finish_shard", MagicMock(return_value=False))
+    for name in ["list_shards", "finish_job", "update_shared_status"]:
+        monkeypatch.setattr(worker_module, name, MagicMock())
+
+    worker_module.work_on_shard("postgres://db", "worker-1", _shard())
+
+    worker_module.list_shards.assert_not_called()
+    worker_module.update_shared_status.assert_not_called()
@@ -0,0 +1,55 @@
+import app.s3.structured_text as structured
+
+
+def _chunks(data: bytes, size: int = 7):
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+def test_csv_keywords_reads_header_and_sample_only(monkeypatch):
+    monkeypatch.setattr(structured, "CSV_SAMPLE_ROWS", 2)
+    lines = iter(["target_name;exposure;filter", "MARS;0.5;RED", "PHOBOS;1.5;BLUE", "DEIMOS;2;GREEN"])
+
+    keywords = structured.csv_keywords(lines)
+
+    assert keywords[:4] == ["target_name", "exposure", "filter", "MARS"]
+    assert "PHOBOS" in keywords and "BLUE" in keywords
+    assert "0.5" not in keywords
+    assert "DEIMOS" not in keywords
+
+
+def test_json_keywords_keys_first_across_chunks():
+    data = b'{"target": "Mars \\"Jezero\\"", "obs": [{"instrument_id": "HIRISE", "exposure": 1.5}], "ok": true}'
+
+    keywords = structured.json_keywords(_chunks(data, 3))
+
+    assert keywords[:4] == ["target", "obs", "instrument_id", "exposure"]
+    assert {"Mars", "Jezero", "HIRISE"} <= set(keywords)
+
+
+def test_json_keywords_tolerates_truncated_document():
+    data = '{"name": "café", "rows": [{"id": 1, "label": "unfinished'.encode("utf-8")
+
+    keywords = structured.json_keywords(_chunks(data, 5))
+
+    assert keywords[:4] == ["name", "rows", "id", "label"]
+    assert "café" in keywords
+    # a string cut off by the byte cap may end mid-word
+    assert "unfinished" not in keywords
+
+
+def test_xml_keywords_names_then_values():
+    data = (b'<?xml version="1.0"?><Product_Observational xmlns="http://pds.nasa.gov/pds4/pds/v1">'
+            b'<Target_Identification type="Planet"><name>Mars</name></Target_Identification>'
+            b'<File_Area_Observational><file_name>img.dat</file_name>')
+
+    keywords = structured.xml_keywords(_chunks(data, 11))
+
+    assert keywords[:5] == ["Product_Observational", "Target_Identification", "type", "name",
+                            "File_Area_Observational"]
+    assert {"Planet", "Mars", "img.dat"} <= set(keywords)
+
+
+def test_xml_keywords_stops_at_malformed_content():
+    keywords = structured.xml_keywords([b"<root><item>one</item><bad", b" <<<", b"<never/>"])
+
+    assert keywords == ["root", "item", "one"]
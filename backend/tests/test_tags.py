@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.s3.tags as tags_module
+from tests.fixtures import *
+
+
+@pytest.fixture
+def tag_backends(monkeypatch):
+    index = MagicMock()
+    client = MagicMock()
+    client.get_index.return_value = index
+    monkeypatch.setattr(tags_module, "meilisearch", MagicMock(Client=MagicMock(return_value=client)))
+
+    conn = MagicMock()
+    cur = MagicMock()
+    cur.fetchone.return_value = None
+    conn.cursor.return_value.__enter__.return_value = cur
+    conn.__enter__.return_value = conn
+    monkeypatch.setattr(tags_module, "psycopg", MagicMock(connect=MagicMock(return_value=conn)))
+    monkeypatch.setattr(tags_module, "get_doc_id", lambda key: "hash-" + key)
+    tags_module._jobs.clear()
+    return index, conn, cur
+
+
+def _documents(*docs):
+    return SimpleNamespace(results=[SimpleNamespace(Key=key, Tags=tags) for key, tags in docs], total=len(docs))
+
+
+def test_apply_tag_mode():
+    assert tags_module.apply_tag_mode(["a"], ["b", "a", "b"], "add") == ["a", "b"]
+    assert tags_module.apply_tag_mode(["a", "b"], ["a"], "remove") == ["b"]
+    assert tags_module.apply_tag_mode(["a"], ["c", "c"], "replace") == ["c"]
+    with pytest.raises(ValueError):
+        tags_module.apply_tag_mode([], ["a"], "merge")
+
+
+def test_bulk_tag_by_keys_batches_writes(tag_backends, monkeypatch):
+    index, conn, cur = tag_backends
+    monkeypatch.setattr(tags_module, "BULK_TAG_BATCH_SIZE", 2)
+    index.get_documents.side_effect = [
+        _documents(("a.txt", ["x"]), ("b.txt", [])),
+        _documents(("c.txt", ["x", "y"])),
+    ]
+
+    result = tags_module.bulk_tag("bucket", ["x"], "remove",
+                                  keys=["a.txt", "b.txt", "c.txt", "missing.txt"])
+
+    assert result == {"processed": 4, "matched": 3, "updated": 2}
+    first_query = index.get_documents.call_args_list[0].args[0]
+    assert first_query["filter"] == "Key IN ['a.txt', 'b.txt']"
+    # one Meilisearch task per batch, unchanged files are skipped
+    assert index.update_documents.call_count == 2
+    index.update_documents.assert_any_call([{"ID": "hash-a.txt", "Tags": []}])
+    cur.executemany.assert_called_once()
+    assert cur.executemany.call_args.args[1] == [("hash-c.txt", "bucket", ["y"])]
+    cur.execute.assert_called_once()
+    assert "ANY(%s)" in cur.execute.call_args.args[0]
+    assert cur.execute.call_args.args[1] == (["hash-a.txt"],)
+    assert conn.commit.call_count == 2
+
+
+def test_documents_for_keys_keeps_exact_matches_only(tag_backends):
+    index, _, _ = tag_backends
+    # Key IN matches regardless of case, so a second page holds the rest of the matches
+    index.get_documents.side_effect = [
+        SimpleNamespace(results=[SimpleNamespace(Key="A.txt", Tags=["x"])], total=2),
+        SimpleNamespace(results=[SimpleNamespace(Key="a.txt", Tags=[])], total=2),
+    ]
+
+    assert tags_module._documents_for_keys(index, ["a.txt"]) == [{"key": "a.txt", "tags": []}]
+    assert index.get_documents.call_args.args[0]["offset"] == 1
+
+
+def test_bulk_tag_by_query_uses_search(tag_backends, monkeypatch):
+    index, _, cur = tag_backends
+    search = MagicMock(return_value=iter([
+        {"key": "dir/a.txt", "tags": []},
+        {"key": "dir/b.txt", "tags": ["keep"]},
+    ]))
+    monkeypatch.setattr(tags_module, "iter_search_from_meili", search)
+
+    result = tags_module.bulk_tag("bucket", ["new"], "add", prefix="dir", contains="a")
+
+    assert result == {"processed": 2, "matched": 2, "updated": 2}
+    assert search.call_args.args[:2] == ("bucket", "dir")
+    assert search.call_args.kwargs["contains"] == "a"
+    index.update_documents.assert_called_once_with([
+        {"ID": "hash-dir/a.txt", "Tags": ["new"]},
+        {"ID": "hash-dir/b.txt", "Tags": ["keep", "new"]},
+    ])
+    assert len(cur.executemany.call_args.args[1]) == 2
+    cur.execute.assert_not_called()
+
+
+def test_bulk_tag_job_reports_progress_and_errors(tag_backends, monkeypatch):
+    index, _, _ = tag_backends
+    index.get_documents.return_value = _documents(("a.txt", []))
+    job = tags_module.create_tag_job("bucket", "add", total=1)
+    assert tags_module.get_tag_job(job.job_id)["status"] == "queued"
+
+    tags_module.bulk_tag("bucket", ["x"], "add", keys=["a.txt"], job=job)
+    state = tags_module.get_tag_job(job.job_id)
+    assert state["status"] == "done"
+    assert (state["processed"], state["matched"], state["updated"]) == (1, 1, 1)
+
+    failing = tags_module.create_tag_job("bucket", "add")
+    index.update_documents.side_effect = Exception("meili down")
+    with pytest.raises(Exception):
+        tags_module.bulk_tag("bucket", ["y"], "add", keys=["a.txt"], job=failing)
+    state = tags_module.get_tag_job(failing.job_id)
+    assert state["status"] == "error"
+    assert state["message"] == "meili down"
+    assert tags_module.get_tag_job("unknown") is None
+
+
+def test_tag_job_is_shared_through_postgres(tag_backends):
+    _, _, cur = tag_backends
+    job = tags_module.create_tag_job("bucket", "add", total=3)
+
+    sql, params = cur.execute.call_args.args
+    assert "INSERT INTO tag_jobs" in sql
+    assert params[:3] == (job.job_id, "bucket", "queued")
+
+    # another worker only finds the job in the table
+    tags_module._jobs.clear()
+    cur.fetchone.return_value = ({**vars(job)},)
+    assert tags_module.get_tag_job(job.job_id)["total"] == 3
+    assert cur.execute.call_args.args == ("""SELECT data FROM tag_jobs WHERE job_id = %s""", (job.job_id,))
+
+
+def test_bulk_tag_rejects_unknown_mode(tag_backends):
+    with pytest.raises(ValueError):
+        tags_module.bulk_tag("bucket", ["x"], "merge", keys=["a.txt"])
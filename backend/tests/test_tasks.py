@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+import app.meilisearch.tasks as tasks_module
+
+
+def _task(uid, status, error=None, enqueued=0, finished=None):
+    start = datetime(2024, 1, 1)
+    return SimpleNamespace(uid=uid, status=status, type="documentAdditionOrUpdate", error=error,
+                           enqueued_at=start + timedelta(seconds=enqueued),
+                           finished_at=start + timedelta(seconds=finished) if finished is not None else None)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(tasks_module.time, "sleep", lambda seconds: None)
+
+
+def test_task_uid_ignores_missing_uids():
+    assert tasks_module.task_uid(SimpleNamespace(task_uid=7)) == 7
+    assert tasks_module.task_uid({"taskUid": 8}) == 8
+    assert tasks_module.task_uid(None) is None
+    assert tasks_module.task_uid(MagicMock()) is None
+
+
+def test_wait_for_queue_capacity_polls_until_queue_drains():
+    client = MagicMock()
+    client.get_tasks.side_effect = [SimpleNamespace(total=total) for total in (12, 11, 3)]
+
+    tasks_module.wait_for_queue_capacity(client, max_queued=5)
+
+    assert client.get_tasks.call_count == 3
+    assert client.get_tasks.call_args.args[0]["statuses"] == ["enqueued", "processing"]
+
+
+def test_wait_for_queue_capacity_times_out():
+    client = MagicMock()
+    client.get_tasks.return_value = SimpleNamespace(total=50)
+    with pytest.raises(TimeoutError):
+        tasks_module.wait_for_queue_capacity(client, max_queued=5, timeout=-1)
+
+
+def test_wait_for_tasks_reports_failures_and_latency(monkeypatch):
+    monkeypatch.setattr(tasks_module, "TASK_QUERY_CHUNK", 2)
+    client = MagicMock()
+    tasks = {1: _task(1, "succeeded", enqueued=0, finished=1), 3: _task(3, "succeeded", enqueued=2, finished=9)}
+    polls = iter([_task(3, "processing"), tasks[3]])
+    client.get_task.side_effect = lambda uid: next(polls) if uid == 3 else tasks[uid]
+    client.get_tasks.side_effect = [
+        SimpleNamespace(total=1, results=[_task(2, "failed", error={"message": "invalid document"})]),
+        SimpleNamespace(total=0, results=[]),
+    ]
+
+    summary = tasks_module.wait_for_tasks(client, [3, 1, 2])
+
+    assert summary["tasks"] == 3
+    assert summary["failed"] == 1
+    assert summary["errors"] == ["task 2 (documentAdditionOrUpdate): invalid document"]
+    assert summary["indexing_seconds"] == 9.0
+    # uids are looked up in chunks, as strings
+    assert client.get_tasks.call_args_list[0].args[0]["uids"] == ["1", "2"]
+    assert client.get_tasks.call_args_list[1].args[0]["uids"] == ["3"]
+
+
+def test_wait_for_tasks_without_tasks_or_in_time():
+    client = MagicMock()
+    assert tasks_module.wait_for_tasks(client, [])["tasks"] == 0
+    client.get_task.assert_not_called()
+
+    client.get_task.return_value = _task(1, "enqueued")
+    with pytest.raises(TimeoutError):
+        tasks_module.wait_for_tasks(client, [1], timeout=-1)
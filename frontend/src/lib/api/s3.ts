@@ -66,6 +66,12 @@ export async function getRefreshStatus(s3Uri: string): Promise<MeilisearchRefres
   return await res.json();
 }
 
+export function openRefreshEvents(s3Uri: string): EventSource {
+  const queries = new URLSearchParams();
+  queries.set("s3_uri", s3Uri);
+  return new EventSource(`/api/s3/refresh/events?${queries.toString()}`);
+}
+
 export async function searchS3(params: S3SearchRequest): Promise<S3ObjectModel[]> {
   const queries = new URLSearchParams();
   queries.set("s3_uri", params.s3Uri);
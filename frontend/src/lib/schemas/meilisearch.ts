@@ -1,5 +1,5 @@
 export type MeilisearchRefreshStatus = {
-  status: "idle" | "listing" | "running" | "done" | "error";
+  status: "idle" | "listing" | "running" | "indexing" | "done" | "error";
   processed: number;
   total: number;
   percent: number;
@@ -7,4 +7,6 @@ export type MeilisearchRefreshStatus = {
   started_at?: string;
   finished_at?: string;
   message?: string;
+  failed_tasks?: number;
+  indexing_seconds?: number | null;
 };
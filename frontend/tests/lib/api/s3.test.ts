@@ -2,6 +2,7 @@ import { afterAll, beforeEach, describe, expect, it, vi } from "vitest";
 import {
   editObjectTags,
   getRefreshStatus,
+  openRefreshEvents,
   searchS3,
   searchS3FolderChildren,
   searchS3Folders,
@@ -182,6 +183,17 @@ describe("s3 api client", () => {
     );
   });
 
+  it("test_open_refresh_events_streams_from_events_endpoint", () => {
+    const eventSourceMock = vi.fn();
+    vi.stubGlobal("EventSource", eventSourceMock);
+
+    openRefreshEvents("s3://bucket/some path");
+
+    const request = new URL(eventSourceMock.mock.calls[0][0], "http://localhost");
+    expect(request.pathname).toBe("/api/s3/refresh/events");
+    expect(request.searchParams.get("s3_uri")).toBe("s3://bucket/some path");
+  });
+
   it("test_edit_object_tags_handles_error_without_throwing", async () => {
     const errorSpy = vi.spyOn(console, "error").mockImplementation(() => {});
     axiosPostMock.mockRejectedValue(new Error("api failed"));
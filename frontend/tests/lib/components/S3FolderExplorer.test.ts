@@ -297,4 +297,55 @@ describe("S3FolderExplorer", () => {
     ).toBeInTheDocument();
     expect(fetchMock).toHaveBeenCalledTimes(1);
   });
+
+  it.each([
+    ["missions/sample.png", "https://example.com/sample.png"],
+    ["missions/report.pdf", "https://example.com/report.pdf"],
+  ])("test_preview_%s_loads_thumbnail_and_links_full_file", async (key, fullUrl) => {
+    const user = userEvent.setup();
+    fetchMock.mockResolvedValueOnce(
+      new Response(JSON.stringify({ preview_url: fullUrl }), {
+        status: 200,
+        headers: { "Content-Type": "application/json" },
+      }),
+    );
+
+    render(S3FolderExplorer, {
+      searchedYet: true,
+      loading: false,
+      s3Uri: "s3://bucket",
+      suggestions: [{ path: "missions", name: "missions", depth: 1, matched_count: 1 }],
+      children: [],
+      files: [
+        {
+          key,
+          size: 2048,
+          lastModified: "2025-01-01T00:00:00Z",
+          storageClass: "STANDARD",
+          tags: [],
+        },
+      ],
+      breadcrumbs: [],
+      activePath: "missions",
+      sortBy: undefined,
+      sortDirection: "asc",
+      onOpenFolder: vi.fn(),
+      onOpenBreadcrumb: vi.fn(),
+      onNavigateUp: vi.fn(),
+      onSort: vi.fn(),
+      onDownload: vi.fn(),
+    });
+
+    await user.click(screen.getByTitle("Preview"));
+
+    const thumbnail = await screen.findByAltText("S3 file thumbnail");
+    const src = new URL(thumbnail.getAttribute("src") ?? "", "http://localhost");
+    expect(src.pathname).toBe("/api/s3/preview/thumbnail");
+    expect(src.searchParams.get("bucket")).toBe("bucket");
+    expect(src.searchParams.get("key")).toBe(key);
+    expect(src.searchParams.get("size")).toBe("1024");
+    // the full file is only linked, never loaded inline
+    expect(screen.getByRole("link", { name: "Open full file" })).toHaveAttribute("href", fullUrl);
+    expect(screen.queryByTitle("PDF preview")).not.toBeInTheDocument();
+  });
 });
@@ -1,75 +1,118 @@
 import { render, screen, waitFor } from "@testing-library/svelte";
-import { afterEach, beforeEach, describe, expect, it, vi } from "vitest";
+import { beforeEach, describe, expect, it, vi } from "vitest";
 import S3IndexRefreshProgress from "../../../src/lib/components/S3IndexRefreshProgress.svelte";
 
-const { getRefreshStatusMock } = vi.hoisted(() => ({
-  getRefreshStatusMock: vi.fn(),
+class FakeEventSource {
+  readonly CLOSED = 2;
+  readyState = 1;
+  onerror: (() => void) | null = null;
+  close = vi.fn(() => {
+    this.readyState = this.CLOSED;
+  });
+  private listeners: Record<string, ((event: MessageEvent) => void)[]> = {};
+
+  addEventListener(type: string, listener: (event: MessageEvent) => void) {
+    (this.listeners[type] ??= []).push(listener);
+  }
+
+  emit(type: string, data: unknown) {
+    const event = new MessageEvent(type, { data: JSON.stringify(data) });
+    (this.listeners[type] ?? []).forEach(listener => listener(event));
+  }
+}
+
+const { openRefreshEventsMock } = vi.hoisted(() => ({
+  openRefreshEventsMock: vi.fn(),
 }));
 
 vi.mock("../../../src/lib/api/s3", () => ({
-  getRefreshStatus: getRefreshStatusMock,
+  openRefreshEvents: openRefreshEventsMock,
 }));
 
 describe("S3IndexRefreshProgress", () => {
+  let sources: FakeEventSource[];
+
   beforeEach(() => {
-    vi.useFakeTimers();
-    getRefreshStatusMock.mockReset();
+    sources = [];
+    openRefreshEventsMock.mockReset();
+    openRefreshEventsMock.mockImplementation(() => {
+      const source = new FakeEventSource();
+      sources.push(source);
+      return source;
+    });
   });
 
-  afterEach(() => {
-    vi.useRealTimers();
-  });
+  it("test_stream_status_when_valid_s3_uri_is_provided", async () => {
+    render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
 
-  it("test_start_polling_when_valid_s3_uri_is_provided", async () => {
-    getRefreshStatusMock.mockResolvedValue({
+    expect(openRefreshEventsMock).toHaveBeenCalledWith("s3://bucket/path");
+    sources[0].emit("status", {
       status: "running",
       processed: 8,
       total: 20,
       percent: 40,
     });
-
-    render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
-
     await waitFor(() => {
-      expect(getRefreshStatusMock).toHaveBeenCalledTimes(1);
+      expect(screen.getByText("Refreshing index: 8/20 (40%)")).toBeInTheDocument();
     });
-    expect(screen.getByText("Refreshing index: 8/20 (40%)")).toBeInTheDocument();
 
-    await vi.advanceTimersByTimeAsync(15000);
+    // progress events only carry the fields that changed
+    sources[0].emit("progress", { processed: 10, percent: 50 });
     await waitFor(() => {
-      expect(getRefreshStatusMock).toHaveBeenCalledTimes(2);
+      expect(screen.getByText("Refreshing index: 10/20 (50%)")).toBeInTheDocument();
     });
+    expect(openRefreshEventsMock).toHaveBeenCalledTimes(1);
   });
 
-  it("test_stop_polling_when_status_is_done_or_error", async () => {
-    getRefreshStatusMock.mockResolvedValue({
+  it("test_close_stream_when_status_is_done_or_error", async () => {
+    render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
+
+    sources[0].emit("status", {
       status: "done",
       processed: 20,
       total: 20,
       percent: 100,
     });
 
+    await waitFor(() => {
+      expect(sources[0].close).toHaveBeenCalledTimes(1);
+    });
+  });
+
+  it("test_keep_streaming_while_indexing_and_report_failed_tasks", async () => {
     render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
 
+    sources[0].emit("status", {
+      status: "indexing",
+      processed: 20,
+      total: 20,
+      percent: 100,
+    });
     await waitFor(() => {
-      expect(getRefreshStatusMock).toHaveBeenCalledTimes(1);
+      expect(
+        screen.getByText("Index status: waiting for search indexing to finish"),
+      ).toBeInTheDocument();
     });
+    expect(sources[0].close).not.toHaveBeenCalled();
 
-    await vi.advanceTimersByTimeAsync(60000);
-    expect(getRefreshStatusMock).toHaveBeenCalledTimes(1);
+    sources[0].emit("progress", { status: "done", failed_tasks: 2 });
+    await waitFor(() => {
+      expect(
+        screen.getByText("Refresh finished with 2 failed indexing tasks"),
+      ).toBeInTheDocument();
+    });
   });
 
   it("test_reset_to_idle_when_uri_becomes_invalid", async () => {
-    getRefreshStatusMock.mockResolvedValue({
+    const view = render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
+
+    sources[0].emit("status", {
       status: "listing",
       processed: 0,
       total: 0,
       percent: 0,
       listed: 99,
     });
-
-    const view = render(S3IndexRefreshProgress, { s3Uri: "s3://bucket/path" });
-
     await waitFor(() => {
       expect(
         screen.getByText("Index status: scanning objects", { exact: false }),
@@ -81,8 +124,7 @@ describe("S3IndexRefreshProgress", () => {
     expect(
       screen.queryByText("Index status: scanning objects", { exact: false }),
     ).not.toBeInTheDocument();
-
-    await vi.advanceTimersByTimeAsync(30000);
-    expect(getRefreshStatusMock).toHaveBeenCalledTimes(1);
+    expect(sources[0].close).toHaveBeenCalledTimes(1);
+    expect(openRefreshEventsMock).toHaveBeenCalledTimes(1);
   });
 });
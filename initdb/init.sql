@@ -3,6 +3,18 @@ CREATE TABLE file_tags (
     bucket VARCHAR(255) NOT NULL,
     tags VARCHAR(255) ARRAY
 );
+-- refreshes that stream a whole bucket's tags filter on bucket
+CREATE INDEX IF NOT EXISTS file_tags_bucket_idx ON file_tags (bucket);
+
+-- keywords extracted from object content, shared by every object with the same ETag
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    etag VARCHAR(255) NOT NULL,
+    extractor VARCHAR(64) NOT NULL,
+    keywords TEXT ARRAY NOT NULL,
+    fields JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (etag, extractor)
+);
 
 CREATE TABLE custom_mime_types (
     extension VARCHAR(255) PRIMARY KEY,
@@ -11,6 +23,68 @@ CREATE TABLE custom_mime_types (
 
 INSERT INTO custom_mime_types (extension, mime_type) VALUES ('lbl', 'text/lbl');
 INSERT INTO custom_mime_types (extension, mime_type) VALUES ('lab', 'text/lab');
+-- PDS3 images with attached labels, and other rasters named .img
+INSERT INTO custom_mime_types (extension, mime_type) VALUES ('img', 'image/x-img');
 INSERT INTO custom_mime_types (extension, mime_type) VALUES ('geojson', 'application/geo+json');
 INSERT INTO custom_mime_types (extension, mime_type) VALUES ('kmz', 'application/vnd.google-earth.kmz');
-INSERT INTO custom_mime_types (extension, mime_type) VALUES ('kml', 'application/vnd.google-earth.kml+xml');
\ No newline at end of file
+INSERT INTO custom_mime_types (extension, mime_type) VALUES ('kml', 'application/vnd.google-earth.kml+xml');
+CREATE TABLE refresh_status (
+    s3_uri VARCHAR(1024) PRIMARY KEY,
+    status VARCHAR(32) NOT NULL,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Bulk tag jobs, readable from every API worker while they run in one of them
+CREATE TABLE IF NOT EXISTS tag_jobs (
+    job_id VARCHAR(64) PRIMARY KEY,
+    bucket VARCHAR(255) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- refresh and rebuild jobs, queued by the API and run by the indexing workers
+CREATE TABLE IF NOT EXISTS refresh_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    s3_uri VARCHAR(1024) NOT NULL,
+    kind VARCHAR(16) NOT NULL DEFAULT 'refresh',
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker VARCHAR(255),
+    message TEXT,
+    enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    -- renewed by the running worker, an old heartbeat means the worker died
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+-- at most one queued or running job per location
+CREATE UNIQUE INDEX IF NOT EXISTS refresh_jobs_active_uri_idx ON refresh_jobs (s3_uri)
+    WHERE status IN ('queued', 'running');
+-- workers claim the oldest queued job
+CREATE INDEX IF NOT EXISTS refresh_jobs_queued_idx ON refresh_jobs (enqueued_at, id)
+    WHERE status = 'queued';
+
+-- Parts of a sharded refresh job, each claimed by one worker under a heartbeated lease
+CREATE TABLE IF NOT EXISTS refresh_shards (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL REFERENCES refresh_jobs (id) ON DELETE CASCADE,
+    s3_uri VARCHAR(1024) NOT NULL,
+    bucket VARCHAR(255) NOT NULL,
+    -- folder the shard covers, '' for the bucket root
+    folder VARCHAR(1024) NOT NULL,
+    -- subtree (folder and everything below), files (objects directly in folder), or sweep
+    scope VARCHAR(16) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker VARCHAR(255),
+    lease_expires_at TIMESTAMPTZ,
+    listed INTEGER NOT NULL DEFAULT 0,
+    added INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    failed_tasks INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS refresh_shards_job_idx ON refresh_shards (job_id, status);